@@ -1,28 +1,67 @@
+from typing import Dict, List, Optional
 import asyncio
-from fastapi import APIRouter, HTTPException, Query
-from app.services.search import search_youtube
-from app.services.detail import get_video_detail
-from app.services.channel import get_channel_videos
+from fastapi import APIRouter, HTTPException, Query, Request, Response, WebSocket
+from pydantic import BaseModel, Field
+from app.cache import response_cache
+from app.fastjson import FastJSONResponse, dumps
+from app.jobs import JOB_KINDS, job_queue, public_job
+from app.metrics import MetricsRoute
+from app.pagination import InvalidCursor, iter_items, paginate
+from app.proxy import proxy_pool
+from app.streaming import STREAM_FORMATS, stream_response
+from app.services.search import search_youtube_page
+from app.services.detail import get_video_detail, get_video_details, iter_video_details
+from app.services.channel import get_channel_videos_page, get_new_channel_videos, iter_new_channel_videos
 from app.services.channel_info import get_channel_info
-from app.services.playlist import get_playlist_videos, get_videos_from_playlist
-from app.services.comment import get_video_comments
-from app.services.live import get_all_live_videos
-from app.services.trending import get_trending_videos
-from app.services.location import generate_grid_locations, get_videos_by_location
-from app.utils import resolve_channel_id_from_handle
-
-import os
+from app.services.playlist import PLAYLIST_EXPAND_CONCURRENCY, get_playlist_videos, get_videos_from_playlist_page, iter_channel_playlist_videos
+from app.services.comment import COMMENT_SORTS, REPLY_DEPTHS, get_new_video_comments, get_video_comments_page
+from app.services.live import get_live_videos_page
+from app.services.live_chat import LIVE_CHAT_MODES, LiveChatFull, live_chat_hub
+from app.services.trending import TRENDING_CATEGORIES, get_trending_videos_page, snapshot_cursor_offset, trending_snapshots
+from app.services.location import LOCATION_MAX_POINTS, LocationCrawl
+from app.services.handle import resolve_channel_input, resolve_handles
+
 from dotenv import load_dotenv
 
 load_dotenv()
-router = APIRouter()
+router = APIRouter(route_class=MetricsRoute)
+
+CURSOR_QUERY = Query(None, description="Opaque next_cursor returned by the previous page")
+STREAM_FORMAT_QUERY = Query("ndjson", enum=list(STREAM_FORMATS), description="NDJSON lines or Server-Sent Events")
+COMMENT_SORT_QUERY = Query("top", enum=list(COMMENT_SORTS), description="Top comments or newest first")
+
+class VideoDetailsRequest(BaseModel):
+    video_ids: List[str] = Field(..., min_items=1, max_items=300)
+    stream: bool = Field(False, description="Stream NDJSON records as each video finishes")
+
+class ResolveHandlesRequest(BaseModel):
+    handles: List[str] = Field(..., min_items=1, max_items=500, description="Channel handles, with or without @")
+
+class PollChannelsRequest(BaseModel):
+    channels: List[str] = Field(..., min_items=1, max_items=1000, description="Channel names (@xxx) or IDs (UCxxx)")
+    since_video_ids: Dict[str, str] = Field({}, description="Newest known video per channel, overrides the stored watermark")
+    limit: int = Field(50, ge=1, le=500, description="Most new videos returned per channel")
+    stream: bool = Field(False, description="Stream NDJSON records as each channel finishes")
 
-PROXY_HOST = os.getenv("PROXY_HOST")
-PROXY_PORT = os.getenv("PROXY_PORT")
-PROXY_USER = os.getenv("PROXY_USER")
-PROXY_PASS = os.getenv("PROXY_PASS")
+class JobRequest(BaseModel):
+    kind: str = Field(..., description=f"One of {', '.join(JOB_KINDS)}")
+    target: Optional[str] = Field(None, description="Channel (@xxx or UCxxx), playlist ID or video ID")
+    limit: Optional[int] = Field(None, ge=1, description="Stop after this many items, all of them if omitted")
+    reply_depth: Optional[str] = Field(None, description="Comments only: none, first or all")
+    sort: Optional[str] = Field(None, description="Comments only: top or newest")
+    lat: Optional[float] = None
+    lng: Optional[float] = None
+    radius_km: Optional[int] = Field(None, ge=1, le=500)
+    step_km: Optional[int] = Field(None, ge=1, le=100)
+    per_location_limit: Optional[int] = Field(None, ge=1, le=50)
+    max_points: Optional[int] = Field(None, ge=1, le=2000)
 
-PROXY_URL = f"http://{PROXY_USER}:{PROXY_PASS}@{PROXY_HOST}:{PROXY_PORT}"
+@router.get("/proxies")
+async def proxy_stats():
+    return FastJSONResponse({
+        "strategy": proxy_pool.strategy,
+        "proxies": proxy_pool.stats()
+    })
 
 @router.get("/search")
 async def search_videos(
@@ -30,28 +69,61 @@ async def search_videos(
     page: int = Query(1, ge=1),
     limit: int = Query(30, ge=1, le=50),
     sort: str = Query("relevance", enum=["relevance", "upload_date", "view_count", "rating"]),
+    cursor: Optional[str] = CURSOR_QUERY,
 ):
     try:
-        start = (page - 1) * limit
-        max_fetch = start + limit
-        results = await search_youtube(q, max_results=max_fetch, sort=sort, proxy=PROXY_URL)
-        return {
+        results, next_cursor = await paginate(
+            lambda continuation: search_youtube_page(q, sort=sort, continuation=continuation),
+            key=("search", q, sort), page=page, limit=limit, cursor=cursor,
+        )
+        return FastJSONResponse({
             "query": q,
             "page": page,
             "limit": limit,
             "total": len(results),
-            "results": results[start: start + limit]
-        }
+            "results": results,
+            "next_cursor": next_cursor
+        })
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/video/{video_id}")
 async def video_detail(video_id: str):
     try:
-        detail = await get_video_detail(video_id, proxy=PROXY_URL)
-        return {
+        detail, cache_status = await response_cache.get_or_fetch(
+            "video_detail", video_id,
+            lambda: get_video_detail(video_id),
+            negative=lambda detail: detail.get("error"),
+        )
+        return FastJSONResponse({
             "detail": detail
-        }
+        }, headers={"X-Cache": cache_status})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def cached_video_detail(video_id: str):
+    detail, _ = await response_cache.get_or_fetch(
+        "video_detail", video_id,
+        lambda: get_video_detail(video_id),
+        negative=lambda detail: detail.get("error"),
+    )
+    return detail
+
+@router.post("/videos/detail")
+async def videos_detail(body: VideoDetailsRequest, request: Request):
+    if body.stream:
+        records = iter_video_details(body.video_ids, fetch=cached_video_detail)
+        return stream_response(records, request, "ndjson")
+
+    try:
+        details = await get_video_details(body.video_ids, fetch=cached_video_detail)
+        return FastJSONResponse({
+            "total": len(details),
+            "failed": sum(1 for detail in details.values() if detail.get("error")),
+            "details": details
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -60,102 +132,345 @@ async def video_channel(
     channel_input: str = Query(..., description="Channel name: @xxx or channel ID: UCxxx"),
     page: int = Query(1, ge=1),
     limit: int = Query(30, ge=1, le=50),
+    cursor: Optional[str] = CURSOR_QUERY,
 ):
     try:
-        if channel_input.startswith("@"):
-            channel_id = await resolve_channel_id_from_handle(channel_input.lstrip("@"))
-        else:
-            channel_id = channel_input
+        channel_id = await resolve_channel_input(channel_input)
 
-        start = (page - 1) * limit
-        max_fetch = start + limit
-        videos = await get_channel_videos(channel_id=channel_id, max_results=max_fetch, proxy=PROXY_URL)
+        videos, next_cursor = await paginate(
+            lambda continuation: get_channel_videos_page(channel_id, continuation=continuation),
+            key=("channel_videos", channel_id), page=page, limit=limit, cursor=cursor,
+        )
 
-        return {
+        return FastJSONResponse({
             "channel_id": channel_id,
             "video_count": len(videos),
-            "videos": videos
-        }
+            "videos": videos,
+            "next_cursor": next_cursor
+        })
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/channel/videos/stream")
+async def stream_video_channel(
+    request: Request,
+    channel_input: str = Query(..., description="Channel name: @xxx or channel ID: UCxxx"),
+    limit: Optional[int] = Query(None, ge=1, description="Stop after this many videos"),
+    format: str = STREAM_FORMAT_QUERY,
+):
+    try:
+        channel_id = await resolve_channel_input(channel_input)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    videos = iter_items(
+        lambda continuation: get_channel_videos_page(channel_id, continuation=continuation),
+        limit=limit,
+    )
+    return stream_response(videos, request, format)
+
+@router.get("/channel/videos/new")
+async def new_channel_videos(
+    channel_input: str = Query(..., description="Channel name: @xxx or channel ID: UCxxx"),
+    since_video_id: Optional[str] = Query(None, description="Newest known video; the stored watermark is used if omitted"),
+    limit: int = Query(50, ge=1, le=500, description="Most new videos returned"),
+    update_watermark: bool = Query(True, description="Remember the newest video for the next poll"),
+):
+    try:
+        channel_id = await resolve_channel_input(channel_input)
+        result = await get_new_channel_videos(
+            channel_id, since_video_id=since_video_id, max_results=limit, update_watermark=update_watermark,
+        )
+        return FastJSONResponse(result)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/channel/videos/new")
+async def poll_channels(body: PollChannelsRequest, request: Request):
+    records = iter_new_channel_videos(body.channels, since_video_ids=body.since_video_ids, max_results=body.limit)
+    if body.stream:
+        return stream_response(records, request, "ndjson")
+
+    try:
+        results = [record async for record in records]
+        return FastJSONResponse({
+            "total": len(results),
+            "failed": sum(1 for result in results if result.get("error")),
+            "new_videos": sum(len(result.get("new_videos", [])) for result in results),
+            "upstream_pages": sum(result.get("pages", 0) for result in results),
+            "channels": results
+        })
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/channel/resolve")
+async def resolve_channel_handles(body: ResolveHandlesRequest):
+    try:
+        channel_ids = await resolve_handles(body.handles)
+        return FastJSONResponse({
+            "total": len(channel_ids),
+            "resolved": sum(1 for channel_id in channel_ids.values() if channel_id),
+            "channels": channel_ids
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/channel/{channel_id}")
 async def channel_info(channel_id: str):
     try:
-        info = await get_channel_info(channel_id, proxy=PROXY_URL)
-        return {
+        info, cache_status = await response_cache.get_or_fetch(
+            "channel_info", channel_id,
+            lambda: get_channel_info(channel_id),
+            negative=lambda info: info.get("error"),
+        )
+        return FastJSONResponse({
             "info": info
-        }
+        }, headers={"X-Cache": cache_status})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/channel/{channel_id}/playlist")
 async def get_channel_playlists(channel_id: str):
     try:
-        playlists = await get_playlist_videos(channel_id, proxy=PROXY_URL)
-        return {
+        playlists, cache_status = await response_cache.get_or_fetch(
+            "channel_playlists", channel_id,
+            lambda: get_playlist_videos(channel_id),
+        )
+        return FastJSONResponse({
             "playlists": playlists
-        }
+        }, headers={"X-Cache": cache_status})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/channel/{channel_id}/playlist/videos/stream")
+async def stream_channel_playlist_videos(
+    request: Request,
+    channel_id: str,
+    per_playlist_limit: Optional[int] = Query(None, ge=1, description="Stop each playlist after this many videos"),
+    concurrency: int = Query(PLAYLIST_EXPAND_CONCURRENCY, ge=1, le=16, description="Playlists crawled at the same time"),
+    format: str = STREAM_FORMAT_QUERY,
+):
+    try:
+        playlists, _ = await response_cache.get_or_fetch(
+            "channel_playlists", channel_id,
+            lambda: get_playlist_videos(channel_id),
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    records = iter_channel_playlist_videos(playlists, per_playlist_limit=per_playlist_limit, concurrency=concurrency)
+    return stream_response(records, request, format)
+
 @router.get("/playlist/{playlist_id}/videos")
-async def get_videos_from_a_playlist(playlist_id: str):
+async def get_videos_from_a_playlist(
+    playlist_id: str,
+    page: int = Query(1, ge=1),
+    limit: int = Query(100, ge=1, le=200),
+    cursor: Optional[str] = CURSOR_QUERY,
+):
     try:
-        videos = await get_videos_from_playlist(playlist_id, proxy=PROXY_URL)
-        return {
-            "videos": videos
-        }
+        videos, next_cursor = await paginate(
+            lambda continuation: get_videos_from_playlist_page(playlist_id, continuation=continuation),
+            key=("playlist_videos", playlist_id), page=page, limit=limit, cursor=cursor,
+        )
+        return FastJSONResponse({
+            "playlist_id": playlist_id,
+            "videos": videos,
+            "next_cursor": next_cursor
+        })
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/playlist/{playlist_id}/videos/stream")
+async def stream_videos_from_a_playlist(
+    request: Request,
+    playlist_id: str,
+    limit: Optional[int] = Query(None, ge=1, description="Stop after this many videos"),
+    format: str = STREAM_FORMAT_QUERY,
+):
+    videos = iter_items(
+        lambda continuation: get_videos_from_playlist_page(playlist_id, continuation=continuation),
+        limit=limit,
+    )
+    return stream_response(videos, request, format)
+
 @router.get("/video/{video_id}/comments")
 async def get_comments(
     video_id: str,
     page: int = Query(1, ge=1),
     limit: int = Query(30, ge=1, le=50),
+    cursor: Optional[str] = CURSOR_QUERY,
+    reply_depth: str = Query("all", enum=list(REPLY_DEPTHS), description="Reply expansion: none, first page or all replies"),
+    sort: str = COMMENT_SORT_QUERY,
 ):
     try:
-        start = (page - 1) * limit
-        max_fetch = start + limit
-        comments = await get_video_comments(video_id, proxy=PROXY_URL, max_comments=max_fetch)
-        return {
+        comments, next_cursor = await paginate(
+            lambda continuation: get_video_comments_page(
+                video_id, continuation=continuation, reply_depth=reply_depth, sort=sort
+            ),
+            key=("comments", video_id, reply_depth, sort), page=page, limit=limit, cursor=cursor,
+        )
+        return FastJSONResponse({
             "video_id": video_id,
             "total": len(comments),
-            "comments": comments
-        }
+            "comments": comments,
+            "next_cursor": next_cursor
+        })
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
+@router.get("/video/{video_id}/comments/stream")
+async def stream_comments(
+    request: Request,
+    video_id: str,
+    limit: Optional[int] = Query(None, ge=1, description="Stop after this many comment threads"),
+    reply_depth: str = Query("all", enum=list(REPLY_DEPTHS), description="Reply expansion: none, first page or all replies"),
+    sort: str = COMMENT_SORT_QUERY,
+    format: str = STREAM_FORMAT_QUERY,
+):
+    comments = iter_items(
+        lambda continuation: get_video_comments_page(
+            video_id, continuation=continuation, reply_depth=reply_depth, sort=sort
+        ),
+        limit=limit,
+    )
+    return stream_response(comments, request, format)
+
+@router.get("/video/{video_id}/comments/new")
+async def new_comments(
+    video_id: str,
+    since_comment_id: Optional[str] = Query(None, description="Newest known comment thread; the stored watermark is used if omitted"),
+    since_time: Optional[float] = Query(None, description="Unix time, e.g. polled_at of the previous poll"),
+    limit: int = Query(100, ge=1, le=1000, description="Most new threads returned"),
+    reply_depth: str = Query("none", enum=list(REPLY_DEPTHS), description="Reply expansion: none, first page or all replies"),
+    update_watermark: bool = Query(True, description="Remember the newest thread for the next poll"),
+):
+    try:
+        result = await get_new_video_comments(
+            video_id, since_comment_id=since_comment_id, since_time=since_time,
+            max_results=limit, reply_depth=reply_depth, update_watermark=update_watermark,
+        )
+        return FastJSONResponse(result)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/videos/live")
 async def get_videos_live(
     q: str = Query(...),
     page: int = Query(1, ge=1), 
     limit: int = Query(30, ge=1, le=50),
+    cursor: Optional[str] = CURSOR_QUERY,
 ):
     try:
-        start = (page - 1) * limit
-        max_fetch = start + limit
-        videos = await get_all_live_videos(q=q,  proxy=PROXY_URL, max_results=max_fetch)
-        return {
-            "videos": videos
-        }
+        videos, next_cursor = await paginate(
+            lambda continuation: get_live_videos_page(q, continuation=continuation),
+            key=("live", q), page=page, limit=limit, cursor=cursor,
+        )
+        return FastJSONResponse({
+            "videos": videos,
+            "next_cursor": next_cursor
+        })
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+LIVE_CHAT_MODE_QUERY = Query("all", enum=list(LIVE_CHAT_MODES), description="Every message or YouTube's Top chat")
+
+async def live_chat_events(video_id: str, mode: str):
+    async with live_chat_hub.subscription(video_id, mode) as subscription:
+        async for event in subscription.events():
+            yield event
+
+@router.get("/video/{video_id}/live_chat/stream")
+async def stream_live_chat(
+    request: Request,
+    video_id: str,
+    mode: str = LIVE_CHAT_MODE_QUERY,
+    format: str = Query("sse", enum=list(STREAM_FORMATS), description="NDJSON lines or Server-Sent Events"),
+):
+    if (video_id, mode) not in live_chat_hub.streams and len(live_chat_hub.streams) >= live_chat_hub.max_streams:
+        raise HTTPException(status_code=503, detail="Too many live chats followed")
+    return stream_response(live_chat_events(video_id, mode), request, format)
+
+@router.websocket("/video/{video_id}/live_chat/ws")
+async def live_chat_websocket(websocket: WebSocket, video_id: str, mode: str = "all"):
+    if mode not in LIVE_CHAT_MODES:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+
+    async def forward():
+        async for event in live_chat_events(video_id, mode):
+            await websocket.send_text(dumps(event).decode())
+
+    async def until_disconnect():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    # Whichever ends first: the chat, or the client going away while the chat is quiet
+    tasks = [asyncio.ensure_future(forward()), asyncio.ensure_future(until_disconnect())]
+    done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+
+    error = next((task.exception() for task in done if task.exception()), None)
+    if tasks[0] in done:
+        code = 1013 if isinstance(error, LiveChatFull) else 1000
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
+
+@router.get("/live_chat")
+async def live_chat_streams():
+    return FastJSONResponse({
+        "streams": live_chat_hub.stats()
+    })
+
 @router.get("/videos/trending")
 async def get__videos_trending(
     page: int = Query(1, ge=1), 
     limit: int = Query(30, ge=1, le=50),
+    cursor: Optional[str] = CURSOR_QUERY,
+    gl: str = Query("US", min_length=2, max_length=2, description="Region"),
+    hl: str = Query("en", min_length=2, max_length=10, description="Language"),
+    category: str = Query("music", enum=list(TRENDING_CATEGORIES)),
 ):
     try:
-        start = (page - 1) * limit
-        max_fetch = start + limit
-        videos = await get_trending_videos(proxy=PROXY_URL, max_results=max_fetch, filter_params="EgZtdXNpYw%3D%3D")
-        
-        return {
-            "videos": videos[start:start + limit]
-        }
+        offset = (page - 1) * limit
+        if cursor:
+            offset = snapshot_cursor_offset(cursor)
+
+        if offset is not None:
+            snapshot = trending_snapshots.get(gl, hl, category)
+            if snapshot is not None:
+                return Response(snapshot.render(offset, limit), media_type="application/json", headers={
+                    "X-Cache": "SNAPSHOT",
+                    "Age": str(int(snapshot.age)),
+                })
+            # The snapshot is gone: continue the same listing from a live crawl
+            page, cursor = offset // limit + 1, None
+
+        filter_params = TRENDING_CATEGORIES[category]
+        videos, next_cursor = await paginate(
+            lambda continuation: get_trending_videos_page(filter_params, continuation=continuation, gl=gl, hl=hl),
+            key=("trending", gl, hl, category), page=page, limit=limit, cursor=cursor,
+        )
+
+        return FastJSONResponse({
+            "videos": videos,
+            "next_cursor": next_cursor
+        }, headers={"X-Cache": "MISS"})
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -164,30 +479,74 @@ async def get_videos_location(
     lat: float = Query(..., description="Latitude"),
     lng: float = Query(..., description="Longitude"),
     radius_km: int = Query(50, ge=1, le=500, description="Total search radius (km) around location"),
-    step_km: int = Query(10, ge=1, le=100, description="Distance between each point in the grid (km)"),
+    step_km: int = Query(10, ge=1, le=100, description="Smallest cell size (km) the grid is refined down to"),
     per_location_limit: int = Query(20, ge=1, le=50, description="Maximum number of videos per coordinate"),
+    max_points: int = Query(LOCATION_MAX_POINTS, ge=1, le=2000, description="Maximum number of coordinates queried"),
 ):
     try:
-        grid_locations = generate_grid_locations(center_lat=lat, center_lng=lng, step_km=step_km, radius_km=radius_km)
-
-        tasks = [
-            get_videos_by_location(location=loc, radius=f"{step_km}km", max_results=per_location_limit)
-            for loc in grid_locations
-        ]
-
-        results = await asyncio.gather(*tasks)
-
-        unique = {}
-        for video_list in results:
-            for video in video_list:
-                unique[video["videoId"]] = video
+        crawl = LocationCrawl(
+            center_lat=lat, center_lng=lng,
+            radius_km=radius_km, step_km=step_km, per_location_limit=per_location_limit,
+            max_points=max_points,
+        )
+        unique = await crawl.run()
 
-        return {
+        return FastJSONResponse({
             "center": f"{lat},{lng}",
-            "locations_scanned": len(grid_locations),
+            "locations_scanned": crawl.points_scanned,
+            "locations_failed": crawl.points_failed,
+            "cells_refined": crawl.cells_refined,
             "total_unique_videos": len(unique),
             "videos": list(unique.values())
-        }
+        })
 
     except Exception as e:
-        return {"error": str(e)}
\ No newline at end of file
+        return {"error": str(e)}
+
+
+@router.post("/jobs", status_code=202)
+async def create_job(body: JobRequest):
+    params = body.dict(exclude={"kind"})
+    try:
+        job = await job_queue.submit(body.kind, params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return FastJSONResponse(public_job(job), status_code=202)
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return FastJSONResponse(public_job(job))
+
+@router.get("/jobs/{job_id}/results")
+async def get_job_results(
+    job_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    items = await job_queue.results(job_id, offset, limit)
+    next_offset = offset + len(items)
+    return FastJSONResponse({
+        "job_id": job_id,
+        "status": job["status"],
+        "offset": offset,
+        "total": job["items"],
+        "items": items,
+        # More may still arrive while the job is running
+        "next_offset": next_offset if next_offset < job["items"] or job["status"] in ("queued", "running") else None,
+    })
+
+@router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    await job_queue.cancel(job_id)
+    return FastJSONResponse(public_job(await job_queue.get(job_id)))
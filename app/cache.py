@@ -0,0 +1,200 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from .fastjson import dumps, loads
+from .metrics import CACHE_LOOKUPS
+from .singleflight import single_flight
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "5000"))
+CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH", "cache.sqlite3")
+# Entries are kept this long past their TTL; get_or_fetch serves them while it refreshes them in the background
+CACHE_MAX_STALE = int(os.getenv("CACHE_MAX_STALE", "3600"))
+
+CACHE_TTLS = {
+    "video_detail": int(os.getenv("CACHE_TTL_VIDEO_DETAIL", "300")),
+    "video_detail_missing": int(os.getenv("CACHE_TTL_VIDEO_DETAIL_MISSING", "120")),
+    "channel_info": int(os.getenv("CACHE_TTL_CHANNEL_INFO", "3600")),
+    "channel_info_missing": int(os.getenv("CACHE_TTL_CHANNEL_INFO_MISSING", "600")),
+    "channel_playlists": int(os.getenv("CACHE_TTL_CHANNEL_PLAYLISTS", "1800")),
+    "channel_videos_tab": int(os.getenv("CACHE_TTL_CHANNEL_VIDEOS_TAB", "86400")),
+    "comment_sort_token": int(os.getenv("CACHE_TTL_COMMENT_SORT_TOKEN", "21600")),
+    "page_cursor": int(os.getenv("CACHE_TTL_PAGE_CURSOR", "900")),
+}
+
+class MemoryCache:
+    """Size-bounded LRU of (expires_at, value); expired entries are returned until max_stale has passed too"""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, max_stale: int = CACHE_MAX_STALE):
+        self.max_entries = max_entries
+        self.max_stale = max_stale
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Tuple[float, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] + self.max_stale < time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    async def set(self, key: str, value: Any, expires_at: float):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def delete(self, key: str):
+        self._entries.pop(key, None)
+
+class SQLiteCache:
+    """On-disk cache shared by every uvicorn worker on the host"""
+
+    PURGE_EVERY = 500
+
+    def __init__(self, path: str = CACHE_SQLITE_PATH, max_stale: int = CACHE_MAX_STALE):
+        self.path = path
+        self.max_stale = max_stale
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def _get(self, key: str) -> Optional[Tuple[float, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT expires_at, value FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None or row[0] + self.max_stale < time.time():
+            return None
+        return row[0], loads(row[1])
+
+    def _set(self, key: str, value: Any, expires_at: float):
+        data = dumps(value)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, data, expires_at),
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                self._conn.execute("DELETE FROM cache WHERE expires_at < ?", (time.time() - self.max_stale,))
+
+    def _delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    async def get(self, key: str) -> Optional[Tuple[float, Any]]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: Any, expires_at: float):
+        await asyncio.to_thread(self._set, key, value, expires_at)
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(self._delete, key)
+
+class ResponseCache:
+    """In-memory LRU in front of an optional shared SQLite tier"""
+
+    def __init__(self, memory: MemoryCache, disk: Optional[SQLiteCache] = None, ttls: Dict[str, int] = CACHE_TTLS):
+        self.memory = memory
+        self.disk = disk
+        self.ttls = ttls
+        self._revalidating: Dict[str, asyncio.Future] = {}
+
+    async def _lookup(self, cache_key: str) -> Tuple[Optional[Tuple[float, Any]], str]:
+        """(expires_at, value) even if expired, and which tier answered"""
+        entry = await self.memory.get(cache_key)
+        if entry is not None:
+            return entry, "memory_hit"
+        if self.disk is not None:
+            entry = await self.disk.get(cache_key)
+            if entry is not None:
+                await self.memory.set(cache_key, entry[1], entry[0])
+                return entry, "disk_hit"
+        return None, "miss"
+
+    async def get(self, namespace: str, key: str) -> Optional[Any]:
+        entry, result = await self._lookup(f"{namespace}:{key}")
+        if entry is not None and entry[0] < time.time():
+            entry, result = None, "miss"
+        CACHE_LOOKUPS.labels(namespace, result).inc()
+        return entry[1] if entry is not None else None
+
+    async def set(self, namespace: str, key: str, value: Any, ttl: Optional[int] = None):
+        ttl = self.ttls.get(namespace, 60) if ttl is None else ttl
+        if ttl <= 0:
+            return
+        cache_key = f"{namespace}:{key}"
+        expires_at = time.time() + ttl
+        await self.memory.set(cache_key, value, expires_at)
+        if self.disk is not None:
+            await self.disk.set(cache_key, value, expires_at)
+
+    async def invalidate(self, namespace: str, key: str):
+        cache_key = f"{namespace}:{key}"
+        await self.memory.delete(cache_key)
+        if self.disk is not None:
+            await self.disk.delete(cache_key)
+
+    async def get_or_fetch(
+        self,
+        namespace: str,
+        key: str,
+        fetch: Callable[[], Awaitable[Any]],
+        negative: Optional[Callable[[Any], bool]] = None,
+    ) -> Tuple[Any, str]:
+        """(value, X-Cache status): HIT, STALE while it is refreshed in the background, NEGATIVE or MISS"""
+        async def fetch_and_store() -> Any:
+            value = await fetch()
+            # Deleted videos and missing channels get the short <namespace>_missing TTL and are never served stale
+            if negative is not None and negative(value):
+                await self.set(namespace, key, value, ttl=self.ttls.get(f"{namespace}_missing", 60))
+            else:
+                await self.set(namespace, key, value)
+            return value
+
+        entry, result = await self._lookup(f"{namespace}:{key}")
+        if entry is not None:
+            expires_at, value = entry
+            missing = negative is not None and negative(value)
+            if expires_at >= time.time():
+                CACHE_LOOKUPS.labels(namespace, "negative" if missing else result).inc()
+                return value, "NEGATIVE" if missing else "HIT"
+            if not missing:
+                CACHE_LOOKUPS.labels(namespace, "stale").inc()
+                self._revalidate(namespace, key, fetch_and_store)
+                return value, "STALE"
+
+        CACHE_LOOKUPS.labels(namespace, "miss").inc()
+        # Concurrent misses for the same key wait on one upstream fetch
+        value = await single_flight.do(namespace, key, fetch_and_store)
+        return value, "MISS"
+
+    def _revalidate(self, namespace: str, key: str, fetch_and_store: Callable[[], Awaitable[Any]]):
+        cache_key = f"{namespace}:{key}"
+        if cache_key in self._revalidating:
+            return
+        task = asyncio.ensure_future(single_flight.do(namespace, key, fetch_and_store))
+        self._revalidating[cache_key] = task
+        task.add_done_callback(lambda task: self._revalidated(cache_key, task))
+
+    def _revalidated(self, cache_key: str, task: asyncio.Future):
+        del self._revalidating[cache_key]
+        if not task.cancelled() and task.exception() is not None:
+            # The stale entry keeps being served until it is older than CACHE_MAX_STALE
+            print(f"Cache revalidation of {cache_key} failed:", task.exception())
+
+def build_response_cache() -> ResponseCache:
+    disk = SQLiteCache(CACHE_SQLITE_PATH) if CACHE_BACKEND == "sqlite" else None
+    return ResponseCache(MemoryCache(CACHE_MAX_ENTRIES), disk)
+
+response_cache = build_response_cache()
@@ -0,0 +1,84 @@
+import importlib.util
+import os
+import httpx
+from typing import Dict, Optional
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "15"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "false").lower() in ("1", "true", "yes")
+
+# Point at a local mock InnerTube server (see benchmarks/) instead of youtube.com
+YOUTUBE_BASE_URL = os.getenv("YOUTUBE_BASE_URL", "https://www.youtube.com").rstrip("/")
+
+DEFAULT_HEADERS = {
+    "Content-Type": "application/json",
+    "User-Agent": "Mozilla/5.0",
+    "Origin": "https://www.youtube.com",
+    "Referer": "https://www.youtube.com/"
+}
+
+class ClientPool:
+    """One keep-alive httpx.AsyncClient per proxy, shared by every service"""
+
+    def __init__(
+        self,
+        max_connections: int = HTTP_MAX_CONNECTIONS,
+        max_keepalive: int = HTTP_MAX_KEEPALIVE,
+        keepalive_expiry: float = HTTP_KEEPALIVE_EXPIRY,
+        timeout: float = HTTP_TIMEOUT,
+        http2: bool = HTTP2_ENABLED,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = timeout
+        self.http2 = http2 and importlib.util.find_spec("h2") is not None
+        if http2 and not self.http2:
+            print("HTTP2_ENABLED is set but the 'h2' package is missing, using HTTP/1.1")
+        # Replaces the network for every client, used by the offline benchmarks
+        self.transport = transport
+        self._clients: Dict[Optional[str], httpx.AsyncClient] = {}
+
+    def get(self, proxy: Optional[str] = None) -> httpx.AsyncClient:
+        client = self._clients.get(proxy)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                proxies=proxy,
+                headers=DEFAULT_HEADERS,
+                timeout=self.timeout,
+                limits=self.limits,
+                http2=self.http2,
+                transport=self.transport,
+            )
+            self._clients[proxy] = client
+        return client
+
+    async def aclose(self):
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            await client.aclose()
+
+_pool: Optional[ClientPool] = None
+
+def init_client_pool(**kwargs) -> ClientPool:
+    global _pool
+    _pool = ClientPool(**kwargs)
+    return _pool
+
+async def close_client_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.aclose()
+        _pool = None
+
+def get_client(proxy: Optional[str] = None) -> httpx.AsyncClient:
+    # Fall back to a lazily created pool when used outside the FastAPI lifespan
+    if _pool is None:
+        init_client_pool()
+    return _pool.get(proxy)
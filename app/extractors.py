@@ -0,0 +1,211 @@
+from collections import Counter
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+Path = Tuple[Union[str, int], ...]
+Column = Union[str, Tuple[str, str]]
+
+class Field(NamedTuple):
+    paths: Tuple[Path, ...]
+    default: Any = ""
+    convert: Optional[Callable[[Any], Any]] = None
+
+def field(*paths: Path, default: Any = "", convert: Optional[Callable[[Any], Any]] = None) -> Field:
+    """Value at the first path that yields something truthy; default when every path is missing"""
+    return Field(paths, default, convert)
+
+def watch_url(video_id: Optional[str]) -> str:
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+def text_of(title_obj: Dict) -> str:
+    if "simpleText" in title_obj:
+        return title_obj["simpleText"]
+    elif "runs" in title_obj and title_obj["runs"]:
+        return "".join([run.get("text", "") for run in title_obj["runs"]])
+    return ""
+
+def chat_text(message: Dict) -> str:
+    """Live chat runs, with emojis as their shortcut (or the emoji itself for unicode ones)"""
+    if "simpleText" in message:
+        return message["simpleText"]
+    parts = []
+    for run in message.get("runs", []):
+        if "text" in run:
+            parts.append(run["text"])
+        elif "emoji" in run:
+            emoji = run["emoji"]
+            shortcuts = emoji.get("shortcuts") or []
+            parts.append(shortcuts[0] if emoji.get("isCustomEmoji") and shortcuts else emoji.get("emojiId", ""))
+    return "".join(parts)
+
+def badge_text(overlays: List[Dict]) -> str:
+    for overlay in overlays:
+        badges = overlay.get("thumbnailOverlayBadgeViewModel", {}).get("thumbnailBadges", [])
+        if badges:
+            text = badges[0].get("thumbnailBadgeViewModel", {}).get("text", "")
+            if text:
+                return text
+    return ""
+
+def count(value: Any) -> int:
+    return int(value or 0)
+
+VIDEO_RENDERER_FIELDS = {
+    "video_id": field(("videoId",), default=None),
+    "url": field(("videoId",), default=None, convert=watch_url),
+    "title": field(("title", "runs", 0, "text")),
+    "duration": field(("lengthText", "simpleText")),
+    "views": field(("viewCountText", "simpleText")),
+    "short_views": field(("shortViewCountText", "simpleText"), ("shortViewCountText", "runs", 0, "text")),
+    "channel": field(("ownerText", "runs", 0, "text")),
+    "channel_id": field(("ownerText", "runs", 0, "navigationEndpoint", "browseEndpoint", "browseId")),
+    "byline": field(("shortBylineText", "runs", 0, "text")),
+    "published_time": field(("publishedTimeText", "simpleText")),
+    "description_snippet": field(("detailedMetadataSnippets", 0, "snippetText", "runs", 0, "text")),
+    "thumbnails": field(("thumbnail", "thumbnails"), default=[]),
+}
+
+LIVE_CHAT_MESSAGE_FIELDS = {
+    "id": field(("id",), default=None),
+    "author": field(("authorName", "simpleText")),
+    "author_channel_id": field(("authorExternalChannelId",)),
+    "avatar": field(("authorPhoto", "thumbnails", -1, "url")),
+    # membership items carry their text in the header instead
+    "message": field(("message",), ("headerSubtext",), default={}, convert=chat_text),
+    "amount": field(("purchaseAmountText", "simpleText")),
+    "timestamp_usec": field(("timestampUsec",), default=0, convert=count),
+}
+
+THUMBNAIL_VIEW_MODEL = ("contentImage", "collectionThumbnailViewModel", "primaryThumbnail", "thumbnailViewModel")
+
+# every renderer we read, described once; services pick the columns they expose
+RENDERER_FIELDS: Dict[str, Dict[str, Field]] = {
+    "videoRenderer": VIDEO_RENDERER_FIELDS,
+    "gridVideoRenderer": VIDEO_RENDERER_FIELDS,
+    "playlistVideoRenderer": {
+        "video_id": field(("videoId",), default=None),
+        "title": field(("title",), default={}, convert=text_of),
+        "published_time": field(("publishedTimeText", "simpleText")),
+        "duration": field(("lengthText", "simpleText")),
+        "thumbnail": field(("thumbnail", "thumbnails", -1, "url")),
+    },
+    "lockupViewModel": {
+        "playlist_id": field(("rendererContext", "commandContext", "onTap", "innertubeCommand", "watchEndpoint", "playlistId")),
+        "title": field(("metadata", "lockupMetadataViewModel", "title", "content")),
+        "thumbnail": field(THUMBNAIL_VIEW_MODEL + ("image", "sources", -1, "url")),
+        "video_count": field(THUMBNAIL_VIEW_MODEL + ("overlays",), default=[], convert=badge_text),
+    },
+    "liveChatTextMessageRenderer": LIVE_CHAT_MESSAGE_FIELDS,
+    "liveChatPaidMessageRenderer": LIVE_CHAT_MESSAGE_FIELDS,
+    "liveChatPaidStickerRenderer": LIVE_CHAT_MESSAGE_FIELDS,
+    "liveChatMembershipItemRenderer": LIVE_CHAT_MESSAGE_FIELDS,
+    "commentEntityPayload": {
+        "comment_id": field(("properties", "commentId"), default=None),
+        "content": field(("properties", "content", "content")),
+        "author": field(("author", "displayName")),
+        "avatar": field(("author", "avatarThumbnailUrl")),
+        "published_time": field(("properties", "publishedTime"), default="Unknown"),
+        "likes": field(("toolbar", "likeCountLiked"), default=0, convert=count),
+        "replies": field(("toolbar", "replyCount"), default=0, convert=count),
+    },
+}
+
+# shared stand-ins for a missing mapping or list; generated code only reads from them
+EMPTY_DICT: Dict = {}
+EMPTY_LIST: Tuple = ()
+
+LOOKUP_ERRORS = (KeyError, IndexError, TypeError)
+
+def _safe_walk(target: str, base: str, path: Path) -> List[str]:
+    """Statements binding target to the value at path below base, or None, without raising"""
+    lines = []
+    current = base
+    for i, key in enumerate(path):
+        last = i == len(path) - 1
+        empty = "EMPTY_LIST" if not last and isinstance(path[i + 1], int) else "EMPTY_DICT"
+        if i == 0 and base != "r":
+            # shared nodes may hold None
+            lines.append(f"t = {current} or {'EMPTY_LIST' if isinstance(key, int) else 'EMPTY_DICT'}")
+            current = "t"
+        if isinstance(key, int):
+            bound = f"len({current}) > {key}" if key > 0 else (current if key in (0, -1) else f"len({current}) >= {-key}")
+            lines.append(f"{target if last else 't'} = {current}[{key}] if {bound} else {'None' if last else empty}")
+        else:
+            lines.append(f"{target if last else 't'} = {current}.get({key!r})" + ("" if last else f" or {empty}"))
+        current = "t"
+    return lines
+
+def _walk(target: str, base: str, path: Path, expect_miss: bool = False) -> List[str]:
+    """Subscript straight down the path; only a miss pays for the exception and the safe walk"""
+    if not path:
+        return [f"{target} = {base}"]
+    if expect_miss or (base == "r" and len(path) == 1):
+        return _safe_walk(target, base, path)
+    subscripts = "".join(f"[{key!r}]" for key in path)
+    return [
+        "try:",
+        f"    {target} = {base}{subscripts}",
+        "except LOOKUP_ERRORS:",
+    ] + ["    " + line for line in _safe_walk(target, base, path)]
+
+def _shared_prefixes(paths: List[Path]) -> List[Path]:
+    """Prefixes walked by more than one path, so each is evaluated once per item"""
+    counts = Counter(path[:i] for path in paths for i in range(1, len(path) + 1))
+    shared = [prefix for prefix, n in counts.items() if n > 1]
+    # ("a",) is redundant when ("a", "b") is walked by exactly the same paths
+    return sorted(
+        (prefix for prefix in shared
+         if not any(len(other) == len(prefix) + 1 and other[:-1] == prefix and counts[other] == counts[prefix]
+                    for other in shared)),
+        key=len,
+    )
+
+def compile_extractor(renderer: str, columns: Sequence[Column]) -> Callable[[Dict], Dict]:
+    """Compile the chosen columns of a renderer spec into one flat function of dict lookups.
+
+    A column is a field name, or an (output_key, field_name) pair when the service
+    exposes the field under a different key. Output keys keep the column order.
+    """
+    specs = RENDERER_FIELDS[renderer]
+    resolved = [(column, column) if isinstance(column, str) else column for column in columns]
+    fields = [(key, specs[name]) for key, name in resolved]
+
+    nodes: Dict[Path, str] = {}
+
+    def base(path: Path, inclusive: bool) -> Tuple[str, Path]:
+        for i in range(len(path) if inclusive else len(path) - 1, 0, -1):
+            if path[:i] in nodes:
+                return nodes[path[:i]], path[i:]
+        return "r", path
+
+    namespace: Dict[str, Any] = {"EMPTY_DICT": EMPTY_DICT, "EMPTY_LIST": EMPTY_LIST, "LOOKUP_ERRORS": LOOKUP_ERRORS}
+    lines = ["def extract(r):"]
+
+    for prefix in _shared_prefixes([path for _, spec in fields for path in spec.paths]):
+        var, rest = base(prefix, inclusive=False)
+        name = nodes[prefix] = f"n{len(nodes)}"
+        lines += ["    " + line for line in _walk(name, var, rest)]
+
+    for i, (_, spec) in enumerate(fields):
+        value = f"v{i}"
+        for j, path in enumerate(spec.paths):
+            # fallback paths only run when the earlier ones came back empty
+            indent = "        " if j else "    "
+            if j:
+                lines.append(f"    if not {value}:")
+            lines += [indent + line for line in _walk(value, *base(path, inclusive=True), expect_miss=len(spec.paths) > 1)]
+        if len(spec.paths) > 1:
+            lines += [f"    if not {value}:", f"        {value} = {spec.default!r}"]
+        elif spec.default is not None:
+            lines += [f"    if {value} is None:", f"        {value} = {spec.default!r}"]
+        if spec.convert is not None:
+            namespace[f"c{i}"] = spec.convert
+            lines.append(f"    {value} = c{i}({value})")
+
+    lines.append("    return {" + ", ".join(f"{key!r}: v{i}" for i, (key, _) in enumerate(fields)) + "}")
+
+    source = "\n".join(lines)
+    exec(compile(source, f"<extractor {renderer}>", "exec"), namespace)
+    extract = namespace["extract"]
+    extract.__name__ = f"extract_{renderer}"
+    extract.__source__ = source
+    return extract
@@ -0,0 +1,60 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+HANDLES_SQLITE_PATH = os.getenv("HANDLES_SQLITE_PATH", "handles.sqlite3")
+HANDLE_TTL = int(os.getenv("CACHE_TTL_CHANNEL_HANDLE", "2592000"))
+HANDLE_MISSING_TTL = int(os.getenv("CACHE_TTL_CHANNEL_HANDLE_MISSING", "3600"))
+
+class HandleStore:
+    """handle -> channel_id in SQLite; never evicted for other traffic, survives restarts"""
+
+    PURGE_EVERY = 500
+
+    def __init__(self, path: str = HANDLES_SQLITE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._writes = 0
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # Opened on first use so importing the app does not create the database
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS handles (handle TEXT PRIMARY KEY, channel_id TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _get(self, handle: str) -> Optional[str]:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT channel_id FROM handles WHERE handle = ? AND expires_at >= ?", (handle, time.time()),
+            ).fetchone()
+        return row[0] if row else None
+
+    def _set(self, handle: str, channel_id: str, ttl: int):
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO handles (handle, channel_id, expires_at) VALUES (?, ?, ?)",
+                (handle, channel_id, time.time() + ttl),
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                self.conn.execute("DELETE FROM handles WHERE expires_at < ?", (time.time(),))
+
+    async def get(self, handle: str) -> Optional[str]:
+        """The stored channel ID, "" for a handle known not to exist, None if unknown or expired"""
+        return await asyncio.to_thread(self._get, handle)
+
+    async def set(self, handle: str, channel_id: str, ttl: int = HANDLE_TTL):
+        await asyncio.to_thread(self._set, handle, channel_id, ttl)
+
+handle_store = HandleStore()
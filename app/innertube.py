@@ -0,0 +1,160 @@
+import asyncio
+import time
+import httpx
+from typing import Awaitable, Callable, Dict, List, Optional
+from .client import YOUTUBE_BASE_URL, get_client
+from .fastjson import dumps, loads
+from .metrics import (
+    UPSTREAM_BYTES, UPSTREAM_IN_FLIGHT, UPSTREAM_LATENCY, UPSTREAM_RATE_LIMITED, UPSTREAM_RETRIES,
+    current_route, proxy_label,
+)
+from .pagination import current_crawl_stats
+from .proxy import mask_proxy_url, proxy_pool
+from .ratelimit import (
+    RETRY_MAX_ATTEMPTS, RETRY_MAX_DELAY, RETRY_STATUSES,
+    backoff_delay, endpoint_family, parse_retry_after, rate_limiters, retry_budget,
+)
+from .utils import api_key_manager, get_youtube_api_key
+
+INNERTUBE_URL = YOUTUBE_BASE_URL + "/youtubei/v1/{endpoint}?key={key}"
+
+# send(proxy) -> response: one attempt of an upstream request through the given proxy
+Sender = Callable[[Optional[str]], Awaitable[httpx.Response]]
+
+# A revoked or rotated key gets a 403, or a 400 whose error names the key; other 400s are bad requests
+STALE_KEY_MARKERS = (b"API_KEY_INVALID", b"API key not valid", b"API key expired")
+
+def is_stale_key_response(resp: httpx.Response) -> bool:
+    if resp.status_code == 403:
+        return True
+    return resp.status_code == 400 and any(marker in resp.content for marker in STALE_KEY_MARKERS)
+
+def continuation_items(data: Dict) -> List[Dict]:
+    """Items of every append/reload action in a continuation response"""
+    items = []
+    for key in ("onResponseReceivedActions", "onResponseReceivedCommands", "onResponseReceivedEndpoints"):
+        for action in data.get(key) or []:
+            for command in ("appendContinuationItemsAction", "reloadContinuationItemsCommand"):
+                items += action.get(command, {}).get("continuationItems", [])
+    return items
+
+def search_result_sections(data: Dict) -> List[Dict]:
+    return data.get("contents", {}) \
+               .get("twoColumnSearchResultsRenderer", {}) \
+               .get("primaryContents", {}) \
+               .get("sectionListRenderer", {}) \
+               .get("contents", [])
+
+def find_continuation_token(items: List[Dict]) -> Optional[str]:
+    for item in items:
+        renderer = item.get("continuationItemRenderer")
+        if renderer is None:
+            continue
+        # Reply threads put the command behind a "Show more replies" button
+        command = renderer.get("continuationEndpoint") or \
+            renderer.get("button", {}).get("buttonRenderer", {}).get("command", {})
+        token = command.get("continuationCommand", {}).get("token")
+        if token:
+            return token
+    return None
+
+async def send_innertube(endpoint: str, payload: Dict, proxy: Optional[str] = None, timeout: Optional[float] = None) -> httpx.Response:
+    client = get_client(proxy)
+    kwargs = {"timeout": timeout} if timeout is not None else {}
+
+    API_KEY = await get_youtube_api_key()
+    resp = await client.post(INNERTUBE_URL.format(endpoint=endpoint, key=API_KEY), content=dumps(payload), **kwargs)
+
+    if is_stale_key_response(resp) and api_key_manager.invalidate(API_KEY):
+        API_KEY = await get_youtube_api_key()
+        resp = await client.post(INNERTUBE_URL.format(endpoint=endpoint, key=API_KEY), content=dumps(payload), **kwargs)
+
+    return resp
+
+async def send_measured(endpoint: str, send: Sender, proxy: Optional[str] = None) -> httpx.Response:
+    UPSTREAM_IN_FLIGHT.labels(endpoint).inc()
+    started = time.perf_counter()
+    status = "transport_error"
+    try:
+        resp = await send(proxy)
+        status = str(resp.status_code)
+    finally:
+        UPSTREAM_IN_FLIGHT.labels(endpoint).dec()
+        UPSTREAM_LATENCY.labels(endpoint, current_route.get(), status).observe(time.perf_counter() - started)
+
+    if resp.status_code == 429:
+        UPSTREAM_RATE_LIMITED.labels(proxy_label(proxy and mask_proxy_url(proxy))).inc()
+    return resp
+
+async def send_with_proxy(endpoint: str, send: Sender, proxy: Optional[str] = None) -> httpx.Response:
+    # An explicit proxy bypasses the pool
+    if proxy is not None or not proxy_pool:
+        return await send_measured(endpoint, send, proxy=proxy)
+
+    async with proxy_pool.lease() as leased:
+        started = time.monotonic()
+        try:
+            resp = await send_measured(endpoint, send, proxy=leased.url)
+        except httpx.TransportError:
+            proxy_pool.record_error(leased)
+            raise
+
+        if resp.status_code == 429:
+            proxy_pool.record_rate_limited(leased)
+        elif resp.status_code >= 500:
+            proxy_pool.record_error(leased)
+        else:
+            proxy_pool.record_success(leased, time.monotonic() - started)
+
+    return resp
+
+async def send_upstream(endpoint: str, send: Sender, proxy: Optional[str] = None) -> httpx.Response:
+    """Rate limit, proxy pool, metrics and retries around `send`; raises for error statuses"""
+    limiter = rate_limiters[endpoint_family(endpoint)]
+    retry_budget.record_request()
+    attempt = 0
+
+    while True:
+        await limiter.acquire()
+        can_retry = attempt + 1 < RETRY_MAX_ATTEMPTS
+
+        try:
+            resp = await send_with_proxy(endpoint, send, proxy=proxy)
+        except httpx.TransportError:
+            if not (can_retry and retry_budget.try_spend()):
+                raise
+            UPSTREAM_RETRIES.labels(endpoint, "transport_error").inc()
+            delay = backoff_delay(attempt)
+        else:
+            if resp.status_code not in RETRY_STATUSES:
+                resp.raise_for_status()
+                UPSTREAM_BYTES.labels(endpoint).observe(len(resp.content))
+                stats = current_crawl_stats.get()
+                if stats is not None:
+                    stats.record_response(len(resp.content))
+                return resp
+
+            retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+            # Waiting longer than RETRY_MAX_DELAY would only hold the request open
+            if retry_after is not None and retry_after > RETRY_MAX_DELAY:
+                can_retry = False
+            if not (can_retry and retry_budget.try_spend()):
+                resp.raise_for_status()
+            UPSTREAM_RETRIES.labels(endpoint, str(resp.status_code)).inc()
+            delay = max(backoff_delay(attempt), retry_after or 0)
+
+        attempt += 1
+        await asyncio.sleep(delay)
+
+async def innertube_post(endpoint: str, payload: Dict, proxy: Optional[str] = None, timeout: Optional[float] = None) -> Dict:
+    resp = await send_upstream(
+        endpoint, lambda proxy: send_innertube(endpoint, payload, proxy=proxy, timeout=timeout), proxy=proxy,
+    )
+    return loads(resp.content)
+
+async def youtube_get(path: str, proxy: Optional[str] = None, timeout: Optional[float] = None) -> httpx.Response:
+    """A youtube.com page, through the same rate limiter, proxy pool and retries as InnerTube calls"""
+    kwargs = {"timeout": timeout} if timeout is not None else {}
+    return await send_upstream(
+        "page", lambda proxy: get_client(proxy).get(YOUTUBE_BASE_URL + path, **kwargs), proxy=proxy,
+    )
@@ -0,0 +1,362 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+from .fastjson import dumps, loads
+from .pagination import Crawl, PageFetcher
+from .services.channel import get_channel_videos_page
+from .services.comment import COMMENT_SORTS, REPLY_DEPTHS, get_video_comments_page
+from .services.handle import resolve_channel_input
+from .services.location import LocationCrawl
+from .services.playlist import get_videos_from_playlist_page
+
+JOBS_SQLITE_PATH = os.getenv("JOBS_SQLITE_PATH", "jobs.sqlite3")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# A running job whose lease is not renewed for this long is picked up again, e.g. after a crash
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "5"))
+# Also how long a job cancelled from another process may keep crawling
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", str(JOB_LEASE_SECONDS / 3)))
+
+JOB_KINDS = ("channel", "playlist", "comments", "location")
+FINISHED_STATUSES = ("done", "failed", "cancelled")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params BLOB NOT NULL,
+    status TEXT NOT NULL,
+    continuation TEXT,
+    started INTEGER NOT NULL DEFAULT 0,
+    pages INTEGER NOT NULL DEFAULT 0,
+    items INTEGER NOT NULL DEFAULT 0,
+    runs INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    owner TEXT,
+    lease_until REAL NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS job_items (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    item BLOB NOT NULL,
+    PRIMARY KEY (job_id, seq)
+);
+"""
+
+JOB_COLUMNS = "id, kind, params, status, continuation, started, pages, items, runs, error, created_at, updated_at, finished_at"
+
+class LeaseLost(Exception):
+    """The job was cancelled or claimed by another worker while this one ran it"""
+
+def job_row(row: Tuple) -> Dict:
+    job = dict(zip([column.strip() for column in JOB_COLUMNS.split(",")], row))
+    job["params"] = loads(job["params"])
+    job["started"] = bool(job["started"])
+    return job
+
+def public_job(job: Dict) -> Dict:
+    return {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "params": job["params"],
+        "status": job["status"],
+        "pages": job["pages"],
+        "items": job["items"],
+        "runs": job["runs"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+        "finished_at": job["finished_at"],
+    }
+
+class JobStore:
+    """Jobs, their continuation checkpoints and collected items in SQLite"""
+
+    def __init__(self, path: str = JOBS_SQLITE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # Opened on first use so importing the app does not create the database
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def create(self, kind: str, params: Dict) -> Dict:
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO jobs (id, kind, params, status, created_at, updated_at) VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, kind, dumps(params), now, now),
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self.conn.execute(f"SELECT {JOB_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return job_row(row) if row else None
+
+    def claim(self, owner: str) -> Optional[Dict]:
+        """Take the oldest queued job, or a running one whose worker stopped renewing its lease"""
+        now = time.time()
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute(
+                    "SELECT id FROM jobs WHERE status = 'queued' OR (status = 'running' AND lease_until < ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row:
+                    self.conn.execute(
+                        "UPDATE jobs SET status = 'running', owner = ?, lease_until = ?, runs = runs + 1, updated_at = ? WHERE id = ?",
+                        (owner, now + JOB_LEASE_SECONDS, now, row[0]),
+                    )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return self.get(row[0]) if row else None
+
+    def renew(self, job_id: str, owner: str) -> bool:
+        now = time.time()
+        with self._lock:
+            cursor = self.conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND owner = ? AND status = 'running'",
+                (now + JOB_LEASE_SECONDS, job_id, owner),
+            )
+        return cursor.rowcount == 1
+
+    def checkpoint(self, job_id: str, owner: str, items: List[Any], continuation: Optional[str]):
+        """Store one page of items and the token after it in a single transaction"""
+        now = time.time()
+        rows = [dumps(item) for item in items]
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute(
+                    "SELECT items FROM jobs WHERE id = ? AND owner = ? AND status = 'running'", (job_id, owner)
+                ).fetchone()
+                if row is None:
+                    raise LeaseLost(job_id)
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO job_items (job_id, seq, item) VALUES (?, ?, ?)",
+                    [(job_id, row[0] + i, data) for i, data in enumerate(rows)],
+                )
+                self.conn.execute(
+                    "UPDATE jobs SET continuation = ?, started = 1, pages = pages + 1, items = items + ?, "
+                    "lease_until = ?, updated_at = ? WHERE id = ?",
+                    (continuation, len(rows), now + JOB_LEASE_SECONDS, now, job_id),
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def finish(self, job_id: str, owner: str, status: str, error: Optional[str] = None):
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, owner = NULL, lease_until = 0, updated_at = ?, finished_at = ? "
+                "WHERE id = ? AND owner = ? AND status = 'running'",
+                (status, error, now, now, job_id, owner),
+            )
+
+    def release(self, job_id: str, owner: str):
+        """Hand a job back to the queue, e.g. on shutdown, so the next start resumes it right away"""
+        with self._lock:
+            self.conn.execute(
+                "UPDATE jobs SET status = 'queued', owner = NULL, lease_until = 0, updated_at = ? "
+                "WHERE id = ? AND owner = ? AND status = 'running'",
+                (time.time(), job_id, owner),
+            )
+
+    def cancel(self, job_id: str) -> bool:
+        now = time.time()
+        with self._lock:
+            cursor = self.conn.execute(
+                "UPDATE jobs SET status = 'cancelled', owner = NULL, lease_until = 0, updated_at = ?, finished_at = ? "
+                "WHERE id = ? AND status IN ('queued', 'running')",
+                (now, now, job_id),
+            )
+        return cursor.rowcount == 1
+
+    def items(self, job_id: str, offset: int, limit: int) -> List[Any]:
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT item FROM job_items WHERE job_id = ? AND seq >= ? ORDER BY seq LIMIT ?",
+                (job_id, offset, limit),
+            ).fetchall()
+        return [loads(row[0]) for row in rows]
+
+def validate_params(kind: str, params: Dict) -> Dict:
+    if kind not in JOB_KINDS:
+        raise ValueError(f"kind must be one of {', '.join(JOB_KINDS)}")
+    if kind == "location":
+        if params.get("lat") is None or params.get("lng") is None:
+            raise ValueError("location jobs need lat and lng")
+    elif not params.get("target"):
+        raise ValueError(f"{kind} jobs need a target")
+    if params.get("reply_depth") is not None and params["reply_depth"] not in REPLY_DEPTHS:
+        raise ValueError(f"reply_depth must be one of {', '.join(REPLY_DEPTHS)}")
+    if params.get("sort") is not None and params["sort"] not in COMMENT_SORTS:
+        raise ValueError(f"sort must be one of {', '.join(COMMENT_SORTS)}")
+    return {key: value for key, value in params.items() if value is not None}
+
+async def job_fetcher(kind: str, params: Dict) -> PageFetcher:
+    target = params.get("target")
+    if kind == "channel":
+        channel_id = await resolve_channel_input(target)
+        return lambda continuation: get_channel_videos_page(channel_id, continuation=continuation)
+    if kind == "playlist":
+        return lambda continuation: get_videos_from_playlist_page(target, continuation=continuation)
+    if kind == "comments":
+        reply_depth = params.get("reply_depth", "all")
+        sort = params.get("sort", "top")
+        return lambda continuation: get_video_comments_page(
+            target, continuation=continuation, reply_depth=reply_depth, sort=sort,
+        )
+
+    async def location_page(continuation: Optional[str]) -> Tuple[List[Dict], Optional[str]]:
+        # The quadtree is not a continuation chain: it runs as one page and restarts from scratch
+        crawl = LocationCrawl(
+            center_lat=params["lat"], center_lng=params["lng"],
+            **{key: params[key] for key in ("radius_km", "step_km", "per_location_limit", "max_points") if key in params},
+        )
+        return list((await crawl.run()).values()), None
+
+    return location_page
+
+class JobQueue:
+    """Pool of async workers running crawl jobs stored in SQLite, checkpointing after every page"""
+
+    def __init__(self, store: JobStore, workers: int = JOB_WORKERS):
+        self.store = store
+        self.workers = workers
+        self._tasks: List[asyncio.Task] = []
+        self._wake = asyncio.Event()
+        # Crawl task of every job this process is running
+        self._crawls: Dict[str, asyncio.Task] = {}
+
+    async def submit(self, kind: str, params: Dict) -> Dict:
+        params = validate_params(kind, params)
+        job = await asyncio.to_thread(self.store.create, kind, params)
+        self._wake.set()
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def results(self, job_id: str, offset: int, limit: int) -> List[Any]:
+        return await asyncio.to_thread(self.store.items, job_id, offset, limit)
+
+    async def cancel(self, job_id: str) -> bool:
+        cancelled = await asyncio.to_thread(self.store.cancel, job_id)
+        if cancelled:
+            self._stop_crawl(job_id)
+        return cancelled
+
+    def _stop_crawl(self, job_id: str):
+        crawl = self._crawls.get(job_id)
+        if crawl is not None:
+            crawl.cancel()
+
+    def start(self):
+        # Jobs left running by a previous process are claimed again once their lease runs out
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self):
+        owner = uuid.uuid4().hex
+        while True:
+            self._wake.clear()
+            try:
+                job = await asyncio.to_thread(self.store.claim, owner)
+            except Exception as e:
+                print("Job claim failed:", e)
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job, owner)
+
+    async def _heartbeat(self, job_id: str, owner: str):
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_INTERVAL)
+            if not await asyncio.to_thread(self.store.renew, job_id, owner):
+                # Cancelled or taken over by another worker: stop now, not at the next checkpoint
+                self._stop_crawl(job_id)
+                return
+
+    async def _run(self, job: Dict, owner: str):
+        crawl = self._crawls[job["id"]] = asyncio.ensure_future(self._crawl(job, owner))
+        heartbeat = asyncio.ensure_future(self._heartbeat(job["id"], owner))
+        try:
+            # wait() does not pass this worker's cancellation on, so shutdown and a stopped crawl stay apart
+            await asyncio.wait([crawl])
+            if crawl.cancelled():
+                # The job was cancelled or taken over; the worker carries on
+                return
+            crawl.result()
+            await asyncio.to_thread(self.store.finish, job["id"], owner, "done")
+        except LeaseLost:
+            pass
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back so the next start resumes from the last checkpoint
+            crawl.cancel()
+            await asyncio.gather(crawl, return_exceptions=True)
+            await asyncio.to_thread(self.store.release, job["id"], owner)
+            raise
+        except Exception as e:
+            print(f"Job {job['id']} failed:", e)
+            await asyncio.to_thread(self.store.finish, job["id"], owner, "failed", str(e))
+        finally:
+            heartbeat.cancel()
+            del self._crawls[job["id"]]
+
+    async def _crawl(self, job: Dict, owner: str):
+        limit = job["params"].get("limit")
+        remaining = None if limit is None else limit - job["items"]
+        # A started job with no token left has nothing more to fetch
+        if (job["started"] and not job["continuation"]) or (remaining is not None and remaining <= 0):
+            return
+
+        fetch = await job_fetcher(job["kind"], job["params"])
+        crawl = Crawl(fetch, limit=remaining, continuation=job["continuation"])
+        pages = crawl.pages()
+        try:
+            async for page in pages:
+                if remaining is not None:
+                    page = page[:remaining]
+                    remaining -= len(page)
+                await asyncio.to_thread(self.store.checkpoint, job["id"], owner, page, crawl.continuation)
+                if remaining is not None and remaining <= 0:
+                    break
+        finally:
+            await pages.aclose()
+
+job_queue = JobQueue(JobStore())
@@ -1,8 +1,43 @@
+import asyncio
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+
+# Settings are read from the environment at import time, so .env must be loaded first
+load_dotenv()
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.routes import router as youtube_router
+from app.client import init_client_pool, close_client_pool
+from app.jobs import job_queue
+from app.services.live_chat import live_chat_hub
+from app.services.trending import trending_snapshots
+from app.storage import storage_sink
+from app.metrics import metrics_endpoint
+from app.utils import api_key_manager
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.client_pool = init_client_pool()
+    try:
+        await api_key_manager.get()
+    except Exception as e:
+        print("Failed to prefetch INNERTUBE_API_KEY:", e)
+    storage_sink.start()
+    job_queue.start()
+    trending_snapshots.start()
 
-app = FastAPI(title="YouTube Crawler API")
+    yield
+
+    await trending_snapshots.stop()
+    await job_queue.stop()
+    await live_chat_hub.stop()
+    await close_client_pool()
+    await asyncio.to_thread(storage_sink.stop)
+
+
+app = FastAPI(title="YouTube Crawler API", lifespan=lifespan)
 
 origins = [
     "http://localhost:3000",
@@ -17,3 +52,5 @@ app.add_middleware(
 )
 
 app.include_router(youtube_router, prefix="/api", tags=[""])
+
+app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
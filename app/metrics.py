@@ -0,0 +1,109 @@
+import time
+from contextvars import ContextVar
+from typing import Callable, Optional
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from fastapi.routing import APIRoute
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+# Route template of the API request being served, so upstream and crawl metrics can be split per route
+current_route: ContextVar[str] = ContextVar("current_route", default="none")
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BYTES_BUCKETS = (1_000, 5_000, 20_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 2_500_000)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 30, 50, 100, 200, 500)
+
+ROUTE_LATENCY = Histogram(
+    "api_request_seconds", "API request latency, streamed responses until the last byte",
+    ["route", "method", "status"], buckets=LATENCY_BUCKETS,
+)
+ROUTE_IN_FLIGHT = Gauge("api_requests_in_flight", "API requests being served", ["route"])
+
+UPSTREAM_LATENCY = Histogram(
+    "innertube_request_seconds", "Latency of each InnerTube attempt",
+    ["endpoint", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_BYTES = Histogram(
+    "innertube_response_bytes", "Body size of successful InnerTube responses",
+    ["endpoint"], buckets=BYTES_BUCKETS,
+)
+UPSTREAM_IN_FLIGHT = Gauge("innertube_requests_in_flight", "InnerTube requests waiting on the network", ["endpoint"])
+UPSTREAM_RETRIES = Counter("innertube_retries_total", "InnerTube attempts that were retried", ["endpoint", "reason"])
+UPSTREAM_RATE_LIMITED = Counter("innertube_rate_limited_total", "InnerTube 429 answers per proxy", ["proxy"])
+
+CRAWL_PAGES = Histogram("crawl_pages", "Continuation pages fetched per crawl", ["route"], buckets=COUNT_BUCKETS)
+CRAWL_PAGE_ITEMS = Histogram("crawl_page_items", "Items parsed from each continuation page", ["route"], buckets=COUNT_BUCKETS)
+PARSE_MISSES = Counter("parse_misses_total", "Upstream documents that did not have the expected shape", ["parser"])
+
+CACHE_LOOKUPS = Counter("cache_lookups_total", "Response cache lookups", ["namespace", "result"])
+SINGLEFLIGHT_CALLS = Counter(
+    "singleflight_calls_total", "Upstream calls started (leader) or joined while in flight (shared)",
+    ["namespace", "result"],
+)
+
+LIVE_CHAT_STREAMS = Gauge("live_chat_streams", "Live chats being polled upstream")
+LIVE_CHAT_SUBSCRIBERS = Gauge("live_chat_subscribers", "Clients following a live chat")
+LIVE_CHAT_MESSAGES = Counter("live_chat_messages_total", "Live chat messages received upstream", ["type"])
+LIVE_CHAT_DROPPED = Counter("live_chat_dropped_total", "Live chat messages dropped for subscribers that fell behind")
+
+TRENDING_SNAPSHOT_AGE = Gauge(
+    "trending_snapshot_age_seconds", "Age of the trending snapshot being served, NaN before the first refresh",
+    ["gl", "hl", "category"],
+)
+TRENDING_REFRESH_SECONDS = Histogram(
+    "trending_refresh_seconds", "Time to crawl one trending snapshot", ["gl", "hl", "category"], buckets=LATENCY_BUCKETS,
+)
+TRENDING_REFRESH_FAILURES = Counter(
+    "trending_refresh_failures_total", "Trending refreshes that failed, the previous snapshot is kept",
+    ["gl", "hl", "category"],
+)
+
+STORAGE_ROWS = Counter("storage_rows_total", "Rows upserted by the storage sink", ["table"])
+STORAGE_DROPPED = Counter("storage_dropped_total", "Rows the storage sink dropped, queue full or write failed", ["table"])
+STORAGE_BATCH_SECONDS = Histogram("storage_batch_seconds", "Time to write one storage batch", buckets=LATENCY_BUCKETS)
+
+class MetricsRoute(APIRoute):
+    """APIRoute that records latency and in-flight requests under its path template"""
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        route = self.path
+
+        async def timed_handler(request: Request) -> Response:
+            current_route.set(route)
+            started = time.perf_counter()
+            ROUTE_IN_FLIGHT.labels(route).inc()
+
+            def finish(status: int):
+                ROUTE_IN_FLIGHT.labels(route).dec()
+                ROUTE_LATENCY.labels(route, request.method, str(status)).observe(time.perf_counter() - started)
+
+            try:
+                response = await handler(request)
+            except HTTPException as e:
+                finish(e.status_code)
+                raise
+            except Exception:
+                finish(500)
+                raise
+
+            if isinstance(response, StreamingResponse):
+                response.body_iterator = timed_body(response.body_iterator, lambda: finish(response.status_code))
+            else:
+                finish(response.status_code)
+            return response
+
+        return timed_handler
+
+async def timed_body(body, finish: Callable[[], None]):
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        finish()
+
+def proxy_label(proxy: Optional[str]) -> str:
+    return proxy or "direct"
+
+async def metrics_endpoint(request: Request) -> Response:
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,292 @@
+import asyncio
+import base64
+import json
+import os
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Hashable, List, Optional, Tuple
+from .cache import response_cache
+from .metrics import CRAWL_PAGE_ITEMS, CRAWL_PAGES, current_route
+
+PAGE_CURSOR_TTL = int(os.getenv("PAGE_CURSOR_TTL", "900"))
+PAGE_CURSOR_CACHE_SIZE = int(os.getenv("PAGE_CURSOR_CACHE_SIZE", "10000"))
+CRAWL_PREFETCH = os.getenv("CRAWL_PREFETCH", "true").lower() in ("1", "true", "yes")
+MERGE_BUFFER = int(os.getenv("MERGE_BUFFER", "200"))
+# Longer cursors keep their buffered items on the server and only carry a reference, so they fit in a URL
+CURSOR_MAX_INLINE = int(os.getenv("CURSOR_MAX_INLINE", "2048"))
+# "." is not in the base64url alphabet, so a stored cursor cannot be mistaken for an inline one
+STORED_CURSOR_PREFIX = "ref."
+
+# fetch(continuation) -> (items, next continuation); continuation None means first page
+PageFetcher = Callable[[Optional[str]], Awaitable[Tuple[List[Any], Optional[str]]]]
+
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(token: Optional[str], buffer: List[Any]) -> Optional[str]:
+    if not token and not buffer:
+        return None
+    raw = json.dumps({"t": token, "b": buffer}, ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(zlib.compress(raw.encode("utf-8"))).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[Optional[str], List[Any]]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        state = json.loads(zlib.decompress(base64.urlsafe_b64decode(padded)))
+        return state.get("t"), list(state.get("b") or [])
+    except Exception:
+        raise InvalidCursor("Invalid cursor")
+
+async def store_cursor(token: Optional[str], buffer: List[Any]) -> Optional[str]:
+    cursor = encode_cursor(token, buffer)
+    if cursor is None or len(cursor) <= CURSOR_MAX_INLINE:
+        return cursor
+    cursor_id = uuid.uuid4().hex
+    await response_cache.set("page_cursor", cursor_id, {"t": token, "b": buffer})
+    return STORED_CURSOR_PREFIX + cursor_id
+
+async def load_cursor(cursor: str) -> Tuple[Optional[str], List[Any]]:
+    if not cursor.startswith(STORED_CURSOR_PREFIX):
+        return decode_cursor(cursor)
+    state = await response_cache.get("page_cursor", cursor[len(STORED_CURSOR_PREFIX):])
+    if state is None:
+        raise InvalidCursor("Cursor expired")
+    return state["t"], list(state["b"])
+
+class PageCursorCache:
+    """LRU of page-start cursors so `page=N` can resume near where page N-1 ended"""
+
+    def __init__(self, ttl: int = PAGE_CURSOR_TTL, max_size: int = PAGE_CURSOR_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, Tuple[float, str]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, cursor = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return cursor
+
+    def set(self, key: Hashable, cursor: str):
+        self._entries[key] = (time.monotonic() + self.ttl, cursor)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+page_cursors = PageCursorCache()
+
+class CrawlStats:
+    """Pages, items, requests and response bytes of one crawl, rolled up into its parent crawl"""
+
+    def __init__(self, parent: Optional["CrawlStats"] = None):
+        self.parent = parent
+        self.pages = 0
+        self.items = 0
+        self.requests = 0
+        self.bytes = 0
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def record_response(self, size: int):
+        stats = self
+        while stats is not None:
+            stats.requests += 1
+            stats.bytes += size
+            stats = stats.parent
+
+    def as_dict(self) -> dict:
+        return {
+            "pages": self.pages,
+            "items": self.items,
+            "requests": self.requests,
+            "bytes": self.bytes,
+            "elapsed": round(self.elapsed, 3),
+        }
+
+current_crawl_stats: ContextVar[Optional[CrawlStats]] = ContextVar("current_crawl_stats", default=None)
+
+class Crawl:
+    """Lazy continuation crawl: pulls pages from `fetch` only as fast as they are consumed"""
+
+    def __init__(
+        self,
+        fetch: PageFetcher,
+        limit: Optional[int] = None,
+        continuation: Optional[str] = None,
+        max_pages: Optional[int] = None,
+        prefetch: bool = CRAWL_PREFETCH,
+        label: Optional[str] = None,
+    ):
+        self.fetch = fetch
+        self.limit = limit
+        self.max_pages = max_pages
+        self.prefetch = prefetch
+        # Metric label, the route by default; sub-crawls get their own so they do not skew the route's pages per crawl
+        self.label = label
+        # Token of the page after the last one yielded, None once the crawl is exhausted
+        self.continuation = continuation
+        self.stats = CrawlStats(parent=current_crawl_stats.get())
+
+    def _satisfied(self) -> bool:
+        if self.limit is not None and self.stats.items >= self.limit:
+            return True
+        return self.max_pages is not None and self.stats.pages >= self.max_pages
+
+    async def _fetch_page(self, continuation: Optional[str]) -> Tuple[List[Any], Optional[str]]:
+        # Runs in its own task, so the stats binding stays local to this fetch
+        current_crawl_stats.set(self.stats)
+        return await self.fetch(continuation)
+
+    def _spawn(self, continuation: Optional[str]) -> "asyncio.Future":
+        return asyncio.ensure_future(self._fetch_page(continuation))
+
+    async def pages(self) -> AsyncIterator[List[Any]]:
+        seen = set()
+        token = self.continuation
+        pending = self._spawn(token)
+        try:
+            while pending is not None:
+                items, next_token = await pending
+                pending = None
+                self.stats.pages += 1
+                self.stats.items += len(items)
+                CRAWL_PAGE_ITEMS.labels(self.label or current_route.get()).observe(len(items))
+
+                # A repeated token would loop forever on the same page
+                if next_token is not None and (next_token == token or next_token in seen):
+                    next_token = None
+                seen.add(next_token)
+                token = self.continuation = next_token
+
+                more = next_token is not None and not self._satisfied()
+                if more and self.prefetch:
+                    pending = self._spawn(next_token)
+
+                yield items
+
+                if more and pending is None:
+                    pending = self._spawn(next_token)
+        finally:
+            if pending is not None:
+                pending.cancel()
+                await asyncio.gather(pending, return_exceptions=True)
+            CRAWL_PAGES.labels(self.label or current_route.get()).observe(self.stats.pages)
+
+    async def items(self) -> AsyncIterator[Any]:
+        count = 0
+        pages = self.pages()
+        try:
+            async for page in pages:
+                for item in page:
+                    yield item
+                    count += 1
+                    if self.limit is not None and count >= self.limit:
+                        return
+        finally:
+            await pages.aclose()
+
+    def __aiter__(self) -> AsyncIterator[Any]:
+        return self.items()
+
+async def collect_items(fetch: PageFetcher, limit: int, cursor: Optional[str] = None) -> Tuple[List[Any], Optional[str]]:
+    if cursor:
+        token, items = await load_cursor(cursor)
+    else:
+        token, items = None, []
+
+    if len(items) < limit and (token or not cursor):
+        crawl = Crawl(fetch, limit=limit - len(items), continuation=token)
+        async for page in crawl.pages():
+            items.extend(page)
+        token = crawl.continuation
+
+    return items[:limit], await store_cursor(token, items[limit:])
+
+async def paginate(fetch: PageFetcher, key: Tuple, page: int, limit: int, cursor: Optional[str] = None) -> Tuple[List[Any], Optional[str]]:
+    if cursor:
+        return await collect_items(fetch, limit, cursor)
+
+    # Resume from the closest page whose start cursor we already know
+    current, current_cursor = 1, None
+    for known in range(page, 1, -1):
+        cached = page_cursors.get(key + (limit, known))
+        if cached:
+            current, current_cursor = known, cached
+            break
+
+    while True:
+        items, next_cursor = await collect_items(fetch, limit, current_cursor)
+        if next_cursor:
+            page_cursors.set(key + (limit, current + 1), next_cursor)
+        if current == page:
+            return items, next_cursor
+        if not next_cursor:
+            return [], None
+        current, current_cursor = current + 1, next_cursor
+
+def iter_items(
+    fetch: PageFetcher,
+    limit: Optional[int] = None,
+    continuation: Optional[str] = None,
+    max_pages: Optional[int] = None,
+    label: Optional[str] = None,
+) -> AsyncIterator[Any]:
+    return Crawl(fetch, limit=limit, continuation=continuation, max_pages=max_pages, label=label).items()
+
+class _StreamFailed:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+_STREAM_DONE = object()
+
+async def merge_streams(
+    streams: List[Callable[[], AsyncIterator[Any]]],
+    concurrency: int,
+    buffer: int = MERGE_BUFFER,
+) -> AsyncIterator[Any]:
+    """Items of several streams in arrival order, running at most `concurrency` of them at a time.
+
+    The bounded buffer applies backpressure: producers wait while the consumer is behind.
+    """
+    queue: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=buffer)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def pump(stream: Callable[[], AsyncIterator[Any]]):
+        try:
+            async with semaphore:
+                items = stream()
+                try:
+                    async for item in items:
+                        await queue.put(item)
+                finally:
+                    await items.aclose()
+        except Exception as e:
+            await queue.put(_StreamFailed(e))
+        await queue.put(_STREAM_DONE)
+
+    tasks = [asyncio.ensure_future(pump(stream)) for stream in streams]
+    remaining = len(tasks)
+    try:
+        while remaining:
+            item = await queue.get()
+            if item is _STREAM_DONE:
+                remaining -= 1
+            elif isinstance(item, _StreamFailed):
+                raise item.error
+            else:
+                yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
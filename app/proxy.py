@@ -0,0 +1,153 @@
+import asyncio
+import itertools
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional
+from urllib.parse import urlsplit
+
+PROXY_STRATEGY = os.getenv("PROXY_STRATEGY", "round_robin")
+PROXY_MAX_IN_FLIGHT = int(os.getenv("PROXY_MAX_IN_FLIGHT", "10"))
+PROXY_COOLDOWN = float(os.getenv("PROXY_COOLDOWN", "60"))
+PROXY_ERROR_THRESHOLD = int(os.getenv("PROXY_ERROR_THRESHOLD", "3"))
+
+PROXY_STRATEGIES = ("round_robin", "least_loaded")
+
+def load_proxy_urls() -> List[str]:
+    urls = [url.strip() for url in os.getenv("PROXY_URLS", "").split(",") if url.strip()]
+
+    proxy_file = os.getenv("PROXY_FILE")
+    if proxy_file:
+        with open(proxy_file, encoding="utf-8") as f:
+            urls += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+    # Single proxy configured the old way
+    host, port = os.getenv("PROXY_HOST"), os.getenv("PROXY_PORT")
+    if not urls and host and port:
+        user, password = os.getenv("PROXY_USER"), os.getenv("PROXY_PASS")
+        auth = f"{user}:{password}@" if user else ""
+        urls.append(f"http://{auth}{host}:{port}")
+
+    return list(dict.fromkeys(urls))
+
+def mask_proxy_url(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.hostname}:{parts.port}" if parts.hostname else url
+
+class ProxyState:
+    def __init__(self, url: str, max_in_flight: int):
+        self.url = url
+        self.name = mask_proxy_url(url)
+        self.semaphore = asyncio.Semaphore(max_in_flight)
+        self.in_flight = 0
+        # Leases that chose this proxy and wait on its semaphore
+        self.waiting = 0
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.consecutive_errors = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.latency_ewma: Optional[float] = None
+
+    @property
+    def load(self) -> int:
+        return self.in_flight + self.waiting
+
+    @property
+    def available(self) -> bool:
+        return self.ejected_until <= time.monotonic()
+
+    def stats(self) -> Dict:
+        return {
+            "proxy": self.name,
+            "available": self.available,
+            "ejected_for": max(0.0, round(self.ejected_until - time.monotonic(), 1)),
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "requests": self.requests,
+            "errors": self.errors,
+            "rate_limited": self.rate_limited,
+            "ejections": self.ejections,
+            "latency_ms": round(self.latency_ewma * 1000, 1) if self.latency_ewma is not None else None,
+        }
+
+class ProxyPool:
+    """Rotates requests over several exit proxies and benches unhealthy ones for a cooldown"""
+
+    def __init__(
+        self,
+        urls: List[str],
+        strategy: str = PROXY_STRATEGY,
+        max_in_flight: int = PROXY_MAX_IN_FLIGHT,
+        cooldown: float = PROXY_COOLDOWN,
+        error_threshold: int = PROXY_ERROR_THRESHOLD,
+    ):
+        if strategy not in PROXY_STRATEGIES:
+            raise ValueError(f"Unknown proxy strategy: {strategy}")
+        self.strategy = strategy
+        self.cooldown = cooldown
+        self.error_threshold = error_threshold
+        self.proxies = [ProxyState(url, max_in_flight) for url in urls]
+        self._cycle = itertools.cycle(self.proxies)
+
+    def __bool__(self) -> bool:
+        return bool(self.proxies)
+
+    def choose(self) -> ProxyState:
+        available = [proxy for proxy in self.proxies if proxy.available]
+        if not available:
+            # Everything is benched: use whichever comes back first rather than failing outright
+            return min(self.proxies, key=lambda proxy: proxy.ejected_until)
+
+        if self.strategy == "least_loaded":
+            return min(available, key=lambda proxy: (proxy.load, proxy.latency_ewma or 0.0))
+
+        for proxy in self._cycle:
+            if proxy.available:
+                return proxy
+
+    @asynccontextmanager
+    async def lease(self) -> AsyncIterator[ProxyState]:
+        proxy = self.choose()
+        # Counted until the semaphore is acquired, so a saturated proxy stops looking idle to the next choose()
+        proxy.waiting += 1
+        try:
+            await proxy.semaphore.acquire()
+        finally:
+            proxy.waiting -= 1
+        proxy.in_flight += 1
+        proxy.requests += 1
+        try:
+            yield proxy
+        finally:
+            proxy.in_flight -= 1
+            proxy.semaphore.release()
+
+    def eject(self, proxy: ProxyState):
+        proxy.ejected_until = time.monotonic() + self.cooldown
+        proxy.ejections += 1
+        proxy.consecutive_errors = 0
+
+    def record_success(self, proxy: ProxyState, latency: float):
+        proxy.consecutive_errors = 0
+        if proxy.latency_ewma is None:
+            proxy.latency_ewma = latency
+        else:
+            proxy.latency_ewma = 0.8 * proxy.latency_ewma + 0.2 * latency
+
+    def record_rate_limited(self, proxy: ProxyState):
+        proxy.errors += 1
+        proxy.rate_limited += 1
+        self.eject(proxy)
+
+    def record_error(self, proxy: ProxyState):
+        proxy.errors += 1
+        proxy.consecutive_errors += 1
+        if proxy.consecutive_errors >= self.error_threshold:
+            self.eject(proxy)
+
+    def stats(self) -> List[Dict]:
+        return [proxy.stats() for proxy in self.proxies]
+
+proxy_pool = ProxyPool(load_proxy_urls())
@@ -0,0 +1,96 @@
+import asyncio
+import os
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "4"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "20"))
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.2"))
+RETRY_BUDGET_MIN_PER_SECOND = float(os.getenv("RETRY_BUDGET_MIN_PER_SECOND", "1"))
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# requests per second and burst for each InnerTube endpoint family; 0 disables the limit
+RATE_LIMITS = {
+    "search": (float(os.getenv("RATE_LIMIT_SEARCH", "10")), int(os.getenv("RATE_LIMIT_SEARCH_BURST", "20"))),
+    "browse": (float(os.getenv("RATE_LIMIT_BROWSE", "20")), int(os.getenv("RATE_LIMIT_BROWSE_BURST", "40"))),
+    "next": (float(os.getenv("RATE_LIMIT_NEXT", "20")), int(os.getenv("RATE_LIMIT_NEXT_BURST", "40"))),
+    "player": (float(os.getenv("RATE_LIMIT_PLAYER", "20")), int(os.getenv("RATE_LIMIT_PLAYER_BURST", "40"))),
+    "live_chat": (float(os.getenv("RATE_LIMIT_LIVE_CHAT", "20")), int(os.getenv("RATE_LIMIT_LIVE_CHAT_BURST", "40"))),
+    "other": (float(os.getenv("RATE_LIMIT_OTHER", "10")), int(os.getenv("RATE_LIMIT_OTHER_BURST", "20"))),
+}
+
+def endpoint_family(endpoint: str) -> str:
+    family = endpoint.split("/", 1)[0]
+    return family if family in RATE_LIMITS else "other"
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class RetryBudget:
+    """Retries may only spend a fraction of recent traffic, so an outage is not multiplied by the retry count"""
+
+    def __init__(self, ratio: float = RETRY_BUDGET_RATIO, min_per_second: float = RETRY_BUDGET_MIN_PER_SECOND, cap: float = 100):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.cap = cap
+        self.tokens = cap
+        self.updated = time.monotonic()
+        self.exhausted = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.cap, self.tokens + (now - self.updated) * self.min_per_second)
+        self.updated = now
+
+    def record_request(self):
+        self.tokens = min(self.cap, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        self.exhausted += 1
+        return False
+
+def backoff_delay(attempt: int, base: float = RETRY_BASE_DELAY, cap: float = RETRY_MAX_DELAY) -> float:
+    # Full jitter: uniform over [0, base * 2^attempt], capped
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+rate_limiters: Dict[str, TokenBucket] = {family: TokenBucket(rate, burst) for family, (rate, burst) in RATE_LIMITS.items()}
+retry_budget = RetryBudget()
@@ -1,7 +1,25 @@
+import asyncio
 import base64
-import httpx
-from typing import List, Dict
-from ..utils import get_youtube_api_key, get_context
+import os
+from typing import AsyncIterator, List, Dict, Optional, Tuple
+from ..cache import response_cache
+from ..extractors import compile_extractor
+from ..innertube import continuation_items, find_continuation_token, innertube_post
+from ..pagination import Crawl, collect_items
+from ..singleflight import single_flight
+from ..storage import storage_sink
+from ..utils import get_context
+from ..watermarks import watermark_store
+from .handle import resolve_channel_input
+
+# Newest video IDs remembered per channel; any of them ends an incremental crawl, so one deleted video does not
+CHANNEL_WATERMARK_SIZE = int(os.getenv("CHANNEL_WATERMARK_SIZE", "10"))
+CHANNEL_POLL_CONCURRENCY = int(os.getenv("CHANNEL_POLL_CONCURRENCY", "20"))
+
+extract_video = compile_extractor("videoRenderer", [
+    "title", ("videoId", "video_id"), "url", "duration", "views",
+    ("thumbnail", "thumbnails"), ("public", "published_time"),
+])
 
 def extract_video_items(items: List[Dict]) -> List[Dict]:
     videos = []
@@ -10,63 +28,68 @@ def extract_video_items(items: List[Dict]) -> List[Dict]:
         video = content.get("videoRenderer") or content.get("gridVideoRenderer")
         if not video:
             continue
-        videos.append({
-            "title": video.get("title", {}).get("runs", [{}])[0].get("text", ""),
-            "videoId": video.get("videoId"),
-            "url": f"https://www.youtube.com/watch?v={video.get('videoId')}",
-            "duration": video.get("lengthText", {}).get("simpleText", ""),
-            "views": video.get("viewCountText", {}).get("simpleText", ""),
-            "thumbnail": video.get("thumbnail", {}).get("thumbnails", []),
-            "public": video.get("publishedTimeText", {}).get("simpleText", ""),
-        })
+        videos.append(extract_video(video))
     return videos
 
-async def get_channel_videos(channel_id: str, proxy: str = None, max_results: int = 100) -> List[Dict]:
-    API_KEY = await get_youtube_api_key()
-    BROWSE_URL = f"https://www.youtube.com/youtubei/v1/browse?key={API_KEY}"
-    headers = {
-        "Content-Type": "application/json",
-        "User-Agent": "Mozilla/5.0",
-        "Origin": "https://www.youtube.com",
-        "Referer": "https://www.youtube.com/"
-    }
-
-    collected = []
-    continuation = None
+def find_tab(data: Dict, title: str) -> Optional[Dict]:
+    tabs = data.get("contents", {}).get("twoColumnBrowseResultsRenderer", {}).get("tabs", [])
+    return next((tab for tab in tabs if tab.get("tabRenderer", {}).get("title", "").lower() == title), None)
+
+async def cached_videos_tab_section(channel_id: str, proxy: str = None) -> Optional[List[Dict]]:
+    """First grid page straight from the remembered Videos tab endpoint: one browse call instead of two"""
+    endpoint = await response_cache.get("channel_videos_tab", channel_id)
+    if not endpoint:
+        return None
+    data = await innertube_post("browse", {"context": get_context(), **endpoint}, proxy=proxy)
+    grid = (find_tab(data, "videos") or {}).get("tabRenderer", {}).get("content", {}).get("richGridRenderer")
+    if grid is None:
+        await response_cache.invalidate("channel_videos_tab", channel_id)
+        return None
+    return grid.get("contents", [])
+
+async def get_channel_videos_page(channel_id: str, continuation: Optional[str] = None, proxy: str = None) -> Tuple[List[Dict], Optional[str]]:
+    return await single_flight.do(
+        "channel_videos", (channel_id, continuation, proxy),
+        lambda: fetch_channel_videos_page(channel_id, continuation, proxy),
+    )
+
+async def fetch_channel_videos_page(channel_id: str, continuation: Optional[str] = None, proxy: str = None) -> Tuple[List[Dict], Optional[str]]:
+    if continuation is not None:
+        payload = {"context": get_context(), "continuation": continuation}
+        data = await innertube_post("browse", payload, proxy=proxy)
+        section = continuation_items(data)
+    else:
+        section = await cached_videos_tab_section(channel_id, proxy)
+    if section is None:
+        encoded = "EgZ2aWRlb3M"
+        missing_padding = len(encoded) % 4
+        if missing_padding:
+            encoded += "=" * (4 - missing_padding)
+
+        decoded = base64.b64decode(encoded).decode("utf-8")
 
-    encoded = "EgZ2aWRlb3M"
-    missing_padding = len(encoded) % 4
-    if missing_padding:
-        encoded += "=" * (4 - missing_padding)
-
-    decoded = base64.b64decode(encoded).decode("utf-8")
-
-    async with httpx.AsyncClient(proxies=proxy, headers=headers, timeout=15) as client:
         payload = {"context": get_context(), "browseId": channel_id, "params": decoded}
-        resp = await client.post(BROWSE_URL, json=payload)
-        resp.raise_for_status()
-        data = resp.json()
+        data = await innertube_post("browse", payload, proxy=proxy)
 
         tabs = data.get("contents", {}).get("twoColumnBrowseResultsRenderer", {}).get("tabs", [])
         if not tabs:
             raise Exception("'Tabs' not found")
 
         videos_tab = next((tab for tab in tabs if tab.get("tabRenderer", {}).get("title", "").lower() == "videos"), None)
-        
+
         if videos_tab:
             endpoint = videos_tab.get("tabRenderer", {}).get("endpoint", {}).get("browseEndpoint", {})
             browse_id = endpoint.get("browseId")
             params = endpoint.get("params")
+            if browse_id and params:
+                await response_cache.set("channel_videos_tab", channel_id, {"browseId": browse_id, "params": params})
 
             payload = {"context": get_context(), "browseId": browse_id, "params": params}
-            resp = await client.post(BROWSE_URL, json=payload)
-            resp.raise_for_status()
-            data = resp.json()
+            data = await innertube_post("browse", payload, proxy=proxy)
 
             tabs = data.get("contents", {}).get("twoColumnBrowseResultsRenderer", {}).get("tabs", [])
             videos_tab = next((tab for tab in tabs if tab.get("tabRenderer", {}).get("title", "").lower() == "videos"), None)
 
-
         if not videos_tab:
             videos_tab = next((tab for tab in tabs if tab.get("tabRenderer", {}).get("title", "").lower() == "home"), None)
             if not videos_tab:
@@ -76,30 +99,92 @@ async def get_channel_videos(channel_id: str, proxy: str = None, max_results: in
                             .get("richGridRenderer", {}) \
                             .get("contents", [])
 
-        collected += extract_video_items(section)
-        continuation = next((
-            c.get("continuationItemRenderer", {}).get("continuationEndpoint", {}).get("continuationCommand", {}).get("token")
-            for c in section if "continuationItemRenderer" in c
-        ), None)
-    
-        while continuation and len(collected) < max_results:
-            payload = {"context": get_context(), "continuation": continuation}
-            resp = await client.post(BROWSE_URL, json=payload)
-            resp.raise_for_status()
-            data = resp.json()
-
-            commands = data.get("onResponseReceivedCommands") or data.get("onResponseReceivedActions") or []
-            if not commands:
+    videos = extract_video_items(section)
+    storage_sink.record("videos", videos, channel_id=channel_id)
+    return videos, find_continuation_token(section)
+
+async def get_new_channel_videos(
+    channel_id: str,
+    since_video_id: Optional[str] = None,
+    max_results: int = 100,
+    proxy: str = None,
+    update_watermark: bool = True,
+) -> Dict:
+    """Videos newer than since_video_id, or than the stored watermark, newest first.
+
+    Without either, this is the first poll: the newest max_results videos are returned and become the watermark.
+    """
+    watermark = await watermark_store.get("channel", channel_id)
+    known = {since_video_id} if since_video_id else set(watermark)
+
+    new_videos = []
+    reached = False
+    # No prefetch: the page after the one holding the watermark must never be requested
+    crawl = Crawl(
+        lambda continuation: get_channel_videos_page(channel_id, continuation=continuation, proxy=proxy),
+        limit=max_results, prefetch=False,
+    )
+    pages = crawl.pages()
+    try:
+        async for page in pages:
+            for video in page:
+                if video["videoId"] in known:
+                    reached = True
+                    break
+                new_videos.append(video)
+            if reached or len(new_videos) >= max_results:
                 break
+    finally:
+        await pages.aclose()
+    new_videos = new_videos[:max_results]
+
+    if update_watermark and new_videos:
+        newest = [video["videoId"] for video in new_videos if video["videoId"]]
+        watermark = list(dict.fromkeys(newest + watermark))[:CHANNEL_WATERMARK_SIZE]
+        await watermark_store.set("channel", channel_id, watermark)
+
+    return {
+        "channel_id": channel_id,
+        "new_videos": new_videos,
+        "watermark_reached": reached,
+        "first_poll": not known,
+        "pages": crawl.stats.pages,
+        "watermark": watermark[0] if watermark else None,
+    }
 
-            continuation_items = commands[0].get("appendContinuationItemsAction", {}).get("continuationItems", [])
-            new_videos = extract_video_items(continuation_items)
-            collected += new_videos
-
-            continuation = next((
-                i.get("continuationItemRenderer", {}).get("continuationEndpoint", {}).get("continuationCommand", {}).get("token")
-                for i in continuation_items if "continuationItemRenderer" in i
-            ), None)
-
+async def iter_new_channel_videos(
+    channel_inputs: List[str],
+    since_video_ids: Optional[Dict[str, str]] = None,
+    max_results: int = 100,
+    proxy: str = None,
+    concurrency: int = CHANNEL_POLL_CONCURRENCY,
+) -> AsyncIterator[Dict]:
+    """Poll many channels at once, yielding each result as it completes; failures are reported per channel"""
+    since_video_ids = since_video_ids or {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def poll(channel_input: str) -> Dict:
+        async with semaphore:
+            try:
+                channel_id = await resolve_channel_input(channel_input)
+                result = await get_new_channel_videos(
+                    channel_id, since_video_id=since_video_ids.get(channel_input), max_results=max_results, proxy=proxy,
+                )
+            except Exception as e:
+                result = {"channel_id": None, "error": str(e)}
+            return {"channel_input": channel_input, **result}
+
+    tasks = [asyncio.ensure_future(poll(channel_input)) for channel_input in dict.fromkeys(channel_inputs)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
 
-    return collected[:max_results]
\ No newline at end of file
+async def get_channel_videos(channel_id: str, proxy: str = None, max_results: int = 100) -> List[Dict]:
+    collected, _ = await collect_items(
+        lambda continuation: get_channel_videos_page(channel_id, continuation=continuation, proxy=proxy),
+        max_results,
+    )
+    return collected
@@ -1,6 +1,7 @@
 import httpx
 from typing import Dict
-from ..utils import get_youtube_api_key
+from ..innertube import innertube_post
+from ..storage import storage_sink
 
 def parse_channel_info(data):
     header = data.get("header", {}).get("pageHeaderRenderer", {})
@@ -47,9 +48,6 @@ def parse_channel_info(data):
     }
 
 async def get_channel_info(channel_id: str, proxy: str = None) -> Dict:
-    API_KEY = await get_youtube_api_key()
-    BROWSER_URL = f"https://www.youtube.com/youtubei/v1/browse?key={API_KEY}"
-
     payload = {
         "context": {
             "client": {
@@ -62,9 +60,17 @@ async def get_channel_info(channel_id: str, proxy: str = None) -> Dict:
         "browseId": channel_id
     }
 
-    async with httpx.AsyncClient(proxies=proxy, timeout=15) as client:
-        resp = await client.post(BROWSER_URL, json=payload)
-        resp.raise_for_status()
-        data = resp.json()
-        
-        return parse_channel_info(data=data)
\ No newline at end of file
+    try:
+        data = await innertube_post("browse", payload, proxy=proxy)
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code in (400, 404):
+            return {
+                "error": True,
+                "reason": "Channel not found",
+                "status": e.response.status_code
+            }
+        raise
+
+    info = parse_channel_info(data=data)
+    storage_sink.record("channels", [info])
+    return info
\ No newline at end of file
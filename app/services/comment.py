@@ -1,204 +1,321 @@
-import httpx
-from typing import List, Dict
-from ..utils import get_youtube_api_key, get_context
+import asyncio
+import os
+import re
+import time
+from typing import List, Dict, Optional, Tuple
+from ..cache import response_cache
+from ..extractors import compile_extractor
+from ..metrics import PARSE_MISSES
+from ..innertube import continuation_items, find_continuation_token, innertube_post
+from ..pagination import Crawl, collect_items, iter_items
+from ..storage import storage_sink
+from ..utils import get_context
+from ..watermarks import watermark_store
 
-async def fetch_replies(client, continuation_token: str, context: dict) -> List[Dict]:
+REPLY_CONCURRENCY = int(os.getenv("COMMENT_REPLY_CONCURRENCY", "8"))
+# Newest thread IDs remembered per video; any of them ends an incremental poll
+COMMENT_WATERMARK_SIZE = int(os.getenv("COMMENT_WATERMARK_SIZE", "20"))
+
+extract_comment_entity = compile_extractor("commentEntityPayload", [
+    "comment_id", "content", "author", "avatar", "published_time", "likes", "replies",
+])
+
+# none: skip replies, first: only the first page of replies, all: follow every reply page
+REPLY_DEPTHS = ("none", "first", "all")
+# In the order of the comments header sort menu
+COMMENT_SORTS = ("top", "newest")
+
+AGE_UNITS = {
+    "second": 1, "minute": 60, "hour": 3600, "day": 86400,
+    "week": 7 * 86400, "month": 30 * 86400, "year": 365 * 86400,
+}
+AGE_PATTERN = re.compile(r"(\d+)\s+(second|minute|hour|day|week|month|year)s?\s+ago")
+
+async def fetch_replies_page(continuation_token: str, context: dict, proxy: str = None) -> Tuple[List[Dict], Optional[str]]:
+    payload = {
+        "context": context,
+        "continuation": continuation_token
+    }
+
+    data = await innertube_post("next", payload, proxy=proxy)
+
+    entity_map = parse_comment_entities(data)
+    items = continuation_items(data)
     replies = []
-    API_KEY = await get_youtube_api_key()
-    URL_COMMENT = f"https://www.youtube.com/youtubei/v1/next?key={API_KEY}"
 
-    while continuation_token:
-        payload = {
-            "context": context,
-            "continuation": continuation_token
-        }
+    for item in items:
+        if "commentViewModel" in item:
+            comment_vm = item.get("commentViewModel", {})
+            comment_id = comment_vm.get("commentId")
+            entity = entity_map.get(comment_id, {})
+
+            if not entity:
+                PARSE_MISSES.labels("comment_reply_entity").inc()
+                continue
+
+            replies.append({
+                "comment_id": comment_id,
+                "author": entity.get("author", ""),
+                "avatar": entity.get("avatar"),
+                "content": entity.get("content", ""),
+                "published_time": entity.get("published_time", ""),
+                "likes": entity.get("likes", 0)
+            })
 
-        resp = await client.post(URL_COMMENT, json=payload)
-        resp.raise_for_status()
-        data = resp.json()
-        print("Replies data:", data)
-
-        entity_map = parse_comment_entities(data)
-        continuation_token = None
-
-        actions = data.get("onResponseReceivedEndpoints", [])
-        for action in actions:
-            items = action.get("appendContinuationItemsAction", {}).get("continuationItems", [])
-            for item in items:
-                if "commentViewModel" in item:
-                    comment_vm = item.get("commentViewModel", {})
-                    comment_id = comment_vm.get("commentId")
-                    entity = entity_map.get(comment_id, {})
-
-                    if not entity:
-                        print(f"❗ Missing entity for reply {comment_id}")
-                        continue
-
-                    replies.append({
-                        "comment_id": comment_id,
-                        "author": entity.get("author", ""),
-                        "avatar": entity.get("avatar"),
-                        "content": entity.get("content", ""),
-                        "published_time": entity.get("published_time", ""),
-                        "likes": entity.get("likes", 0)
-                    })
-
-                elif "continuationItemRenderer" in item:
-                    continuation_token = item["continuationItemRenderer"]["button"]["buttonRenderer"]["command"]["continuationCommand"]["token"]
-                    print("➡️ Found continuation for more replies:", continuation_token)
-
-    return replies
+    return replies, find_continuation_token(items)
+
+async def fetch_replies(continuation_token: str, context: dict, proxy: str = None, max_pages: Optional[int] = None) -> List[Dict]:
+    replies = iter_items(
+        lambda continuation: fetch_replies_page(continuation, context, proxy=proxy),
+        continuation=continuation_token,
+        max_pages=max_pages,
+        label="comment_replies",
+    )
+    return [reply async for reply in replies]
 
 def extract_comment_continuation_token(data: dict) -> str:
-    try:
-        endpoints = data.get("onResponseReceivedEndpoints", [])
-        for ep in endpoints:
-            actions = ep.get("reloadContinuationItemsCommand", {}).get("continuationItems", [])
-            for item in actions:
-                continuation = item.get("continuationItemRenderer", {}) \
-                    .get("continuationEndpoint", {}) \
-                    .get("continuationCommand", {}) \
-                    .get("token")
-                if continuation:
-                    return continuation
-    except Exception as e:
-        print("Failed in onResponseReceivedEndpoints", e)
+    continuation = find_continuation_token(continuation_items(data))
+    if continuation:
+        return continuation
 
-    try:
-        results = data["contents"]["twoColumnWatchNextResults"]["results"]["results"]["contents"]
-        for item in results:
-            item_section = item.get("itemSectionRenderer", {})
-            for content in item_section.get("contents", []):
-                continuation = content.get("continuationItemRenderer", {}) \
-                    .get("continuationEndpoint", {}) \
-                    .get("continuationCommand", {}) \
-                    .get("token")
-                if continuation:
-                    return continuation
-    except Exception as e:
-        print("Fallback failed:", e)
+    results = data.get("contents", {}) \
+                  .get("twoColumnWatchNextResults", {}) \
+                  .get("results", {}) \
+                  .get("results", {}) \
+                  .get("contents", [])
+    for item in results:
+        continuation = find_continuation_token(item.get("itemSectionRenderer", {}).get("contents", []))
+        if continuation:
+            return continuation
 
     return None
 
+def extract_sort_tokens(data: dict) -> Dict[str, str]:
+    """Continuation tokens of the comments header sort menu, by sort name"""
+    for item in continuation_items(data):
+        header = item.get("commentsHeaderRenderer")
+        if header is None:
+            continue
+        entries = header.get("sortMenu", {}).get("sortFilterSubMenuRenderer", {}).get("subMenuItems", [])
+        tokens = {
+            sort: entry.get("serviceEndpoint", {}).get("continuationCommand", {}).get("token")
+            for sort, entry in zip(COMMENT_SORTS, entries)
+        }
+        return {sort: token for sort, token in tokens.items() if token}
+    return {}
+
+async def first_comments_token(video_id: str, context: dict, sort: str = "top", proxy: str = None) -> str:
+    cache_key = f"{video_id}:{sort}"
+    if sort != "top":
+        token = await response_cache.get("comment_sort_token", cache_key)
+        if token:
+            return token
+
+    data = await innertube_post("next", {"context": context, "videoId": video_id}, proxy=proxy)
+    continuation = extract_comment_continuation_token(data)
+    if not continuation:
+        raise Exception("No comment continuation token found")
+    if sort == "top":
+        return continuation
+
+    # Other sorts are only reachable through the sort menu sent with the first page of top comments
+    data = await innertube_post("next", {"context": context, "continuation": continuation}, proxy=proxy)
+    token = extract_sort_tokens(data).get(sort)
+    if not token:
+        PARSE_MISSES.labels("comment_sort_menu").inc()
+        raise Exception(f"No '{sort}' comment sort found")
+    await response_cache.set("comment_sort_token", cache_key, token)
+    return token
+
+def published_age_seconds(text: str) -> Optional[int]:
+    """"3 hours ago (edited)" -> 10800, the least age the text allows"""
+    match = AGE_PATTERN.search(text or "")
+    if not match:
+        return None
+    return int(match.group(1)) * AGE_UNITS[match.group(2)]
+
 def parse_comment_entities(data: dict) -> Dict[str, Dict]:
     """Parse entityBatchUpdate"""
     result = {}
     mutations = data.get("frameworkUpdates", {}).get("entityBatchUpdate", {}).get("mutations", [])
     for m in mutations:
-        payload = m.get("payload", {})
-        comment = payload.get("commentEntityPayload", {})
-        props = comment.get("properties", {})
-        comment_id = props.get("commentId")
-        raw_content = props.get("content", {}).get("content", "")
-        if not isinstance(raw_content, str):
+        comment = m.get("payload", {}).get("commentEntityPayload")
+        if not comment:
             continue
-        if comment_id:
-            result[comment_id] = {
-                "content": raw_content,
-                "author": comment.get("author", {}).get("displayName", ""),
-                "avatar": comment.get("author", {}).get("avatarThumbnailUrl", ""),
-                "published_time": props.get("publishedTime", "Unknown"),
-                "likes": int(comment.get("toolbar", {}).get("likeCountLiked") or 0),
-                "replies": int(comment.get("toolbar", {}).get("replyCount") or 0)
-            }
-            
+        entity = extract_comment_entity(comment)
+        comment_id = entity.pop("comment_id")
+        if comment_id and isinstance(entity["content"], str):
+            result[comment_id] = entity
+
     return result
 
-async def get_video_comments(video_id: str, proxy: str = None, max_comments: int = 100) -> List[Dict]:
-    API_KEY = await get_youtube_api_key()
-    URL_NEXT = f"https://www.youtube.com/youtubei/v1/next?key={API_KEY}"
-    URL_COMMENT = URL_NEXT
-    context = get_context()
+async def expand_replies(
+    reply_tokens: List[Tuple[Dict, str]],
+    context: dict,
+    proxy: str = None,
+    reply_depth: str = "all",
+    reply_concurrency: int = REPLY_CONCURRENCY,
+):
+    if reply_depth == "none" or not reply_tokens:
+        return
+
+    max_pages = 1 if reply_depth == "first" else None
+    semaphore = asyncio.Semaphore(reply_concurrency)
 
+    async def fetch(token: str) -> List[Dict]:
+        async with semaphore:
+            return await fetch_replies(token, context, proxy=proxy, max_pages=max_pages)
+
+    # gather keeps results in thread order
+    results = await asyncio.gather(*(fetch(token) for _, token in reply_tokens))
+    for (comment_data, _), replies in zip(reply_tokens, results):
+        comment_data["replies"] = replies
+
+async def get_video_comments_page(
+    video_id: str,
+    continuation: Optional[str] = None,
+    proxy: str = None,
+    reply_depth: str = "all",
+    reply_concurrency: int = REPLY_CONCURRENCY,
+    sort: str = "top",
+) -> Tuple[List[Dict], Optional[str]]:
+    context = get_context()
     comments = []
+    reply_tokens: List[Tuple[Dict, str]] = []
 
-    async with httpx.AsyncClient(proxies=proxy, timeout=15) as client:
-        payload = {
-            "context": context,
-            "videoId": video_id
-        }
-        resp = await client.post(URL_NEXT, json=payload)
-        resp.raise_for_status()
-        data = resp.json()
-
-        continuation_token = extract_comment_continuation_token(data)
-        if not continuation_token:
-            raise Exception("No comment continuation token found")
-
-        while continuation_token and len(comments) < max_comments:
-            payload = {
-                "context": context,
-                "continuation": continuation_token
+    if continuation is None:
+        continuation = await first_comments_token(video_id, context, sort=sort, proxy=proxy)
+
+    payload = {
+        "context": context,
+        "continuation": continuation
+    }
+    data = await innertube_post("next", payload, proxy=proxy)
+
+    entity_map = parse_comment_entities(data)
+    items = continuation_items(data)
+
+    for item in items:
+        if "commentThreadRenderer" in item:
+            thread = item["commentThreadRenderer"]
+
+            comment_vm = thread.get("commentViewModel", {}).get("commentViewModel", {})
+            comment_id = comment_vm.get("commentId")
+            entity = entity_map.get(comment_id, {})
+            if not entity:
+                continue
+
+            author = entity.get("author", "")
+            avatar = entity.get("avatar")
+            content = entity.get("content", "")
+            published = entity.get("published_time", "")
+            likes = entity.get("likes", 0)
+            reply_count = entity.get("replies", 0)
+
+            if not isinstance(content, str):
+                continue
+
+            comment_data = {
+                "comment_id": comment_id,
+                "author": author,
+                "avatar": avatar,
+                "content": content,
+                "published_time": published,
+                "likes": likes,
+                "replies_count": reply_count,
+                "pinned": bool(comment_vm.get("pinnedText")),
+                "replies": [],
             }
-            resp = await client.post(URL_COMMENT, json=payload)
-            resp.raise_for_status()
-            data = resp.json()
-            
-            entity_map = parse_comment_entities(data)
-
-            continuation_token = None
-            actions = data.get("onResponseReceivedEndpoints", [])
-            
-            for action in actions:
-                items = action.get("reloadContinuationItemsCommand", {}).get("continuationItems", []) or \
-                action.get("appendContinuationItemsAction", {}).get("continuationItems", [])
-                for item in items:
-                    if "commentThreadRenderer" in item:
-                        thread = item["commentThreadRenderer"]
-
-                        comment_vm = thread.get("commentViewModel", {}).get("commentViewModel", {})
-                        comment_id = comment_vm.get("commentId")
-                        entity = entity_map.get(comment_id, {})
-                        if not entity:
-                            continue
-
-                        author = entity.get("author", "")
-                        avatar = entity.get("avatar")
-                        content = entity.get("content", "")
-                        published = entity.get("published_time", "")
-                        likes = entity.get("likes", 0)
-                        reply_count = entity.get("replies", 0)
-                        
-                        if not isinstance(content, str):
-                            continue
-                                
-                        comment_data = {
-                            "comment_id": comment_id,
-                            "author": author,
-                            "avatar": avatar,
-                            "content": content,
-                            "published_time": published,
-                            "likes": likes,
-                            "replies_count": reply_count,
-                            "replies": [],
-                        }
-                        
-                        reply_token = None
-
-                        replies_data = thread.get("replies", {}).get("commentRepliesRenderer", {})
-                        contents = replies_data.get("contents", [])
-
-                        for content in contents:
-                            continuation = content.get("continuationItemRenderer", {}) \
-                                                  .get("continuationEndpoint", {}) \
-                                                  .get("continuationCommand", {}) \
-                                                  .get("token")
- 
-                            if continuation:
-                                reply_token = continuation
-                                break 
-
-                        if reply_token:
-                            print("Fetching replies with token:", reply_token)
-                            comment_data["replies"] = await fetch_replies(client, reply_token, context)
-
-                        comments.append(comment_data)
-                        if len(comments) >= max_comments:
-                            break
-
-                    elif "continuationItemRenderer" in item:
-                        continuation_token = item["continuationItemRenderer"]["continuationEndpoint"]["continuationCommand"]["token"]
-                if len(comments) >= max_comments:
+
+            replies_data = thread.get("replies", {}).get("commentRepliesRenderer", {})
+            contents = replies_data.get("contents", [])
+
+            reply_token = find_continuation_token(contents)
+            if reply_token:
+                reply_tokens.append((comment_data, reply_token))
+
+            comments.append(comment_data)
+
+    await expand_replies(reply_tokens, context, proxy=proxy, reply_depth=reply_depth, reply_concurrency=reply_concurrency)
+    storage_sink.record("comments", comments, video_id=video_id)
+
+    return comments, find_continuation_token(items)
+
+async def get_video_comments(
+    video_id: str,
+    proxy: str = None,
+    max_comments: int = 100,
+    reply_depth: str = "all",
+    reply_concurrency: int = REPLY_CONCURRENCY,
+    sort: str = "top",
+) -> List[Dict]:
+    comments, _ = await collect_items(
+        lambda continuation: get_video_comments_page(
+            video_id, continuation=continuation, proxy=proxy,
+            reply_depth=reply_depth, reply_concurrency=reply_concurrency, sort=sort,
+        ),
+        max_comments,
+    )
+    return comments
+
+async def get_new_video_comments(
+    video_id: str,
+    since_comment_id: Optional[str] = None,
+    since_time: Optional[float] = None,
+    max_results: int = 100,
+    reply_depth: str = "none",
+    proxy: str = None,
+    update_watermark: bool = True,
+) -> Dict:
+    """Threads newer than since_comment_id, since_time or the stored watermark, newest first.
+
+    The crawl follows the "Newest first" sort and stops at the first known thread, so a poll with few new
+    comments costs a single page. Relative publish times are coarse: a since_time watermark may return a
+    thread again, never miss one. Pinned threads stay on top whatever their age and are left out.
+    """
+    watermark = await watermark_store.get("comment", video_id)
+    if since_comment_id:
+        known = {since_comment_id}
+    else:
+        known = set() if since_time is not None else set(watermark)
+
+    polled_at = time.time()
+    new_comments = []
+    reached = False
+    crawl = Crawl(
+        lambda continuation: get_video_comments_page(
+            video_id, continuation=continuation, proxy=proxy, reply_depth=reply_depth, sort="newest",
+        ),
+        limit=max_results, prefetch=False,
+    )
+    pages = crawl.pages()
+    try:
+        async for page in pages:
+            for comment in page:
+                if comment["pinned"]:
+                    continue
+                age = published_age_seconds(comment["published_time"])
+                if comment["comment_id"] in known or (since_time is not None and age is not None and polled_at - age < since_time):
+                    reached = True
                     break
+                new_comments.append(comment)
+            if reached or len(new_comments) >= max_results:
+                break
+    finally:
+        await pages.aclose()
+    new_comments = new_comments[:max_results]
+
+    if update_watermark and new_comments:
+        newest = [comment["comment_id"] for comment in new_comments]
+        watermark = list(dict.fromkeys(newest + watermark))[:COMMENT_WATERMARK_SIZE]
+        await watermark_store.set("comment", video_id, watermark)
 
-    return comments[:max_comments]
\ No newline at end of file
+    return {
+        "video_id": video_id,
+        "new_comments": new_comments,
+        "watermark_reached": reached,
+        "first_poll": not known and since_time is None,
+        "pages": crawl.stats.pages,
+        "watermark": watermark[0] if watermark else None,
+        "polled_at": polled_at,
+    }
@@ -1,45 +1,77 @@
-import httpx
-from ..utils import get_youtube_api_key, get_context
+import asyncio
+import os
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+from ..innertube import innertube_post
+from ..storage import storage_sink
+from ..utils import get_context
 
-async def get_video_detail(video_id: str, proxy: str = None):
-    API_KEY = await get_youtube_api_key()
-    VIDEO_DETAIL_URL = f"https://www.youtube.com/youtubei/v1/player?key={API_KEY}"
-    
-    headers = {
-        "Content-Type": "application/json",
-        "User-Agent": "Mozilla/5.0",
-        "Origin": "https://www.youtube.com",
-        "Referer": "https://www.youtube.com"
-    }
+VIDEO_DETAIL_CONCURRENCY = int(os.getenv("VIDEO_DETAIL_CONCURRENCY", "20"))
 
+async def get_video_detail(video_id: str, proxy: str = None):
     payload = {
         "context": get_context(),
         "videoId": video_id
     }
 
-    async with httpx.AsyncClient(proxies=proxy, headers=headers, timeout=10) as client:
-        resp = await client.post(VIDEO_DETAIL_URL, json=payload)
-        resp.raise_for_status()
-        data = resp.json()
-
-        status = data.get("playabilityStatus", {})
-        if status.get("status") != "OK":
-            return {
-                "error": True,
-                "reason": status.get("reason", "Unavailable"),
-                "status": status.get("status")
-            }
-
-        video_details = data.get("videoDetails", {})
-        streaming_data = data.get("streamingData", {})
-        
+    data = await innertube_post("player", payload, proxy=proxy, timeout=10)
+
+    status = data.get("playabilityStatus", {})
+    if status.get("status") != "OK":
         return {
-            "video_id": video_details.get("videoId"),
-            "title": video_details.get("title"),
-            "author": video_details.get("author"),
-            "length_seconds": video_details.get("lengthSeconds"),
-            "views": video_details.get("viewCount"),
-            "is_live_content": video_details.get("isLiveContent"),
-            "formats": streaming_data.get("formats", []),
-            "adaptive_formats": streaming_data.get("adaptiveFormats", [])
+            "error": True,
+            "reason": status.get("reason", "Unavailable"),
+            "status": status.get("status")
         }
+
+    video_details = data.get("videoDetails", {})
+    streaming_data = data.get("streamingData", {})
+    
+    detail = {
+        "video_id": video_details.get("videoId"),
+        "title": video_details.get("title"),
+        "author": video_details.get("author"),
+        "length_seconds": video_details.get("lengthSeconds"),
+        "views": video_details.get("viewCount"),
+        "is_live_content": video_details.get("isLiveContent"),
+        "formats": streaming_data.get("formats", []),
+        "adaptive_formats": streaming_data.get("adaptiveFormats", [])
+    }
+    storage_sink.record("videos", [detail])
+    return detail
+
+async def iter_video_details(
+    video_ids: List[str],
+    proxy: str = None,
+    fetch: Optional[Callable[[str], Awaitable[Dict]]] = None,
+    concurrency: int = VIDEO_DETAIL_CONCURRENCY,
+) -> AsyncIterator[Dict]:
+    """Yield {"video_id", "detail"} records in completion order; failures become error details"""
+    fetch = fetch or (lambda video_id: get_video_detail(video_id, proxy=proxy))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(video_id: str) -> Dict:
+        async with semaphore:
+            try:
+                detail = await fetch(video_id)
+            except Exception as e:
+                detail = {"error": True, "reason": str(e), "status": None}
+            return {"video_id": video_id, "detail": detail}
+
+    tasks = [asyncio.ensure_future(run(video_id)) for video_id in dict.fromkeys(video_ids)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def get_video_details(
+    video_ids: List[str],
+    proxy: str = None,
+    fetch: Optional[Callable[[str], Awaitable[Dict]]] = None,
+    concurrency: int = VIDEO_DETAIL_CONCURRENCY,
+) -> Dict[str, Dict]:
+    results = {video_id: None for video_id in video_ids}
+    async for record in iter_video_details(video_ids, proxy=proxy, fetch=fetch, concurrency=concurrency):
+        results[record["video_id"]] = record["detail"]
+    return results
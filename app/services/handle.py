@@ -0,0 +1,99 @@
+import asyncio
+import os
+import re
+import httpx
+from typing import Dict, List, Optional
+from ..handles import HANDLE_MISSING_TTL, handle_store
+from ..innertube import innertube_post, youtube_get
+from ..singleflight import single_flight
+from ..utils import get_context
+
+HANDLE_RESOLVE_CONCURRENCY = int(os.getenv("HANDLE_RESOLVE_CONCURRENCY", "10"))
+
+# Stored for handles that do not exist so they are not looked up again until the short TTL expires
+MISSING_CHANNEL = ""
+
+def normalize_handle(handle: str) -> str:
+    return handle.strip().lstrip("@").lower()
+
+async def resolve_channel_id_from_html(handle: str) -> Optional[str]:
+    """None only when the page does not exist; other failures raise so they are not cached as a missing channel"""
+    try:
+        resp = await youtube_get(f"/@{handle}")
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 404:
+            return None
+        raise
+    html = resp.text
+    match = re.search(r'channel_id=([a-zA-Z0-9_-]{24})', html)
+    if match:
+        return match.group(1)
+
+    match = re.search(r'"browseId":"(UC[^\"]+)"', html)
+    if match:
+        return match.group(1)
+
+    # A page without a channel ID is a consent or captcha page, not proof the channel is missing
+    raise Exception(f"Channel ID not found in the page of @{handle}")
+
+async def lookup_channel_id(handle: str) -> Optional[str]:
+    payload = {
+        "context": get_context(),
+        "url": f"https://www.youtube.com/@{handle}"
+    }
+
+    try:
+        data = await innertube_post("navigation/resolve_url", payload)
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code in (400, 404):
+            return None
+        raise
+
+    browse_id = data.get("endpoint", {}).get("browseEndpoint", {}).get("browseId")
+    if browse_id and browse_id.startswith("UC"):
+        return browse_id
+
+    # resolve_url answered with something other than a channel, fall back to the page itself
+    return await resolve_channel_id_from_html(handle)
+
+async def lookup_and_store_channel_id(handle: str) -> str:
+    channel_id = await lookup_channel_id(handle)
+    if channel_id:
+        await handle_store.set(handle, channel_id)
+    else:
+        channel_id = MISSING_CHANNEL
+        await handle_store.set(handle, channel_id, ttl=HANDLE_MISSING_TTL)
+    return channel_id
+
+async def resolve_channel_id_from_handle(handle: str) -> str:
+    handle = normalize_handle(handle)
+
+    channel_id = await handle_store.get(handle)
+    if channel_id is None:
+        # Concurrent requests for the same unknown handle share one lookup
+        channel_id = await single_flight.do("channel_handle", handle, lambda: lookup_and_store_channel_id(handle))
+
+    if channel_id == MISSING_CHANNEL:
+        raise Exception("Channel_id not found")
+    return channel_id
+
+async def resolve_channel_input(channel_input: str) -> str:
+    """@handle or channel ID -> channel ID"""
+    if channel_input.startswith("@"):
+        return await resolve_channel_id_from_handle(channel_input.lstrip("@"))
+    return channel_input
+
+async def resolve_handles(handles: List[str], concurrency: int = HANDLE_RESOLVE_CONCURRENCY) -> Dict[str, Optional[str]]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def resolve(handle: str) -> Optional[str]:
+        async with semaphore:
+            try:
+                return await resolve_channel_id_from_handle(handle)
+            except Exception:
+                return None
+
+    # "@Foo", "foo" and " FOO " are one lookup
+    unique = list(dict.fromkeys(normalize_handle(handle) for handle in handles))
+    results = dict(zip(unique, await asyncio.gather(*(resolve(handle) for handle in unique))))
+    return {handle: results[normalize_handle(handle)] for handle in handles}
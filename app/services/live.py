@@ -1,8 +1,13 @@
-import httpx
-from typing import List, Dict
-from ..utils import get_context, get_youtube_api_key
+from typing import List, Dict, Optional, Tuple
+from ..extractors import compile_extractor
+from ..innertube import continuation_items, find_continuation_token, innertube_post, search_result_sections
+from ..pagination import collect_items
+from ..storage import storage_sink
+from ..utils import get_context
 
-SEARCH_URL = "https://www.youtube.com/youtubei/v1/search"
+extract_video = compile_extractor("videoRenderer", [
+    "video_id", "title", ("thumbnail", "thumbnails"), ("channel_name", "channel"), "url", ("views", "short_views"),
+])
 
 def extract_live_videos(items: List[Dict]) -> List[Dict]:
     videos = []
@@ -10,85 +15,42 @@ def extract_live_videos(items: List[Dict]) -> List[Dict]:
         video = item.get("videoRenderer")
         if not video:
             continue
-        view_count = ""
-        if "shortViewCountText" in video:
-            view_count = video["shortViewCountText"].get("simpleText") or \
-                video["shortViewCountText"].get("runs", [{}])[0].get("text", "")
-                 
-        videos.append({
-            "video_id": video.get("videoId"),
-            "title": video.get("title", {}).get("runs", [{}])[0].get("text", ""),
-            "thumbnail": video.get("thumbnail", {}).get("thumbnails", []),
-            "channel_name": video.get("ownerText", {}).get("runs", [{}])[0].get("text", ""),
-            "url": f"https://www.youtube.com/watch?v={video.get('videoId')}",
-            "views": view_count,
-            "is_live": True
-        })
+        video = extract_video(video)
+        video["is_live"] = True
+        videos.append(video)
     return videos
 
-async def get_all_live_videos(q: str, proxy: str = None, max_results: int = 100) -> List[Dict]:
-    API_KEY = await get_youtube_api_key()
-    headers = {
-        "Content-Type": "application/json",
-        "User-Agent": "Mozilla/5.0",
-        "Origin": "https://www.youtube.com",
-        "Referer": "https://www.youtube.com/"
-    }
-
+async def get_live_videos_page(q: str, continuation: Optional[str] = None, proxy: str = None) -> Tuple[List[Dict], Optional[str]]:
     collected = []
-    continuation = None
 
-    async with httpx.AsyncClient(proxies=proxy, headers=headers, timeout=15) as client:
+    if continuation is None:
         payload = {
             "context": get_context(),
             "query": q,
             "params": "EgJAAQ%3D%3D"
         }
-        resp = await client.post(f"{SEARCH_URL}?key={API_KEY}", json=payload)
-        resp.raise_for_status()
-        data = resp.json()
-
-        contents = data.get("contents", {}) \
-                       .get("twoColumnSearchResultsRenderer", {}) \
-                       .get("primaryContents", {}) \
-                       .get("sectionListRenderer", {}) \
-                       .get("contents", [])
+        data = await innertube_post("search", payload, proxy=proxy)
+        contents = search_result_sections(data)
+    else:
+        payload = {
+            "context": get_context(),
+            "continuation": continuation
+        }
+        data = await innertube_post("search", payload, proxy=proxy)
+        contents = continuation_items(data)
+        collected += extract_live_videos(contents)
 
-        for section in contents:
-            items = section.get("itemSectionRenderer", {}).get("contents", [])
+    for section in contents:
+        items = section.get("itemSectionRenderer", {}).get("contents")
+        if items:
             collected += extract_live_videos(items)
 
-        continuation = next((
-            section.get("continuationItemRenderer", {})
-                   .get("continuationEndpoint", {})
-                   .get("continuationCommand", {})
-                   .get("token")
-            for section in contents
-            if "continuationItemRenderer" in section
-        ), None)
+    storage_sink.record("videos", collected)
+    return collected, find_continuation_token(contents)
 
-        while continuation and len(collected) < max_results:
-            payload = {
-                "context": get_context(),
-                "continuation": continuation
-            }
-            resp = await client.post(f"{SEARCH_URL}?key={API_KEY}", json=payload)
-            resp.raise_for_status()
-            data = resp.json()
-
-            continuation_items = data.get("onResponseReceivedCommands", [])[0] \
-                                     .get("appendContinuationItemsAction", {}) \
-                                     .get("continuationItems", [])
-
-            collected += extract_live_videos(continuation_items)
-
-            continuation = next((
-                item.get("continuationItemRenderer", {})
-                    .get("continuationEndpoint", {})
-                    .get("continuationCommand", {})
-                    .get("token")
-                for item in continuation_items
-                if "continuationItemRenderer" in item
-            ), None)
-
-    return collected[:max_results]
+async def get_all_live_videos(q: str, proxy: str = None, max_results: int = 100) -> List[Dict]:
+    collected, _ = await collect_items(
+        lambda continuation: get_live_videos_page(q, continuation=continuation, proxy=proxy),
+        max_results,
+    )
+    return collected
@@ -0,0 +1,249 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+from ..extractors import compile_extractor
+from ..innertube import innertube_post
+from ..metrics import LIVE_CHAT_DROPPED, LIVE_CHAT_MESSAGES, LIVE_CHAT_STREAMS, LIVE_CHAT_SUBSCRIBERS
+from ..utils import get_context
+
+# The server says how long to wait before the next poll; these bound what we accept
+LIVE_CHAT_MIN_INTERVAL = float(os.getenv("LIVE_CHAT_MIN_INTERVAL", "1.0"))
+LIVE_CHAT_MAX_INTERVAL = float(os.getenv("LIVE_CHAT_MAX_INTERVAL", "10.0"))
+LIVE_CHAT_DEFAULT_INTERVAL = float(os.getenv("LIVE_CHAT_DEFAULT_INTERVAL", "5.0"))
+# Events buffered per subscriber; the oldest are dropped when a client falls behind
+LIVE_CHAT_QUEUE_SIZE = int(os.getenv("LIVE_CHAT_QUEUE_SIZE", "1000"))
+# Recent messages a new subscriber starts with
+LIVE_CHAT_REPLAY = int(os.getenv("LIVE_CHAT_REPLAY", "50"))
+# Seconds a chat keeps polling after its last subscriber left, so a reconnect does not restart it
+LIVE_CHAT_IDLE_GRACE = float(os.getenv("LIVE_CHAT_IDLE_GRACE", "5.0"))
+LIVE_CHAT_MAX_STREAMS = int(os.getenv("LIVE_CHAT_MAX_STREAMS", "200"))
+
+# all: every message ("Live chat"), top: YouTube's filtered "Top chat"
+LIVE_CHAT_MODES = ("all", "top")
+# Position of each mode in the chat's view selector
+VIEW_INDEX = {"top": 0, "all": 1}
+
+MESSAGE_TYPES = {
+    "liveChatTextMessageRenderer": "text",
+    "liveChatPaidMessageRenderer": "paid",
+    "liveChatPaidStickerRenderer": "sticker",
+    "liveChatMembershipItemRenderer": "membership",
+}
+
+MESSAGE_COLUMNS = ["id", "author", "author_channel_id", "avatar", "message", "amount", "timestamp_usec"]
+extract_message = {renderer: compile_extractor(renderer, MESSAGE_COLUMNS) for renderer in MESSAGE_TYPES}
+
+class LiveChatUnavailable(Exception):
+    pass
+
+class LiveChatFull(Exception):
+    pass
+
+def extract_live_chat_continuation(data: Dict, mode: str = "all") -> Optional[str]:
+    renderer = data.get("contents", {}).get("twoColumnWatchNextResults", {}) \
+                   .get("conversationBar", {}).get("liveChatRenderer")
+    if not renderer:
+        return None
+
+    views = renderer.get("header", {}).get("liveChatHeaderRenderer", {}) \
+                    .get("viewSelector", {}).get("sortFilterSubMenuRenderer", {}).get("subMenuItems", [])
+    index = VIEW_INDEX[mode]
+    if index < len(views):
+        token = views[index].get("continuation", {}).get("reloadContinuationData", {}).get("continuation")
+        if token:
+            return token
+
+    for continuation in renderer.get("continuations", []):
+        token = continuation.get("reloadContinuationData", {}).get("continuation")
+        if token:
+            return token
+    return None
+
+def parse_live_chat_actions(actions: List[Dict]) -> List[Dict]:
+    messages = []
+    for action in actions:
+        item = action.get("addChatItemAction", {}).get("item", {})
+        for renderer, message_type in MESSAGE_TYPES.items():
+            if renderer in item:
+                message = extract_message[renderer](item[renderer])
+                if message["id"]:
+                    message["type"] = message_type
+                    messages.append(message)
+                break
+    return messages
+
+async def get_live_chat_continuation(video_id: str, mode: str = "all", proxy: str = None) -> str:
+    data = await innertube_post("next", {"context": get_context(), "videoId": video_id}, proxy=proxy)
+    continuation = extract_live_chat_continuation(data, mode)
+    if not continuation:
+        raise LiveChatUnavailable(f"Video {video_id} has no live chat")
+    return continuation
+
+async def get_live_chat_page(continuation: str, proxy: str = None) -> Tuple[List[Dict], Optional[str], Optional[int]]:
+    """(messages, next continuation, timeoutMs the server asks to wait); no continuation once the stream is over"""
+    payload = {"context": get_context(), "continuation": continuation}
+    data = await innertube_post("live_chat/get_live_chat", payload, proxy=proxy)
+    chat = data.get("continuationContents", {}).get("liveChatContinuation", {})
+
+    next_token, timeout_ms = None, None
+    for entry in chat.get("continuations", []):
+        for kind in ("invalidationContinuationData", "timedContinuationData", "reloadContinuationData"):
+            if kind in entry:
+                next_token = entry[kind].get("continuation")
+                timeout_ms = entry[kind].get("timeoutMs")
+                break
+        if next_token:
+            break
+
+    return parse_live_chat_actions(chat.get("actions", [])), next_token, timeout_ms
+
+def poll_interval(timeout_ms: Optional[int]) -> float:
+    if timeout_ms is None:
+        return LIVE_CHAT_DEFAULT_INTERVAL
+    return min(LIVE_CHAT_MAX_INTERVAL, max(LIVE_CHAT_MIN_INTERVAL, int(timeout_ms) / 1000))
+
+class ChatSubscription:
+    """One client's bounded queue; publishing never waits on a slow client"""
+
+    def __init__(self, maxsize: int = LIVE_CHAT_QUEUE_SIZE):
+        self.queue: "asyncio.Queue[Optional[Dict]]" = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def offer(self, event: Optional[Dict]):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+            LIVE_CHAT_DROPPED.inc()
+        self.queue.put_nowait(event)
+
+    async def events(self) -> AsyncIterator[Dict]:
+        while True:
+            event = await self.queue.get()
+            if self.dropped:
+                yield {"type": "dropped", "count": self.dropped}
+                self.dropped = 0
+            if event is None:
+                return
+            yield event
+
+class LiveChatStream:
+    """The single upstream poller of one chat, fanning messages out to every subscriber"""
+
+    def __init__(self, hub: "LiveChatHub", video_id: str, mode: str):
+        self.hub = hub
+        self.video_id = video_id
+        self.mode = mode
+        self.subscribers: Set[ChatSubscription] = set()
+        self.recent: deque = deque(maxlen=LIVE_CHAT_REPLAY)
+        self.started_at = time.time()
+        self.polls = 0
+        self.messages = 0
+        self._idle: Optional[asyncio.TimerHandle] = None
+        self.task = asyncio.ensure_future(self._run())
+        LIVE_CHAT_STREAMS.inc()
+
+    def subscribe(self) -> ChatSubscription:
+        subscription = ChatSubscription()
+        for message in self.recent:
+            subscription.offer(message)
+        self.subscribers.add(subscription)
+        LIVE_CHAT_SUBSCRIBERS.inc()
+        if self._idle is not None:
+            self._idle.cancel()
+            self._idle = None
+        return subscription
+
+    def unsubscribe(self, subscription: ChatSubscription):
+        if subscription not in self.subscribers:
+            return
+        self.subscribers.discard(subscription)
+        LIVE_CHAT_SUBSCRIBERS.dec()
+        if not self.subscribers and not self.task.done():
+            self._idle = asyncio.get_running_loop().call_later(LIVE_CHAT_IDLE_GRACE, self._stop_if_idle)
+
+    def _stop_if_idle(self):
+        self._idle = None
+        if not self.subscribers:
+            self.task.cancel()
+
+    def publish(self, event: Optional[Dict]):
+        for subscription in self.subscribers:
+            subscription.offer(event)
+
+    async def _run(self):
+        reason = "ended"
+        # Invalidation continuations can send a message again
+        seen: "OrderedDict[str, None]" = OrderedDict()
+        try:
+            continuation = await get_live_chat_continuation(self.video_id, self.mode)
+            while continuation:
+                messages, continuation, timeout_ms = await get_live_chat_page(continuation)
+                self.polls += 1
+                for message in messages:
+                    if message["id"] in seen:
+                        continue
+                    seen[message["id"]] = None
+                    if len(seen) > 4 * LIVE_CHAT_QUEUE_SIZE:
+                        seen.popitem(last=False)
+                    LIVE_CHAT_MESSAGES.labels(message["type"]).inc()
+                    self.messages += 1
+                    self.recent.append(message)
+                    self.publish(message)
+                if continuation:
+                    await asyncio.sleep(poll_interval(timeout_ms))
+        except asyncio.CancelledError:
+            reason = "stopped"
+            raise
+        except Exception as e:
+            reason = f"error: {e}"
+        finally:
+            self.hub._remove(self)
+            LIVE_CHAT_STREAMS.dec()
+            self.publish({"type": "end", "reason": reason})
+            self.publish(None)
+
+    def stats(self) -> Dict:
+        return {
+            "video_id": self.video_id,
+            "mode": self.mode,
+            "subscribers": len(self.subscribers),
+            "polls": self.polls,
+            "messages": self.messages,
+            "started_at": self.started_at,
+        }
+
+class LiveChatHub:
+    def __init__(self, max_streams: int = LIVE_CHAT_MAX_STREAMS):
+        self.max_streams = max_streams
+        self.streams: Dict[Tuple[str, str], LiveChatStream] = {}
+
+    def _remove(self, stream: LiveChatStream):
+        if self.streams.get((stream.video_id, stream.mode)) is stream:
+            del self.streams[(stream.video_id, stream.mode)]
+
+    @asynccontextmanager
+    async def subscription(self, video_id: str, mode: str = "all") -> AsyncIterator[ChatSubscription]:
+        stream = self.streams.get((video_id, mode))
+        if stream is None:
+            if len(self.streams) >= self.max_streams:
+                raise LiveChatFull(f"Already following {self.max_streams} live chats")
+            stream = self.streams[(video_id, mode)] = LiveChatStream(self, video_id, mode)
+        subscription = stream.subscribe()
+        try:
+            yield subscription
+        finally:
+            stream.unsubscribe(subscription)
+
+    def stats(self) -> List[Dict]:
+        return [stream.stats() for stream in self.streams.values()]
+
+    async def stop(self):
+        tasks = [stream.task for stream in self.streams.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+live_chat_hub = LiveChatHub()
@@ -1,8 +1,16 @@
 import asyncio
-import json
-import httpx
-from typing import List, Dict
-from ..utils import get_youtube_api_key, get_context
+import math
+import os
+from typing import List, Dict, Optional, Tuple
+from ..extractors import compile_extractor
+from ..innertube import continuation_items, find_continuation_token, innertube_post, search_result_sections
+from ..pagination import collect_items
+from ..storage import storage_sink
+from ..utils import get_context
+
+extract_video = compile_extractor("videoRenderer", [
+    "video_id", "title", ("channel_name", "channel"), "views", "published_time", "url",
+])
 
 def extract_videos_from_search(items: List[Dict]) -> List[Dict]:
     results = []
@@ -10,18 +18,9 @@ def extract_videos_from_search(items: List[Dict]) -> List[Dict]:
         video = item.get("videoRenderer")
         if not video:
             continue
-        results.append({
-            "video_id": video.get("videoId"),
-            "title": video.get("title", {}).get("runs", [{}])[0].get("text", ""),
-            "channel_name": video.get("ownerText", {}).get("runs", [{}])[0].get("text", ""),
-            "views": video.get("viewCountText", {}).get("simpleText", ""),
-            "published_time": video.get("publishedTimeText", {}).get("simpleText", ""),
-            "url": f"https://www.youtube.com/watch?v={video.get('videoId')}"
-        })
+        results.append(extract_video(video))
     return results
 
-import math
-
 def generate_grid_locations(center_lat, center_lng, step_km=10, radius_km=50):
     R = 6371
     grid = []
@@ -43,95 +42,164 @@ def generate_grid_locations(center_lat, center_lng, step_km=10, radius_km=50):
     return grid
 
 
-async def get_videos_by_location(location: str, proxy: str = None, radius: str = "500km", max_results: int = 50) -> List[Dict]:
-    API_KEY = await get_youtube_api_key()
-    SEARCH_URL = f"https://www.youtube.com/youtubei/v1/search?key={API_KEY}"
-    
-    headers = {
-        "Content-Type": "application/json",
-        "User-Agent": "Mozilla/5.0",
-        "Origin": "https://www.youtube.com",
-        "Referer": "https://www.youtube.com"
-    }
-
-    payload = {
-        "context": get_context(),
-        "query": "*",             
-        "params": "EgIIAQ%3D%3D", 
-        "location": location,
-        "locationRadius": radius,
-        "maxResults": max_results
-    }
-    
-    collected = []
-    continuation = None
-
-    async with httpx.AsyncClient(proxies=proxy, headers=headers, timeout=15) as client:
-        resp = await client.post(SEARCH_URL, json=payload)
-        resp.raise_for_status()
-        data = resp.json()
-
-        section_contents = data.get("contents", {}) \
-                               .get("twoColumnSearchResultsRenderer", {}) \
-                               .get("primaryContents", {}) \
-                               .get("sectionListRenderer", {}) \
-                               .get("contents", [])
-        
-        for section in section_contents:
-            items = section.get("itemSectionRenderer", {}).get("contents", [])
-            videos = extract_videos_from_search(items)
-            if videos:
-                collected += videos
-
-        continuation = None
-        for section in section_contents:
-            if "itemSectionRenderer" in section:
-                continuations = section["itemSectionRenderer"].get("continuations")
-                if continuations:
-                    continuation = continuations[0].get("continuationItemRenderer", {}) \
-                                                  .get("continuationEndpoint", {}) \
-                                                  .get("continuationCommand", {}) \
-                                                  .get("token")
-                    if continuation:
-                        break
-        
-        while continuation and len(collected) < max_results:
-            cont_payload = {"context": get_context(), "continuation": continuation}
-            resp = await client.post(SEARCH_URL, json=cont_payload)
-            resp.raise_for_status()
-            data = resp.json()
-            
-            with open("debug_location_continuation.json", "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            
-            items = data.get("onResponseReceivedCommands", [{}])[0] \
-                        .get("appendContinuationItemsAction", {}) \
-                        .get("continuationItems", [])
+async def get_videos_by_location_page(
+    location: str,
+    radius: str = "500km",
+    max_results: int = 50,
+    continuation: Optional[str] = None,
+    proxy: str = None,
+) -> Tuple[List[Dict], Optional[str]]:
+    if continuation is None:
+        payload = {
+            "context": get_context(),
+            "query": "*",
+            "params": "EgIIAQ%3D%3D",
+            "location": location,
+            "locationRadius": radius,
+            "maxResults": max_results
+        }
+        data = await innertube_post("search", payload, proxy=proxy)
+        sections = search_result_sections(data)
+    else:
+        payload = {"context": get_context(), "continuation": continuation}
+        data = await innertube_post("search", payload, proxy=proxy)
+        sections = continuation_items(data)
+
+    collected = extract_videos_from_search(sections)
+    for section in sections:
+        items = section.get("itemSectionRenderer", {}).get("contents")
+        if items:
             collected += extract_videos_from_search(items)
-            
-            continuation = next(
-                (item.get("continuationItemRenderer", {}) \
-                    .get("continuationEndpoint", {}) \
-                    .get("continuationCommand", {}) \
-                    .get("token")
-                 for item in items if "continuationItemRenderer" in item),
-                None
-            )
-    
-    return collected[:max_results]
-
-async def get_all_location_videos(center_lat: float, center_lng: float, proxy: str = None, step_km: int = 10, radius_km: int = 50, max_results_per_loc: int = 20):
-    locations = generate_grid_locations(center_lat, center_lng, step_km=step_km, radius_km=radius_km)
-
-    tasks = [get_videos_by_location(loc, proxy=proxy, radius="10km", max_results=max_results_per_loc) for loc in locations]
-    results = await asyncio.gather(*tasks)
-
-    all_videos = []
-    seen = set()
-    for videos in results:
-        for v in videos:
-            if v["videoId"] not in seen:
-                all_videos.append(v)
-                seen.add(v["videoId"])
-
-    return all_videos
\ No newline at end of file
+
+    storage_sink.record("videos", collected)
+    return collected, find_continuation_token(sections)
+
+async def get_videos_by_location(location: str, proxy: str = None, radius: str = "500km", max_results: int = 50) -> List[Dict]:
+    collected, _ = await collect_items(
+        lambda continuation: get_videos_by_location_page(
+            location, radius=radius, max_results=max_results, continuation=continuation, proxy=proxy
+        ),
+        max_results,
+    )
+    return collected
+
+LOCATION_CONCURRENCY = int(os.getenv("LOCATION_CONCURRENCY", "8"))
+LOCATION_MAX_POINTS = int(os.getenv("LOCATION_MAX_POINTS", "200"))
+
+# (x_km, y_km, size_km): square cell centred x/y km east/north of the crawl centre
+Cell = Tuple[float, float, float]
+
+class LocationCrawl:
+    """Adaptive quadtree crawl: cells returning a full page are split into four, empty or sparse ones are not"""
+
+    def __init__(
+        self,
+        center_lat: float,
+        center_lng: float,
+        radius_km: float = 50,
+        step_km: float = 10,
+        per_location_limit: int = 20,
+        proxy: str = None,
+        concurrency: int = LOCATION_CONCURRENCY,
+        max_points: int = LOCATION_MAX_POINTS,
+    ):
+        self.center_lat = center_lat
+        self.center_lng = center_lng
+        self.radius_km = radius_km
+        self.step_km = step_km
+        self.per_location_limit = per_location_limit
+        self.proxy = proxy
+        self.concurrency = concurrency
+        self.max_points = max_points
+
+        self.videos: Dict[str, Dict] = {}
+        self.points_scanned = 0
+        self.points_failed = 0
+        self.cells_refined = 0
+        self._dispatched = 0
+
+    def cell_location(self, cell: Cell) -> str:
+        x_km, y_km, _ = cell
+        R = 6371
+        lat = self.center_lat + math.degrees(y_km / R)
+        lng = self.center_lng + math.degrees(x_km / (R * math.cos(math.radians(self.center_lat))))
+        return f"{lat:.6f},{lng:.6f}"
+
+    def cell_radius(self, cell: Cell) -> str:
+        # Half the diagonal, so the search circle covers the whole cell
+        return f"{max(1, math.ceil(cell[2] / math.sqrt(2)))}km"
+
+    def children(self, cell: Cell) -> List[Cell]:
+        x_km, y_km, size = cell
+        half, quarter = size / 2, size / 4
+        result = []
+        for dx in (-quarter, quarter):
+            for dy in (-quarter, quarter):
+                cx, cy = x_km + dx, y_km + dy
+                # Skip quadrants lying entirely outside the requested radius
+                if math.hypot(cx, cy) - half / math.sqrt(2) <= self.radius_km:
+                    result.append((cx, cy, half))
+        return result
+
+    async def scan(self, cell: Cell) -> List[Dict]:
+        videos = await get_videos_by_location(
+            self.cell_location(cell),
+            proxy=self.proxy,
+            radius=self.cell_radius(cell),
+            max_results=self.per_location_limit,
+        )
+        for video in videos:
+            self.videos.setdefault(video["video_id"], video)
+        return videos
+
+    async def worker(self, queue: "asyncio.Queue[Cell]"):
+        while True:
+            cell = await queue.get()
+            try:
+                videos = await self.scan(cell)
+                self.points_scanned += 1
+                if len(videos) >= self.per_location_limit and cell[2] / 2 >= self.step_km:
+                    self.cells_refined += 1
+                    for child in self.children(cell):
+                        if self._dispatched >= self.max_points:
+                            break
+                        self._dispatched += 1
+                        queue.put_nowait(child)
+            except Exception as e:
+                self.points_failed += 1
+                print("Location cell failed:", self.cell_location(cell), e)
+            finally:
+                queue.task_done()
+
+    async def run(self) -> Dict[str, Dict]:
+        queue: "asyncio.Queue[Cell]" = asyncio.Queue()
+        self._dispatched = 1
+        queue.put_nowait((0.0, 0.0, 2 * self.radius_km))
+
+        workers = [asyncio.ensure_future(self.worker(queue)) for _ in range(self.concurrency)]
+        try:
+            await queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        return self.videos
+
+async def get_all_location_videos(
+    center_lat: float,
+    center_lng: float,
+    proxy: str = None,
+    step_km: int = 10,
+    radius_km: int = 50,
+    max_results_per_loc: int = 20,
+    concurrency: int = LOCATION_CONCURRENCY,
+    max_points: int = LOCATION_MAX_POINTS,
+) -> List[Dict]:
+    crawl = LocationCrawl(
+        center_lat, center_lng,
+        radius_km=radius_km, step_km=step_km, per_location_limit=max_results_per_loc,
+        proxy=proxy, concurrency=concurrency, max_points=max_points,
+    )
+    videos = await crawl.run()
+    return list(videos.values())
@@ -1,6 +1,23 @@
-import httpx
-from typing import List, Dict
-from ..utils import get_youtube_api_key
+import os
+from typing import AsyncIterator, List, Dict, Optional, Tuple
+from ..extractors import compile_extractor
+from ..metrics import PARSE_MISSES
+from ..innertube import continuation_items, find_continuation_token, innertube_post
+from ..pagination import iter_items, merge_streams
+from ..storage import storage_sink
+from ..utils import save_to_json
+
+PLAYLIST_EXPAND_CONCURRENCY = int(os.getenv("PLAYLIST_EXPAND_CONCURRENCY", "4"))
+# Where a playlist lockup the extractor could not read is written for debugging, unset to disable
+PLAYLIST_DUMP_PATH = os.getenv("PLAYLIST_DUMP_PATH", "")
+
+extract_playlist = compile_extractor("lockupViewModel", [
+    ("playlistId", "playlist_id"), "title", "thumbnail", ("videoCount", "video_count"),
+])
+
+extract_playlist_video = compile_extractor("playlistVideoRenderer", [
+    "video_id", "title", "published_time", "duration", "thumbnail",
+])
 
 async def build_web_context() -> Dict:
     return {
@@ -36,20 +53,40 @@ def extract_playlists_tab_info(data):
 
 
 async def get_playlist_videos(channel_id: str, proxy: str = None) -> List[Dict]:
-    API_KEY = await get_youtube_api_key()
-    BROWSER_URL = f"https://www.youtube.com/youtubei/v1/browse?key={API_KEY}"
+    payload = await build_web_context()
+    payload["browseId"] = channel_id
+    data = await innertube_post("browse", payload, proxy=proxy)
+    
+    playlists = []
+    unreadable = None
 
-    async with httpx.AsyncClient(proxies=proxy, timeout=15) as client:
-        payload = await build_web_context()
-        payload["browseId"] = channel_id
-        resp = await client.post(BROWSER_URL, json=payload)
-        resp.raise_for_status()
-        data = resp.json()
-        
-        playlists = []
+    browse_id, params = extract_playlists_tab_info(data)
+
+    if not browse_id or not params:
+        raise Exception("browseId and params not found")
 
-        browse_id, params = extract_playlists_tab_info(data)
+    payload = await build_web_context()
+    payload["browseId"] = browse_id
+    payload["params"] = params
+
+    playlist_data = await innertube_post("browse", payload, proxy=proxy)
 
+    contents = playlist_data.get("contents", {}) \
+                            .get("twoColumnBrowseResultsRenderer", {}) \
+                            .get("tabs", [])
+                            
+    target_tab = None
+    for tab in contents:
+        tab_renderer = tab.get("tabRenderer", {})
+        title = tab_renderer.get("title", "").lower()
+        if title == "playlists":
+            target_tab = tab_renderer
+            break
+
+    if not target_tab or "content" not in target_tab:
+        endpoint = target_tab.get("endpoint", {}).get("browseEndpoint", {})
+        browse_id = endpoint.get("browseId")
+        params = endpoint.get("params")
         if not browse_id or not params:
             raise Exception("browseId and params not found")
 
@@ -57,168 +94,104 @@ async def get_playlist_videos(channel_id: str, proxy: str = None) -> List[Dict]:
         payload["browseId"] = browse_id
         payload["params"] = params
 
-        resp = await client.post(BROWSER_URL, json=payload)
-        resp.raise_for_status()
-        playlist_data = resp.json()
+        playlist_data = await innertube_post("browse", payload, proxy=proxy)
 
         contents = playlist_data.get("contents", {}) \
                                 .get("twoColumnBrowseResultsRenderer", {}) \
                                 .get("tabs", [])
-                                
-        target_tab = None
-        for tab in contents:
-            tab_renderer = tab.get("tabRenderer", {})
-            title = tab_renderer.get("title", "").lower()
-            if title == "playlists":
-                target_tab = tab_renderer
-                break
-
-        if not target_tab or "content" not in target_tab:
-            endpoint = target_tab.get("endpoint", {}).get("browseEndpoint", {})
-            browse_id = endpoint.get("browseId")
-            params = endpoint.get("params")
-            if not browse_id or not params:
-                raise Exception("browseId and params not found")
-
-            payload = await build_web_context()
-            payload["browseId"] = browse_id
-            payload["params"] = params
-
-            resp = await client.post(BROWSER_URL, json=payload)
-            resp.raise_for_status()
-            playlist_data = resp.json()
-
-            contents = playlist_data.get("contents", {}) \
-                                    .get("twoColumnBrowseResultsRenderer", {}) \
-                                    .get("tabs", [])
-            target_tab = next(
-                (tab.get("tabRenderer", {}) for tab in contents
-                 if tab.get("tabRenderer", {}).get("title", "").lower() == "playlists"),
-                None
-            )
-            if not target_tab:
-                raise Exception("Playlists not load from browseEndpoint")
-
-        contents = target_tab.get("content", {}) \
-                             .get("sectionListRenderer", {})
-
-        for section in contents.get("contents", []):
-            item_section = section.get("itemSectionRenderer", {})
-            for item in item_section.get("contents", []):
-                for grid_item in item.get("gridRenderer", {}).get("items", []):
-                    lockup = grid_item.get("lockupViewModel", {})
-                    thumbnail_url = (
-                        lockup.get("contentImage", {})
-                              .get("collectionThumbnailViewModel", {})
-                              .get("primaryThumbnail", {})
-                              .get("thumbnailViewModel", {})
-                              .get("image", {})
-                              .get("sources", [{}])[-1]
-                              .get("url", "")
-                    )
-                    
-                    import json
-                    with open("playlist_error_dump.json", "w", encoding="utf-8") as f:
-                        json.dump(lockup, f, ensure_ascii=False, indent=2)
-                    videoCount = ""
-                    
-                    overlays = (
-                        lockup.get("contentImage", {})
-                              .get("collectionThumbnailViewModel", {})
-                              .get("primaryThumbnail", {})
-                              .get("thumbnailViewModel", {})
-                              .get("overlays", [])
-                    )
-
-                    for overlay in overlays:
-                        badge = overlay.get("thumbnailOverlayBadgeViewModel", {}).get("thumbnailBadges", [])
-                        if badge:
-                            videoCount = badge[0].get("thumbnailBadgeViewModel", {}).get("text", "")
-                            if videoCount:
-                                break
-                    
-                    title = (
-                        lockup.get("metadata", {})
-                            .get("lockupMetadataViewModel", {})
-                            .get("title", {})
-                            .get("content", "")
-                    )
-                        
-                    playlist_id = (
-                        lockup.get("rendererContext", {})
-                            .get("commandContext", {})
-                            .get("onTap", {})
-                            .get("innertubeCommand", {})
-                            .get("watchEndpoint", {})
-                            .get("playlistId", "")
-                    )
-
-                    playlists.append({
-                        "playlistId": playlist_id,
-                        "title": title,
-                        "thumbnail": thumbnail_url,
-                        "videoCount": videoCount
-                    })
-
-        return playlists
-
-def extract_title(title_obj):
-    if "simpleText" in title_obj:
-        return title_obj["simpleText"]
-    elif "runs" in title_obj and title_obj["runs"]:
-        return "".join([run.get("text", "") for run in title_obj["runs"]])
-    return ""
-
-async def get_videos_from_playlist(playlist_id: str, proxy: str = None) -> List[Dict]:
-    API_KEY = await get_youtube_api_key()
-    BROWSER_URL = f"https://www.youtube.com/youtubei/v1/browse?key={API_KEY}"
-
+        target_tab = next(
+            (tab.get("tabRenderer", {}) for tab in contents
+             if tab.get("tabRenderer", {}).get("title", "").lower() == "playlists"),
+            None
+        )
+        if not target_tab:
+            raise Exception("Playlists not load from browseEndpoint")
+
+    contents = target_tab.get("content", {}) \
+                         .get("sectionListRenderer", {})
+
+    for section in contents.get("contents", []):
+        item_section = section.get("itemSectionRenderer", {})
+        for item in item_section.get("contents", []):
+            for grid_item in item.get("gridRenderer", {}).get("items", []):
+                lockup = grid_item.get("lockupViewModel", {})
+                playlist = extract_playlist(lockup)
+                if not playlist["playlistId"]:
+                    PARSE_MISSES.labels("playlist_lockup").inc()
+                    unreadable = lockup
+                playlists.append(playlist)
+
+    # One write per call at most, outside the loop
+    if unreadable is not None and PLAYLIST_DUMP_PATH:
+        save_to_json(unreadable, PLAYLIST_DUMP_PATH)
+
+    storage_sink.record("playlists", playlists, channel_id=channel_id)
+    return playlists
+
+async def get_videos_from_playlist_page(playlist_id: str, continuation: Optional[str] = None, proxy: str = None) -> Tuple[List[Dict], Optional[str]]:
     payload = await build_web_context()
-    payload["browseId"] = f"VL{playlist_id}"
+    if continuation is None:
+        payload["browseId"] = f"VL{playlist_id}"
+    else:
+        payload["continuation"] = continuation
 
-    videos = []
+    data = await innertube_post("browse", payload, proxy=proxy)
 
-    async with httpx.AsyncClient(proxies=proxy, timeout=15) as client:
-        while True:
-            resp = await client.post(BROWSER_URL, json=payload)
-            resp.raise_for_status()
-            data = resp.json()
+    videos = []
 
-            if "contents" not in data:
-                raise Exception("Invalid response structure")
+    if continuation is None:
+        if "contents" not in data:
+            raise Exception("Invalid response structure")
 
+        try:
+            contents = (
+                data["contents"]["twoColumnBrowseResultsRenderer"]["tabs"][0]
+                ["tabRenderer"]["content"]["sectionListRenderer"]["contents"][0]
+                ["itemSectionRenderer"]["contents"][0]["playlistVideoListRenderer"]["contents"]
+            )
+        except Exception:
+            PARSE_MISSES.labels("playlist_contents").inc()
+            return videos, None
+    else:
+        contents = continuation_items(data)
+
+    for item in contents:
+        if "playlistVideoRenderer" in item:
+            videos.append(extract_playlist_video(item["playlistVideoRenderer"]))
+
+    storage_sink.record("playlist_videos", videos, playlist_id=playlist_id)
+    return videos, find_continuation_token(contents)
+
+async def get_videos_from_playlist(playlist_id: str, proxy: str = None, max_results: Optional[int] = None) -> List[Dict]:
+    return [
+        video async for video in iter_items(
+            lambda continuation: get_videos_from_playlist_page(playlist_id, continuation=continuation, proxy=proxy),
+            limit=max_results,
+        )
+    ]
+
+async def iter_channel_playlist_videos(
+    playlists: List[Dict],
+    per_playlist_limit: Optional[int] = None,
+    concurrency: int = PLAYLIST_EXPAND_CONCURRENCY,
+    proxy: str = None,
+) -> AsyncIterator[Dict]:
+    """{"playlist": ...} for every playlist, then {"playlist_id", "video"} records as the playlists are crawled side by side"""
+    for playlist in playlists:
+        yield {"playlist": playlist}
+
+    def playlist_stream(playlist_id: str):
+        async def stream():
             try:
-                contents = (
-                    data["contents"]["twoColumnBrowseResultsRenderer"]["tabs"][0]
-                    ["tabRenderer"]["content"]["sectionListRenderer"]["contents"][0]
-                    ["itemSectionRenderer"]["contents"][0]["playlistVideoListRenderer"]["contents"]
-                )
+                async for video in iter_items(
+                    lambda continuation: get_videos_from_playlist_page(playlist_id, continuation=continuation, proxy=proxy),
+                    limit=per_playlist_limit,
+                ):
+                    yield {"playlist_id": playlist_id, "video": video}
             except Exception as e:
-                print("[!] Error parsing playlist content:", e)
-                break
-
-            continuation_token = None
-
-            for item in contents:
-                if "playlistVideoRenderer" in item:
-                    renderer = item["playlistVideoRenderer"]
-                    videos.append({
-                        "video_id": renderer.get("videoId"),
-                        "title": extract_title(renderer.get("title", {})),
-                        "published_time": renderer.get("publishedTimeText", {}).get("simpleText", ""),
-                        "duration": renderer.get("lengthText", {}).get("simpleText", ""),
-                        "thumbnail": renderer.get("thumbnail", {}).get("thumbnails", [{}])[-1].get("url", "")
-                    })
-                elif "continuationItemRenderer" in item:
-                    continuation_token = (
-                        item["continuationItemRenderer"]
-                        ["continuationEndpoint"]["continuationCommand"]["token"]
-                    )
-
-            if continuation_token:
-                payload = await build_web_context()
-                payload["continuation"] = continuation_token
-            else:
-                break
-
-    return videos
+                yield {"playlist_id": playlist_id, "error": str(e)}
+        return stream
+
+    playlist_ids = dict.fromkeys(playlist["playlistId"] for playlist in playlists if playlist.get("playlistId"))
+    async for record in merge_streams([playlist_stream(playlist_id) for playlist_id in playlist_ids], concurrency):
+        yield record
@@ -1,6 +1,10 @@
-import httpx
-from typing import List, Dict
-from ..utils import get_youtube_api_key, get_context
+from typing import List, Dict, Optional, Tuple
+from ..extractors import compile_extractor
+from ..innertube import continuation_items, find_continuation_token, innertube_post, search_result_sections
+from ..pagination import collect_items
+from ..singleflight import single_flight
+from ..storage import storage_sink
+from ..utils import get_context
 
 SORT_OPTIONS = {
     "relevance": None,
@@ -9,6 +13,11 @@ SORT_OPTIONS = {
     "rating": "CAESAhAB",
 }
 
+extract_video = compile_extractor("videoRenderer", [
+    "title", "video_id", "url", "duration", "views", "channel", "channel_id",
+    "published_time", "description_snippet", "thumbnails",
+])
+
 def extract_video_items(items: List[Dict]) -> List[Dict]:
     videos = []
 
@@ -25,84 +34,53 @@ def extract_video_items(items: List[Dict]) -> List[Dict]:
 
         video = content.get("videoRenderer") or content
 
-        videos.append({
-            "title": video.get("title", {}).get("runs", [{}])[0].get("text", ""),
-            "video_id": video.get("videoId"),
-            "url": f"https://www.youtube.com/watch?v={video.get('videoId')}",
-            "duration": video.get("lengthText", {}).get("simpleText", ""),
-            "views": video.get("viewCountText", {}).get("simpleText", ""),
-            "channel": video.get("ownerText", {}).get("runs", [{}])[0].get("text", ""),
-            "channel_id": video.get("ownerText", {}).get("runs", [{}])[0]
-                .get("navigationEndpoint", {})
-                .get("browseEndpoint", {})
-                .get("browseId", ""),
-            "published_time": video.get("publishedTimeText", {}).get("simpleText", ""),
-            "description_snippet": video.get("detailedMetadataSnippets", [{}])[0]
-                .get("snippetText", {}).get("runs", [{}])[0].get("text", ""),
-            "thumbnails": video.get("thumbnail", {}).get("thumbnails", [])
-        })
+        videos.append(extract_video(video))
 
     return videos
 
 
-async def search_youtube(query: str, max_results: int = 50, proxy: str = None, sort: str = "relevance") -> List[Dict]:
-    API_KEY = await get_youtube_api_key()
-    SEARCH_URL = f"https://www.youtube.com/youtubei/v1/search?key={API_KEY}"
-
-    headers = {
-        "Content-Type": "application/json",
-        "User-Agent": "Mozilla/5.0",
-        "Origin": "https://www.youtube.com",
-        "Referer": "https://www.youtube.com/"
-    }
-
-    collected = []
-    continuation = None
-    sort_param = SORT_OPTIONS.get(sort)
+async def search_youtube_page(query: str, sort: str = "relevance", continuation: Optional[str] = None, proxy: str = None) -> Tuple[List[Dict], Optional[str]]:
+    # A viral query is requested by many clients at once; they share one upstream request per page
+    return await single_flight.do(
+        "search", (query, sort, continuation, proxy),
+        lambda: fetch_search_page(query, sort, continuation, proxy),
+    )
 
-    async with httpx.AsyncClient(proxies=proxy, headers=headers, timeout=15) as client:
+async def fetch_search_page(query: str, sort: str = "relevance", continuation: Optional[str] = None, proxy: str = None) -> Tuple[List[Dict], Optional[str]]:
+    if continuation is None:
         # First request
         payload = {
             "context": get_context(),
             "query": query
         }
-        
+
+        sort_param = SORT_OPTIONS.get(sort)
         if sort_param:
             payload["params"] = sort_param
 
-        resp = await client.post(SEARCH_URL, json=payload)
-        resp.raise_for_status()
-        data = resp.json()
-
-        # Extract initial items
-        sections = data["contents"]["twoColumnSearchResultsRenderer"]["primaryContents"]["sectionListRenderer"]["contents"]
-        for section in sections:
-            if "itemSectionRenderer" in section:
-                items = section["itemSectionRenderer"].get("contents", [])
-                collected += extract_video_items(items)
-            if "continuationItemRenderer" in section:
-                continuation = section["continuationItemRenderer"]["continuationEndpoint"]["continuationCommand"]["token"]
-
-        # Continue fetching
-        while continuation and len(collected) < max_results:
-            payload = {
-                "context": get_context(),
-                "continuation": continuation
-            }
-
-            resp = await client.post(SEARCH_URL, json=payload)
-            resp.raise_for_status()
-            data = resp.json()
-
-            continuation_items = data.get("onResponseReceivedCommands", [])[0] \
-                .get("appendContinuationItemsAction", {}) \
-                .get("continuationItems", [])
-
-            for section in continuation_items:
-                if "itemSectionRenderer" in section:
-                    items = section["itemSectionRenderer"].get("contents", [])
-                    collected += extract_video_items(items)
-                if "continuationItemRenderer" in section:
-                    continuation = section["continuationItemRenderer"]["continuationEndpoint"]["continuationCommand"]["token"]
-
-    return collected[:max_results]
\ No newline at end of file
+        data = await innertube_post("search", payload, proxy=proxy)
+        sections = search_result_sections(data)
+    else:
+        payload = {
+            "context": get_context(),
+            "continuation": continuation
+        }
+
+        data = await innertube_post("search", payload, proxy=proxy)
+        sections = continuation_items(data)
+
+    collected = []
+    for section in sections:
+        items = section.get("itemSectionRenderer", {}).get("contents")
+        if items:
+            collected += extract_video_items(items)
+
+    storage_sink.record("videos", collected)
+    return collected, find_continuation_token(sections)
+
+async def search_youtube(query: str, max_results: int = 50, proxy: str = None, sort: str = "relevance") -> List[Dict]:
+    collected, _ = await collect_items(
+        lambda continuation: search_youtube_page(query, sort=sort, continuation=continuation, proxy=proxy),
+        max_results,
+    )
+    return collected
@@ -1,23 +1,53 @@
-import httpx
-from typing import List, Dict, Optional
-from ..utils import get_youtube_api_key, get_context
+import asyncio
+import os
+import time
+from typing import List, Dict, NamedTuple, Optional, Tuple
+from ..extractors import compile_extractor
+from ..fastjson import dumps
+from ..innertube import continuation_items, find_continuation_token, innertube_post
+from ..metrics import TRENDING_REFRESH_FAILURES, TRENDING_REFRESH_SECONDS, TRENDING_SNAPSHOT_AGE
+from ..pagination import InvalidCursor, collect_items
+from ..storage import storage_sink
+from ..utils import get_context
+
+# Trending tab name -> browse params; "now" is the default tab
+TRENDING_CATEGORIES: Dict[str, Optional[str]] = {
+    "now": None,
+    "music": "EgZtdXNpYw%3D%3D",
+    "gaming": "4gIcGhpnYW1pbmdfY29ycHVzX21vc3RfcG9wdWxhcg%3D%3D",
+    "movies": "4gIKGgh0cmFpbGVycw%3D%3D",
+}
+
+def env_list(name: str, default: str) -> List[str]:
+    return [value.strip() for value in os.getenv(name, default).split(",") if value.strip()]
+
+TRENDING_SNAPSHOTS_ENABLED = os.getenv("TRENDING_SNAPSHOTS_ENABLED", "true").lower() in ("1", "true", "yes")
+# Every combination of these is refreshed in the background and served from memory
+TRENDING_SNAPSHOT_REGIONS = env_list("TRENDING_SNAPSHOT_REGIONS", "US")
+TRENDING_SNAPSHOT_LANGUAGES = env_list("TRENDING_SNAPSHOT_LANGUAGES", "en")
+TRENDING_SNAPSHOT_CATEGORIES = env_list("TRENDING_SNAPSHOT_CATEGORIES", "music")
+TRENDING_SNAPSHOT_ITEMS = int(os.getenv("TRENDING_SNAPSHOT_ITEMS", "200"))
+TRENDING_SNAPSHOT_INTERVAL = float(os.getenv("TRENDING_SNAPSHOT_INTERVAL", "600"))
+TRENDING_SNAPSHOT_CONCURRENCY = int(os.getenv("TRENDING_SNAPSHOT_CONCURRENCY", "2"))
+# Older snapshots are not served, e.g. after refreshes kept failing
+TRENDING_SNAPSHOT_MAX_AGE = float(os.getenv("TRENDING_SNAPSHOT_MAX_AGE", "3600"))
+# Pages of this size are rendered once per refresh; other limits are joined from pre-serialized videos
+TRENDING_SNAPSHOT_PAGE_SIZE = int(os.getenv("TRENDING_SNAPSHOT_PAGE_SIZE", "30"))
+
+SNAPSHOT_CURSOR_PREFIX = "snapshot:"
+
+extract_video = compile_extractor("videoRenderer", [
+    "video_id", "title", ("thumbnail", "thumbnails"), ("channel_name", "byline"),
+    ("views", "short_views"), "published_time", "url",
+])
 
 def extract_videos(items: List[Dict]) -> List[Dict]:
     results = []
     for item in items:
         video = item.get("videoRenderer") or item.get("gridVideoRenderer")
- 
         if not video:
             continue
-        results.append({
-            "video_id": video.get("videoId"),
-            "title": video.get("title", {}).get("runs", [{}])[0].get("text", ""),
-            "thumbnail": video.get("thumbnail", {}).get("thumbnails", []),
-            "channel_name": video.get("shortBylineText", {}).get("runs", [{}])[0].get("text", ""),
-            "views": video.get("shortViewCountText", {}).get("simpleText", ""),
-            "published_time": video.get("publishedTimeText", {}).get("simpleText", ""),
-            "url": f"https://www.youtube.com/watch?v={video.get('videoId')}"
-        })
+        results.append(extract_video(video))
     return results
 
 def extract_videos_from_item(item: Dict) -> List[Dict]:
@@ -34,87 +64,173 @@ def extract_videos_from_item(item: Dict) -> List[Dict]:
             return extract_videos(content["richShelfRenderer"].get("contents", []))
     return []
 
-async def get_trending_videos(
+async def get_trending_videos_page(
+    filter_params: Optional[str] = None,
+    continuation: Optional[str] = None,
     proxy: Optional[str] = None,
-    max_results: int = 100,
-    filter_params: Optional[str] = None
-) -> List[Dict]:
-    API_KEY = await get_youtube_api_key()
-    BROWSE_URL = f"https://www.youtube.com/youtubei/v1/browse?key={API_KEY}"
-
-    headers = {
-        "Content-Type": "application/json",
-        "User-Agent": "Mozilla/5.0",
-        "Origin": "https://www.youtube.com",
-        "Referer": "https://www.youtube.com"
-    }
+    gl: str = "US",
+    hl: str = "en",
+) -> Tuple[List[Dict], Optional[str]]:
 
     collected: List[Dict] = []
-    continuation: Optional[str] = None
 
-    async with httpx.AsyncClient(proxies=proxy, headers=headers, timeout=15) as client:
+    if continuation is None:
         # Initial request
-        payload = {"context": get_context(), "browseId": "FEtrending"}
+        payload = {"context": get_context(hl=hl, gl=gl), "browseId": "FEtrending"}
         if filter_params:
             payload["params"] = filter_params
 
-        resp = await client.post(BROWSE_URL, json=payload)
-        resp.raise_for_status()
-        data = resp.json()
-
-        renderers = data.get("contents", {}) \
-                        .get("twoColumnBrowseResultsRenderer", {}) \
-                        .get("tabs", [])[0] \
-                        .get("tabRenderer", {}) \
-                        .get("content", {}) \
-                        .get("sectionListRenderer", {}) \
-                        .get("contents", [])
-
-        for section in renderers:
-            items = section.get("itemSectionRenderer", {}).get("contents", [])
-            for item in items:
+        data = await innertube_post("browse", payload, proxy=proxy)
+
+        items = data.get("contents", {}) \
+                    .get("twoColumnBrowseResultsRenderer", {}) \
+                    .get("tabs", [])[0] \
+                    .get("tabRenderer", {}) \
+                    .get("content", {}) \
+                    .get("sectionListRenderer", {}) \
+                    .get("contents", [])
+
+        for section in items:
+            for item in section.get("itemSectionRenderer", {}).get("contents", []):
                 collected += extract_videos_from_item(item)
-                if len(collected) >= max_results:
-                    return collected[:max_results]
-
-            continuation = next(
-                (section.get("continuationItemRenderer", {})
-                        .get("continuationEndpoint", {})
-                        .get("continuationCommand", {})
-                        .get("token")
-                 for section in renderers if "continuationItemRenderer" in section),
-                None
-            )
+    else:
+        payload = {"context": get_context(hl=hl, gl=gl), "continuation": continuation}
+        data = await innertube_post("browse", payload, proxy=proxy)
 
-        # Pagination
-        while continuation and len(collected) < max_results:
-            payload = {"context": get_context(), "continuation": continuation}
-            resp = await client.post(BROWSE_URL, json=payload)
-            resp.raise_for_status()
-            data = resp.json()
-
-            items = data.get("onResponseReceivedActions", [{}])[0] \
-                        .get("appendContinuationItemsAction", {}) \
-                        .get("continuationItems", [])
-
-            for item in items:
-                if "richItemRenderer" in item:
-                    video = item["richItemRenderer"].get("content", {})
-                    collected += extract_videos([video])
-                elif "itemSectionRenderer" in item:
-                    for sub in item["itemSectionRenderer"].get("contents", []):
-                        collected += extract_videos_from_item(sub)
-
-                if len(collected) >= max_results:
-                    return collected[:max_results]
-
-            continuation = next(
-                (item.get("continuationItemRenderer", {})
-                      .get("continuationEndpoint", {})
-                      .get("continuationCommand", {})
-                      .get("token")
-                 for item in items if "continuationItemRenderer" in item),
-                None
-            )
+        items = continuation_items(data)
 
-    return collected[:max_results]
+        for item in items:
+            if "richItemRenderer" in item:
+                video = item["richItemRenderer"].get("content", {})
+                collected += extract_videos([video])
+            elif "itemSectionRenderer" in item:
+                for sub in item["itemSectionRenderer"].get("contents", []):
+                    collected += extract_videos_from_item(sub)
+
+    storage_sink.record("videos", collected)
+    return collected, find_continuation_token(items)
+
+async def get_trending_videos(
+    proxy: Optional[str] = None,
+    max_results: int = 100,
+    filter_params: Optional[str] = None,
+    gl: str = "US",
+    hl: str = "en",
+) -> List[Dict]:
+    collected, _ = await collect_items(
+        lambda continuation: get_trending_videos_page(filter_params, continuation=continuation, proxy=proxy, gl=gl, hl=hl),
+        max_results,
+    )
+    return collected
+
+def snapshot_cursor_offset(cursor: str) -> Optional[int]:
+    """Offset encoded in a snapshot page's next_cursor, None for a live crawl cursor"""
+    if not cursor.startswith(SNAPSHOT_CURSOR_PREFIX):
+        return None
+    try:
+        offset = int(cursor[len(SNAPSHOT_CURSOR_PREFIX):])
+    except ValueError:
+        raise InvalidCursor("Invalid cursor")
+    if offset < 0:
+        raise InvalidCursor("Invalid cursor")
+    return offset
+
+def render_page(videos: Tuple[bytes, ...], offset: int, limit: int) -> bytes:
+    end = offset + limit
+    next_cursor = f"{SNAPSHOT_CURSOR_PREFIX}{end}" if end < len(videos) else None
+    return b'{"videos":[' + b",".join(videos[offset:end]) + b'],"next_cursor":' + dumps(next_cursor) + b"}"
+
+class TrendingSnapshot(NamedTuple):
+    videos: Tuple[bytes, ...]
+    pages: Tuple[bytes, ...]
+    fetched_at: float
+
+    @classmethod
+    def build(cls, videos: List[Dict], page_size: int = TRENDING_SNAPSHOT_PAGE_SIZE) -> "TrendingSnapshot":
+        serialized = tuple(dumps(video) for video in videos)
+        pages = tuple(render_page(serialized, offset, page_size) for offset in range(0, len(serialized), page_size))
+        return cls(serialized, pages, time.monotonic())
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+    def render(self, offset: int, limit: int) -> bytes:
+        if limit == TRENDING_SNAPSHOT_PAGE_SIZE and offset % limit == 0 and offset // limit < len(self.pages):
+            return self.pages[offset // limit]
+        return render_page(self.videos, offset, limit)
+
+class TrendingSnapshots:
+    """Refreshes trending for every configured region, language and category in the background"""
+
+    def __init__(
+        self,
+        regions: List[str] = TRENDING_SNAPSHOT_REGIONS,
+        languages: List[str] = TRENDING_SNAPSHOT_LANGUAGES,
+        categories: List[str] = TRENDING_SNAPSHOT_CATEGORIES,
+        enabled: bool = TRENDING_SNAPSHOTS_ENABLED,
+    ):
+        unknown = [category for category in categories if category not in TRENDING_CATEGORIES]
+        if unknown:
+            raise ValueError(f"Unknown trending categories: {', '.join(unknown)}")
+        self.enabled = enabled
+        self.matrix = [(gl, hl, category) for gl in regions for hl in languages for category in categories]
+        self.snapshots: Dict[Tuple[str, str, str], TrendingSnapshot] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def get(self, gl: str, hl: str, category: str) -> Optional[TrendingSnapshot]:
+        snapshot = self.snapshots.get((gl, hl, category))
+        if snapshot is None or snapshot.age > TRENDING_SNAPSHOT_MAX_AGE:
+            return None
+        return snapshot
+
+    def age(self, key: Tuple[str, str, str]) -> float:
+        snapshot = self.snapshots.get(key)
+        return snapshot.age if snapshot else float("nan")
+
+    def start(self):
+        if not self.enabled or not self.matrix or self._task is not None:
+            return
+        for key in self.matrix:
+            TRENDING_SNAPSHOT_AGE.labels(*key).set_function(lambda key=key: self.age(key))
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.monotonic()
+            await self.refresh_all()
+            await asyncio.sleep(max(0.0, TRENDING_SNAPSHOT_INTERVAL - (time.monotonic() - started)))
+
+    async def refresh_all(self):
+        semaphore = asyncio.Semaphore(TRENDING_SNAPSHOT_CONCURRENCY)
+
+        async def refresh(key: Tuple[str, str, str]):
+            async with semaphore:
+                await self.refresh(*key)
+
+        await asyncio.gather(*(refresh(key) for key in self.matrix))
+
+    async def refresh(self, gl: str, hl: str, category: str):
+        started = time.perf_counter()
+        try:
+            videos = await get_trending_videos(
+                max_results=TRENDING_SNAPSHOT_ITEMS, filter_params=TRENDING_CATEGORIES[category], gl=gl, hl=hl,
+            )
+            if not videos:
+                raise Exception("no videos parsed")
+        except Exception as e:
+            # The previous snapshot keeps being served until it is older than TRENDING_SNAPSHOT_MAX_AGE
+            TRENDING_REFRESH_FAILURES.labels(gl, hl, category).inc()
+            print(f"Trending snapshot {gl}/{hl}/{category} refresh failed:", e)
+            return
+        TRENDING_REFRESH_SECONDS.labels(gl, hl, category).observe(time.perf_counter() - started)
+        self.snapshots[(gl, hl, category)] = TrendingSnapshot.build(videos)
+
+trending_snapshots = TrendingSnapshots()
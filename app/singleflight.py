@@ -0,0 +1,48 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+from .metrics import SINGLEFLIGHT_CALLS
+
+class Flight:
+    def __init__(self, future: "asyncio.Future"):
+        self.future = future
+        self.waiters = 0
+
+class SingleFlight:
+    """Concurrent calls with the same key share one execution of `fetch` and its result or exception"""
+
+    def __init__(self):
+        self._flights: Dict[Tuple[str, Hashable], Flight] = {}
+
+    async def do(self, namespace: str, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        flight_key = (namespace, key)
+        flight = self._flights.get(flight_key)
+        if flight is None:
+            # A task of its own, so one caller being cancelled does not abort the call the others wait on
+            flight = self._flights[flight_key] = Flight(asyncio.ensure_future(fetch()))
+            flight.future.add_done_callback(lambda future: self._done(flight_key, flight))
+            SINGLEFLIGHT_CALLS.labels(namespace, "leader").inc()
+        else:
+            SINGLEFLIGHT_CALLS.labels(namespace, "shared").inc()
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.future)
+        finally:
+            flight.waiters -= 1
+            # Nobody is left to use the result; a later caller must start a new flight, not join the dying one
+            if flight.waiters == 0 and not flight.future.done():
+                if self._flights.get(flight_key) is flight:
+                    del self._flights[flight_key]
+                flight.future.cancel()
+
+    def _done(self, flight_key: Tuple[str, Hashable], flight: Flight):
+        if self._flights.get(flight_key) is flight:
+            del self._flights[flight_key]
+        if not flight.future.cancelled():
+            # Marks the exception retrieved when every waiter was already gone
+            flight.future.exception()
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+single_flight = SingleFlight()
@@ -0,0 +1,269 @@
+import importlib
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from .metrics import STORAGE_BATCH_SECONDS, STORAGE_DROPPED, STORAGE_ROWS
+
+STORAGE_ENABLED = os.getenv("STORAGE_ENABLED", "false").lower() in ("1", "true", "yes")
+# "sqlite" or "package.module:factory" for a custom backend
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite")
+STORAGE_SQLITE_PATH = os.getenv("STORAGE_SQLITE_PATH", "storage.sqlite3")
+STORAGE_BATCH_SIZE = int(os.getenv("STORAGE_BATCH_SIZE", "500"))
+STORAGE_FLUSH_INTERVAL = float(os.getenv("STORAGE_FLUSH_INTERVAL", "1.0"))
+STORAGE_QUEUE_SIZE = int(os.getenv("STORAGE_QUEUE_SIZE", "10000"))
+
+# table -> (primary key columns, other columns)
+TABLES: Dict[str, Tuple[Tuple[str, ...], Tuple[str, ...]]] = {
+    "videos": (("video_id",), (
+        "title", "channel_id", "channel_name", "duration", "length_seconds", "views",
+        "published_time", "description", "thumbnail", "is_live",
+    )),
+    "channels": (("channel_id",), ("channel_name", "handle", "avatar", "banner", "subscriber_count", "description")),
+    "playlists": (("playlist_id",), ("title", "channel_id", "thumbnail", "video_count")),
+    "playlist_videos": (("playlist_id", "video_id"), ()),
+    "comments": (("comment_id",), (
+        "video_id", "parent_id", "author", "avatar", "content", "published_time", "likes", "replies_count",
+    )),
+}
+
+Row = Tuple[str, Dict[str, Any]]
+
+def clean(value: Any) -> Any:
+    # Empty strings are what the extractors use for missing fields; they must not overwrite stored values
+    return None if value == "" or value == [] else value
+
+def pick(item: Dict, *keys: str) -> Any:
+    """First non-empty value under any of the names the services use for the same field"""
+    for key in keys:
+        value = clean(item.get(key))
+        if value is not None:
+            return value
+    return None
+
+def thumbnail_url(value: Any) -> Optional[str]:
+    if isinstance(value, list):
+        return value[-1].get("url") if value else None
+    return value
+
+def video_rows(videos: Iterable[Dict], channel_id: Optional[str] = None) -> List[Row]:
+    rows = []
+    for video in videos:
+        video_id = pick(video, "video_id", "videoId")
+        if not video_id:
+            continue
+        rows.append(("videos", {
+            "video_id": video_id,
+            "title": pick(video, "title"),
+            "channel_id": pick(video, "channel_id") or channel_id,
+            "channel_name": pick(video, "channel", "channel_name", "author"),
+            "duration": pick(video, "duration"),
+            "length_seconds": pick(video, "length_seconds"),
+            "views": pick(video, "views"),
+            "published_time": pick(video, "published_time", "public"),
+            "description": pick(video, "description_snippet"),
+            "thumbnail": thumbnail_url(pick(video, "thumbnail", "thumbnails")),
+            "is_live": pick(video, "is_live", "is_live_content"),
+        }))
+    return rows
+
+def channel_rows(channels: Iterable[Dict]) -> List[Row]:
+    return [
+        ("channels", {column: pick(channel, column) for column in ("channel_id",) + TABLES["channels"][1]})
+        for channel in channels if channel.get("channel_id")
+    ]
+
+def playlist_rows(playlists: Iterable[Dict], channel_id: Optional[str] = None) -> List[Row]:
+    rows = []
+    for playlist in playlists:
+        playlist_id = pick(playlist, "playlist_id", "playlistId")
+        if not playlist_id:
+            continue
+        rows.append(("playlists", {
+            "playlist_id": playlist_id,
+            "title": pick(playlist, "title"),
+            "channel_id": channel_id,
+            "thumbnail": pick(playlist, "thumbnail"),
+            "video_count": pick(playlist, "video_count", "videoCount"),
+        }))
+    return rows
+
+def playlist_video_rows(videos: Iterable[Dict], playlist_id: str) -> List[Row]:
+    rows = []
+    for table, row in video_rows(videos):
+        rows.append((table, row))
+        rows.append(("playlist_videos", {"playlist_id": playlist_id, "video_id": row["video_id"]}))
+    return rows
+
+def comment_rows(comments: Iterable[Dict], video_id: str, parent_id: Optional[str] = None) -> List[Row]:
+    rows = []
+    for comment in comments:
+        if not comment.get("comment_id"):
+            continue
+        rows.append(("comments", {
+            "comment_id": comment["comment_id"],
+            "video_id": video_id,
+            "parent_id": parent_id,
+            "author": pick(comment, "author"),
+            "avatar": pick(comment, "avatar"),
+            "content": comment.get("content"),
+            "published_time": pick(comment, "published_time"),
+            "likes": comment.get("likes"),
+            "replies_count": comment.get("replies_count"),
+        }))
+        rows += comment_rows(comment.get("replies") or [], video_id, parent_id=comment["comment_id"])
+    return rows
+
+NORMALIZERS: Dict[str, Callable[..., List[Row]]] = {
+    "videos": video_rows,
+    "channels": channel_rows,
+    "playlists": playlist_rows,
+    "playlist_videos": playlist_video_rows,
+    "comments": comment_rows,
+}
+
+class SQLiteStorage:
+    """Normalized tables in one SQLite file; upserts keep stored values that a new row leaves empty"""
+
+    def __init__(self, path: str = STORAGE_SQLITE_PATH):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._statements: Dict[str, str] = {}
+        for table, (keys, columns) in TABLES.items():
+            names = keys + columns + ("updated_at",)
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(names)}, PRIMARY KEY ({', '.join(keys)}))"
+            )
+            updates = ", ".join(
+                [f"{column} = COALESCE(excluded.{column}, {table}.{column})" for column in columns]
+                + ["updated_at = excluded.updated_at"]
+            )
+            self._statements[table] = (
+                f"INSERT INTO {table} ({', '.join(names)}) VALUES ({', '.join('?' for _ in names)}) "
+                f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {updates}"
+            )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS videos_channel ON videos (channel_id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS comments_video ON comments (video_id)")
+
+    def write(self, batch: Dict[str, List[Dict[str, Any]]]):
+        now = time.time()
+        self._conn.execute("BEGIN")
+        try:
+            for table, rows in batch.items():
+                keys, columns = TABLES[table]
+                names = keys + columns
+                self._conn.executemany(
+                    self._statements[table],
+                    [tuple(row.get(column) for column in names) + (now,) for row in rows],
+                )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def close(self):
+        self._conn.close()
+
+BACKENDS: Dict[str, Callable[[], Any]] = {
+    "sqlite": SQLiteStorage,
+}
+
+def create_backend(name: str = STORAGE_BACKEND):
+    """A backend only needs write(batch) with {table: [row, ...]} and close()"""
+    if name in BACKENDS:
+        return BACKENDS[name]()
+    module_name, _, attr = name.partition(":")
+    if not attr:
+        raise ValueError(f"Unknown storage backend: {name}")
+    return getattr(importlib.import_module(module_name), attr)()
+
+class StorageSink:
+    """Queues crawled entities and writes them in batches from a background thread"""
+
+    def __init__(self, enabled: bool = STORAGE_ENABLED, backend: str = STORAGE_BACKEND):
+        self.enabled = enabled
+        self.backend_name = backend
+        self.backend = None
+        self._queue: "queue.Queue[Optional[Tuple[str, Any, Dict]]]" = queue.Queue(maxsize=STORAGE_QUEUE_SIZE)
+        self._thread: Optional[threading.Thread] = None
+
+    def record(self, kind: str, items: Any, **context):
+        """Called from request handlers: never blocks, drops the entry if the writer is behind"""
+        if not self.enabled or not items:
+            return
+        try:
+            self._queue.put_nowait((kind, items, context))
+        except queue.Full:
+            # Every kind is named after the table its items go to
+            STORAGE_DROPPED.labels(kind).inc(len(items))
+
+    def start(self):
+        if not self.enabled or self._thread is not None:
+            return
+        self.backend = create_backend(self.backend_name)
+        self._thread = threading.Thread(target=self._run, name="storage-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Flushes what is queued, then closes the backend"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        self.backend.close()
+        self.backend = None
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch: Dict[str, Dict[tuple, Dict]] = {}
+            size = 0
+            deadline = None
+            while size < STORAGE_BATCH_SIZE:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    entry = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if entry is None:
+                    stopping = True
+                    break
+                if deadline is None:
+                    deadline = time.monotonic() + STORAGE_FLUSH_INTERVAL
+                kind, items, context = entry
+                try:
+                    rows = NORMALIZERS[kind](items, **context)
+                except Exception as e:
+                    print(f"Storage could not normalize {kind}:", e)
+                    continue
+                for table, row in rows:
+                    # The same entity twice in one batch is merged, later fields win
+                    keys = tuple(row[key] for key in TABLES[table][0])
+                    pending = batch.setdefault(table, {})
+                    if keys in pending:
+                        pending[keys].update({column: value for column, value in row.items() if value is not None})
+                    else:
+                        pending[keys] = row
+                        size += 1
+            if batch:
+                self._flush(batch)
+
+    def _flush(self, batch: Dict[str, Dict[tuple, Dict]]):
+        started = time.perf_counter()
+        try:
+            self.backend.write({table: list(rows.values()) for table, rows in batch.items()})
+        except Exception as e:
+            print("Storage write failed:", e)
+            for table, rows in batch.items():
+                STORAGE_DROPPED.labels(table).inc(len(rows))
+            return
+        STORAGE_BATCH_SECONDS.observe(time.perf_counter() - started)
+        for table, rows in batch.items():
+            STORAGE_ROWS.labels(table).inc(len(rows))
+
+storage_sink = StorageSink()
@@ -0,0 +1,40 @@
+from typing import Any, AsyncIterator
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from .fastjson import dumps
+
+STREAM_FORMATS = ("ndjson", "sse")
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+
+def encode_record(record: Any, fmt: str, event: str = None) -> bytes:
+    data = dumps(record)
+    if fmt == "sse":
+        prefix = f"event: {event}\n".encode() if event else b""
+        return prefix + b"data: " + data + b"\n\n"
+    return data + b"\n"
+
+async def stream_records(items: AsyncIterator[Any], request: Request, fmt: str) -> AsyncIterator[bytes]:
+    count = 0
+    try:
+        async for item in items:
+            # Stop pulling upstream pages as soon as the client goes away
+            if await request.is_disconnected():
+                return
+            count += 1
+            yield encode_record(item, fmt)
+    except Exception as e:
+        yield encode_record({"error": str(e)}, fmt, event="error")
+        return
+    finally:
+        await items.aclose()
+
+    if fmt == "sse":
+        yield encode_record({"count": count}, fmt, event="end")
+
+def stream_response(items: AsyncIterator[Any], request: Request, fmt: str = "ndjson") -> StreamingResponse:
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(stream_records(items, request, fmt), media_type=MEDIA_TYPES[fmt], headers=headers)
@@ -1,41 +1,77 @@
+import asyncio
+import os
 import re
-import httpx
+import time
 import json
+from typing import Optional
+from .client import YOUTUBE_BASE_URL, get_client
 
-async def get_youtube_api_key() -> str:
-    async with httpx.AsyncClient() as client:
-        resp = await client.get("https://www.youtube.com")
+API_KEY_TTL = int(os.getenv("INNERTUBE_API_KEY_TTL", "21600"))
+API_KEY_MIN_AGE = int(os.getenv("INNERTUBE_API_KEY_MIN_AGE", "60"))
+
+class ApiKeyManager:
+    """Process-wide INNERTUBE_API_KEY cache with single-flight refresh"""
+
+    def __init__(self, ttl: int = API_KEY_TTL, min_age: int = API_KEY_MIN_AGE):
+        self.ttl = ttl
+        self.min_age = min_age
+        self._key: Optional[str] = None
+        self._fetched_at = 0.0
+        self._refresh: Optional[asyncio.Future] = None
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self._fetched_at
+
+    def invalidate(self, stale_key: Optional[str] = None) -> bool:
+        # A key fetched moments ago is not stale, the 400/403 means something else
+        if stale_key is not None and stale_key != self._key:
+            return True
+        if self._key and self.age < self.min_age:
+            return False
+        self._key = None
+        return True
+
+    async def get(self, force_refresh: bool = False) -> str:
+        if not force_refresh and self._key and self.age < self.ttl:
+            return self._key
+
+        if self._refresh is None:
+            self._refresh = asyncio.ensure_future(self._fetch())
+            self._refresh.add_done_callback(self._refresh_done)
+
+        # Shielded so a cancelled caller does not abort the refresh others wait on
+        return await asyncio.shield(self._refresh)
+
+    def _refresh_done(self, future: asyncio.Future):
+        self._refresh = None
+        if not future.cancelled() and future.exception() is None:
+            self._key = future.result()
+            self._fetched_at = time.monotonic()
+
+    async def _fetch(self) -> str:
+        resp = await get_client().get(YOUTUBE_BASE_URL)
         html = resp.text
         match = re.search(r'"INNERTUBE_API_KEY":"([^"]+)"', html)
         if not match:
             raise Exception("INNERTUBE_API_KEY not found")
         return match.group(1)
+
+api_key_manager = ApiKeyManager()
+
+async def get_youtube_api_key(force_refresh: bool = False) -> str:
+    return await api_key_manager.get(force_refresh=force_refresh)
     
-def get_context():
+def get_context(hl: str = "en", gl: str = "US"):
     return {
         "client": {
-            "hl": "en",
-            "gl": "US",
+            "hl": hl,
+            "gl": gl,
             "clientName": "WEB",
             "clientVersion": "2.20240115.00.00"
         }
     }
 
-async def resolve_channel_id_from_handle(handle: str) -> str:
-    async with httpx.AsyncClient() as client:
-        url = f"https://www.youtube.com/@{handle}"
-        resp = await client.get(url)
-        html = resp.text
-        match = re.search(r'channel_id=([a-zA-Z0-9_-]{24})', html)
-        if match:
-            return match.group(1)
-
-        match = re.search(r'"browseId":"(UC[^\"]+)"', html)
-        if match:
-            return match.group(1)
-
-        raise Exception("Channel_id not found")
-
 def save_to_json(data, filename="debug.json"):
     with open(filename, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
\ No newline at end of file
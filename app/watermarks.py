@@ -0,0 +1,51 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+from .fastjson import dumps, loads
+
+WATERMARKS_SQLITE_PATH = os.getenv("WATERMARKS_SQLITE_PATH", "watermarks.sqlite3")
+
+class WatermarkStore:
+    """Newest known IDs per polled channel or video in SQLite; never evicted, survives restarts"""
+
+    def __init__(self, path: str = WATERMARKS_SQLITE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # Opened on first use so importing the app does not create the database
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS watermarks "
+                "(kind TEXT NOT NULL, key TEXT NOT NULL, ids BLOB NOT NULL, updated_at REAL NOT NULL, PRIMARY KEY (kind, key))"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _get(self, kind: str, key: str) -> List[str]:
+        with self._lock:
+            row = self.conn.execute("SELECT ids FROM watermarks WHERE kind = ? AND key = ?", (kind, key)).fetchone()
+        return loads(row[0]) if row else []
+
+    def _set(self, kind: str, key: str, ids: List[str]):
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO watermarks (kind, key, ids, updated_at) VALUES (?, ?, ?, ?)",
+                (kind, key, dumps(ids), time.time()),
+            )
+
+    async def get(self, kind: str, key: str) -> List[str]:
+        return await asyncio.to_thread(self._get, kind, key)
+
+    async def set(self, kind: str, key: str, ids: List[str]):
+        await asyncio.to_thread(self._set, kind, key, ids)
+
+watermark_store = WatermarkStore()
@@ -0,0 +1,193 @@
+"""End-to-end throughput and latency for the API routes, against the mock InnerTube server.
+
+Both the API and the mock run in this process over httpx.ASGITransport, so no socket is opened:
+
+    python -m benchmarks.e2e --requests 200 --concurrency 20 --latency 0.05
+    python -m benchmarks.e2e --route search --route comments --error-rate 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+import httpx
+from .mock_server import add_mock_arguments, create_mock_app, mock_config
+
+# The token buckets and retry backoff are tuned for youtube.com, not for a local mock
+os.environ.setdefault("RATE_LIMIT_SEARCH", "0")
+os.environ.setdefault("RATE_LIMIT_BROWSE", "0")
+os.environ.setdefault("RATE_LIMIT_NEXT", "0")
+os.environ.setdefault("RATE_LIMIT_PLAYER", "0")
+os.environ.setdefault("RATE_LIMIT_OTHER", "0")
+os.environ.setdefault("RETRY_BASE_DELAY", "0.01")
+os.environ.setdefault("RETRY_MAX_DELAY", "0.1")
+os.environ.setdefault("LIVE_CHAT_MIN_INTERVAL", "0.01")
+# Jobs, watermarks and handle mappings start empty on every run
+STATE_DIR = tempfile.mkdtemp(prefix="e2e-")
+os.environ.setdefault("JOBS_SQLITE_PATH", os.path.join(STATE_DIR, "jobs.sqlite3"))
+os.environ.setdefault("WATERMARKS_SQLITE_PATH", os.path.join(STATE_DIR, "watermarks.sqlite3"))
+os.environ.setdefault("HANDLES_SQLITE_PATH", os.path.join(STATE_DIR, "handles.sqlite3"))
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    # request number -> path, or (path, json body) for POSTs
+    build: Callable[[int], object]
+    # POST /api/jobs: the request lasts until the job has finished
+    wait_job: bool = False
+
+def scenarios(key_space: int) -> List[Scenario]:
+    def key(i: int) -> int:
+        return i % key_space
+
+    return [
+        Scenario("proxies", "GET", lambda i: "/api/proxies"),
+        Scenario("search", "GET", lambda i: f"/api/search?q=bench{key(i)}&limit=30"),
+        Scenario("search_page3", "GET", lambda i: f"/api/search?q=bench{key(i)}&limit=30&page=3"),
+        Scenario("video_detail", "GET", lambda i: f"/api/video/vid{key(i):08d}"),
+        Scenario("videos_detail", "POST", lambda i: ("/api/videos/detail", {"video_ids": [f"vid{key(i)}-{n}" for n in range(50)]})),
+        Scenario("videos_detail_stream", "POST", lambda i: ("/api/videos/detail", {"video_ids": [f"svid{key(i)}-{n}" for n in range(50)], "stream": True})),
+        Scenario("channel_videos", "GET", lambda i: f"/api/channel/videos?channel_input=UCbench{key(i):016d}&limit=30"),
+        Scenario("channel_videos_handle", "GET", lambda i: f"/api/channel/videos?channel_input=@bench{key(i)}&limit=30"),
+        Scenario("channel_videos_new", "GET", lambda i: f"/api/channel/videos/new?channel_input=UCbench{key(i):016d}&limit=50"),
+        Scenario("channel_videos_poll", "POST", lambda i: ("/api/channel/videos/new", {"channels": [f"UCpoll{key(i)}-{n}" for n in range(10)]})),
+        Scenario("channel_videos_stream", "GET", lambda i: f"/api/channel/videos/stream?channel_input=UCbench{key(i):016d}&limit=80"),
+        Scenario("channel_resolve", "POST", lambda i: ("/api/channel/resolve", {"handles": [f"@bench{key(i)}-{n}" for n in range(20)]})),
+        Scenario("channel_info", "GET", lambda i: f"/api/channel/UCbench{key(i):016d}"),
+        Scenario("channel_playlists", "GET", lambda i: f"/api/channel/UCbench{key(i):016d}/playlist"),
+        Scenario("channel_playlists_expand", "GET", lambda i: f"/api/channel/UCbench{key(i):016d}/playlist/videos/stream?per_playlist_limit=50"),
+        Scenario("playlist_videos", "GET", lambda i: f"/api/playlist/PLbench{key(i)}/videos"),
+        Scenario("playlist_videos_stream", "GET", lambda i: f"/api/playlist/PLbench{key(i)}/videos/stream?format=sse"),
+        Scenario("comments", "GET", lambda i: f"/api/video/vid{key(i):08d}/comments?limit=20&reply_depth=first"),
+        Scenario("comments_stream", "GET", lambda i: f"/api/video/vid{key(i):08d}/comments/stream?limit=40&reply_depth=all"),
+        Scenario("comments_new", "GET", lambda i: f"/api/video/vid{key(i):08d}/comments/new?limit=100"),
+        Scenario("live", "GET", lambda i: f"/api/videos/live?q=bench{key(i)}&limit=30"),
+        # mock chats end after --pages polls
+        Scenario("live_chat_stream", "GET", lambda i: f"/api/video/live{key(i):08d}/live_chat/stream?format=sse"),
+        Scenario("trending", "GET", lambda i: f"/api/videos/trending?limit=30&page={key(i) % 3 + 1}"),
+        Scenario("location", "GET", lambda i: f"/api/location/videos?lat={10 + key(i) % 50}&lng=106&radius_km=40&step_km=10&max_points=20"),
+        Scenario("job_channel", "POST", lambda i: ("/api/jobs", {"kind": "channel", "target": f"UCjob{key(i):016d}", "limit": 60}),
+                 wait_job=True),
+    ]
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, requests: int, concurrency: int) -> Dict:
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    received = 0
+    counter = iter(range(requests))
+
+    async def send(i: int):
+        nonlocal received
+        target = scenario.build(i)
+        path, body = target if isinstance(target, tuple) else (target, None)
+        start = time.perf_counter()
+        try:
+            chunks = []
+            async with client.stream(scenario.method, path, json=body) as response:
+                async for chunk in response.aiter_raw():
+                    received += len(chunk)
+                    chunks.append(chunk)
+                status = response.status_code
+            if scenario.wait_job and status < 400:
+                status = await wait_job(client, json.loads(b"".join(chunks))["job_id"])
+        except Exception:
+            status = 0
+        latencies.append(time.perf_counter() - start)
+        statuses[status] = statuses.get(status, 0) + 1
+
+    async def worker():
+        for i in counter:
+            await send(i)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "route": scenario.name,
+        "requests": requests,
+        "rps": requests / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p90_ms": percentile(latencies, 0.90) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "errors": sum(count for status, count in statuses.items() if status >= 400 or status == 0),
+        "kib_per_request": received / requests / 1024 if requests else 0.0,
+        "statuses": statuses,
+    }
+
+async def wait_job(client: httpx.AsyncClient, job_id: str) -> int:
+    """Polls the job until it leaves the queue; 500 if it failed or was cancelled"""
+    while True:
+        response = await client.get(f"/api/jobs/{job_id}")
+        if response.status_code >= 400:
+            return response.status_code
+        status = response.json()["status"]
+        if status == "done":
+            return response.status_code
+        if status not in ("queued", "running"):
+            return 500
+        await asyncio.sleep(0.01)
+
+async def run(args: argparse.Namespace) -> List[Dict]:
+    # imported here so the environment above is read by the app's module-level config
+    from app.client import close_client_pool, init_client_pool
+    from app.jobs import job_queue
+    from app.main import app
+
+    mock = create_mock_app(mock_config(args))
+    init_client_pool(transport=httpx.ASGITransport(app=mock))
+
+    selected = [scenario for scenario in scenarios(args.key_space or args.requests)
+                if not args.route or scenario.name in args.route]
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    # ASGITransport does not run the lifespan that starts the job workers
+    job_queue.start()
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for scenario in selected:
+                before = sum(mock.state.stats.requests.values())
+                result = await run_scenario(client, scenario, args.requests, args.concurrency)
+                result["upstream_per_request"] = (sum(mock.state.stats.requests.values()) - before) / args.requests
+                results.append(result)
+                if not args.json:
+                    print_result(result)
+    finally:
+        await job_queue.stop()
+        await close_client_pool()
+    return results
+
+def print_result(result: Dict):
+    print(f"{result['route']:24} {result['rps']:9.1f} {result['p50_ms']:9.1f} {result['p90_ms']:9.1f} "
+          f"{result['p99_ms']:9.1f} {result['upstream_per_request']:9.1f} {result['kib_per_request']:9.1f} {result['errors']:7d}")
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmarks for the API routes")
+    parser.add_argument("--route", action="append", help="run only these scenarios (repeatable)")
+    parser.add_argument("--requests", type=int, default=50, help="requests per route")
+    parser.add_argument("--concurrency", type=int, default=10, help="requests in flight per route")
+    parser.add_argument("--key-space", type=int, help="distinct IDs cycled through; small values exercise the caches")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    add_mock_arguments(parser)
+    # Follow the mock live chats at benchmark speed rather than real chat pace
+    parser.set_defaults(chat_timeout_ms=20)
+    args = parser.parse_args(argv)
+
+    if not args.json:
+        print(f"{'route':24} {'req/s':>9} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'upstream':>9} {'KiB/req':>9} {'errors':>7}")
+    results = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
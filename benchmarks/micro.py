@@ -0,0 +1,114 @@
+"""Microbenchmarks for the extract_*/parse_* functions on synthetic pages.
+
+    python -m benchmarks.micro --items 200 --filter comment
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+from app.fastjson import dumps, loads
+from app.innertube import continuation_items, find_continuation_token, search_result_sections
+from app.services import channel, channel_info, comment, live, location, playlist, search, trending
+from . import synthetic
+
+def cases(items: int) -> List[Tuple[str, Callable[[], object], int]]:
+    """(name, call, items handled per call) for every parser"""
+    seed = "micro"
+    search_doc = synthetic.search_page(seed, 0, items, synthetic.token("search", seed, 1))
+    search_items = search_result_sections(search_doc)[0]["itemSectionRenderer"]["contents"]
+    grid_items = synthetic.rich_grid_items(seed, 0, items, synthetic.token("channel", seed, 1))
+    trending_doc = synthetic.trending_page(seed, items, None)
+    shelf = trending_doc["contents"]["twoColumnBrowseResultsRenderer"]["tabs"][0]["tabRenderer"]["content"] \
+        ["sectionListRenderer"]["contents"][0]["itemSectionRenderer"]["contents"][0]
+    comments_doc = synthetic.comments_page(seed, 1, items, 5, synthetic.token("comments", seed, 2))
+    watch_doc = synthetic.watch_page("micro")
+    channel_doc = synthetic.channel_page(synthetic.channel_id(seed), items, items, None, with_content=True)
+    channel_browse = synthetic.channel_page(synthetic.channel_id(seed), items, items, None, with_content=False)
+    playlist_doc = synthetic.playlist_page(seed, 1, items, synthetic.token("playlist", seed, 2))
+    lockups = [synthetic.lockup(seed, i)["lockupViewModel"] for i in range(items)]
+    playlist_videos = [entry["playlistVideoRenderer"] for entry in continuation_items(playlist_doc)[:-1]]
+    raw_search = dumps(search_doc)
+
+    return [
+        ("search.extract_video_items", lambda: search.extract_video_items(search_items), items),
+        ("channel.extract_video_items", lambda: channel.extract_video_items(grid_items), items),
+        ("trending.extract_videos_from_item", lambda: trending.extract_videos_from_item(shelf), items),
+        ("live.extract_live_videos", lambda: live.extract_live_videos(search_items), items),
+        ("location.extract_videos_from_search", lambda: location.extract_videos_from_search(search_items), items),
+        ("comment.parse_comment_entities", lambda: comment.parse_comment_entities(comments_doc), items),
+        ("comment.extract_comment_continuation_token", lambda: comment.extract_comment_continuation_token(watch_doc), 1),
+        ("channel_info.parse_channel_info", lambda: channel_info.parse_channel_info(channel_browse), 1),
+        ("playlist.extract_playlists_tab_info", lambda: playlist.extract_playlists_tab_info(channel_doc), 1),
+        ("playlist.extract_playlist", lambda: [playlist.extract_playlist(entry) for entry in lockups], items),
+        ("playlist.extract_playlist_video", lambda: [playlist.extract_playlist_video(entry) for entry in playlist_videos], items),
+        ("innertube.continuation_items", lambda: continuation_items(comments_doc), items),
+        ("innertube.find_continuation_token", lambda: find_continuation_token(grid_items), items),
+        ("fastjson.loads search page", lambda: loads(raw_search), items),
+        ("json.loads search page", lambda: json.loads(raw_search), items),
+    ]
+
+def measure(call: Callable[[], object], min_time: float, repeat: int) -> float:
+    """Best seconds per call over `repeat` rounds of at least min_time each"""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            call()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number *= 2
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            call()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+def allocated(call: Callable[[], object]) -> int:
+    """Peak bytes allocated by one call"""
+    tracemalloc.start()
+    try:
+        call()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def run(items: int, min_time: float, repeat: int, name_filter: str, memory: bool) -> List[Dict]:
+    results = []
+    for name, call, handled in cases(items):
+        if name_filter and name_filter not in name:
+            continue
+        call()  # warm up compiled extractors and caches
+        seconds = measure(call, min_time, repeat)
+        result = {"name": name, "us_per_call": seconds * 1e6, "us_per_item": seconds * 1e6 / handled}
+        if memory:
+            result["peak_kib"] = allocated(call) / 1024
+        results.append(result)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks for the InnerTube parsers")
+    parser.add_argument("--items", type=int, default=100, help="items on each synthetic page")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per timing round")
+    parser.add_argument("--repeat", type=int, default=5, help="timing rounds, the best is reported")
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this")
+    parser.add_argument("--memory", action="store_true", help="also report peak allocation per call")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.items, args.min_time, args.repeat, args.filter, args.memory)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'case':45} {'us/call':>12} {'us/item':>10}" + (f" {'peak KiB':>10}" if args.memory else ""))
+    for result in results:
+        line = f"{result['name']:45} {result['us_per_call']:12.2f} {result['us_per_item']:10.3f}"
+        if args.memory:
+            line += f" {result['peak_kib']:10.1f}"
+        print(line)
+
+if __name__ == "__main__":
+    main()
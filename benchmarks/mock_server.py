@@ -0,0 +1,207 @@
+"""Local stand-in for youtube.com: recorded fixtures first, synthetic pages otherwise.
+
+In process, wrap it in httpx.ASGITransport and hand that to init_client_pool(transport=...).
+As a real server for a separately started API:
+
+    python -m benchmarks.mock_server --port 8765 --latency 0.05 --error-rate 0.02
+    YOUTUBE_BASE_URL=http://127.0.0.1:8765 uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import random
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional, Tuple
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, Response
+from app.fastjson import dumps, loads
+from . import synthetic
+from .recording import FIXTURES_DIR, fixture_response, load_fixture, request_key
+
+@dataclass
+class MockConfig:
+    latency: float = 0.02
+    jitter: float = 0.01
+    # pages in every continuation chain, and items on each page
+    pages: int = 5
+    items: int = 20
+    replies: int = 5
+    playlists: int = 12
+    # polling interval the mock live chat asks for; its chats end after `pages` polls
+    chat_timeout_ms: int = 1000
+    error_rate: float = 0.0
+    error_statuses: Tuple[int, ...] = (429, 503)
+    retry_after: Optional[float] = None
+    fixtures_dir: Optional[Path] = None
+    seed: Optional[int] = None
+
+@dataclass
+class MockStats:
+    requests: Counter = field(default_factory=Counter)
+    errors: Counter = field(default_factory=Counter)
+    replayed: int = 0
+
+    def as_dict(self):
+        return {"requests": dict(self.requests), "errors": dict(self.errors), "replayed": self.replayed}
+
+def next_token(config: MockConfig, kind: str, seed: str, page: int) -> Optional[str]:
+    return synthetic.token(kind, seed, page + 1) if page + 1 < config.pages else None
+
+def synthetic_response(config: MockConfig, endpoint: str, body: dict) -> Tuple[int, dict]:
+    continuation = body.get("continuation")
+    if continuation:
+        state = synthetic.parse_token(continuation)
+        if state is None:
+            return 400, {"error": {"code": 400, "message": "Request contains an invalid argument."}}
+        kind, seed, page = state["kind"], state["seed"], state["page"]
+        following = next_token(config, kind, seed, page)
+        if kind == "search":
+            return 200, synthetic.search_page(seed, page, config.items, following)
+        if kind == "channel":
+            return 200, synthetic.browse_continuation(synthetic.rich_grid_items(seed, page, config.items, following))
+        if kind == "trending":
+            return 200, synthetic.browse_continuation([{"richItemRenderer": {"content": {"videoRenderer": video}}}
+                                                       for video in synthetic.video_page_items(seed, page, config.items)]
+                                                      + ([synthetic.continuation_item(following)] if following else []))
+        if kind == "playlist":
+            return 200, synthetic.playlist_page(seed, page, config.items, following)
+        if kind in ("comments", "comments-newest"):
+            sort_tokens = {"top": synthetic.token("comments", seed, 0),
+                           "newest": synthetic.token("comments-newest", seed, 0)} if page == 0 else None
+            page_seed = seed if kind == "comments" else f"{seed}|newest"
+            return 200, synthetic.comments_page(page_seed, page, config.items, config.replies, following, sort_tokens)
+        if kind in ("chat", "chat-top"):
+            return 200, synthetic.live_chat_page(f"{seed}|{kind}", page, config.items, following, config.chat_timeout_ms)
+        if kind == "replies":
+            # reply threads are short: two pages at most
+            following = synthetic.token(kind, seed, page + 1) if page == 0 else None
+            return 200, synthetic.replies_page(seed, page, config.replies, following)
+        return 400, {"error": {"code": 400, "message": f"Unknown continuation kind {kind}"}}
+
+    if endpoint == "search":
+        seed = f"{body.get('query', '')}|{body.get('params', '')}|{body.get('location', '')}"
+        return 200, synthetic.search_page(seed, 0, config.items, next_token(config, "search", seed, 0))
+    if endpoint == "browse":
+        browse_id = body.get("browseId", "")
+        if browse_id == "FEtrending":
+            seed = f"trending|{body.get('params', '')}"
+            return 200, synthetic.trending_page(seed, config.items, next_token(config, "trending", seed, 0))
+        if browse_id.startswith("VL"):
+            seed = browse_id[2:]
+            return 200, synthetic.playlist_page(seed, 0, config.items, next_token(config, "playlist", seed, 0))
+        if browse_id.startswith("UC"):
+            with_content = body.get("params") == "videos-tab"
+            return 200, synthetic.channel_page(browse_id, config.items, config.playlists,
+                                               next_token(config, "channel", browse_id, 0), with_content)
+        return 404, {"error": {"code": 404, "message": "Requested entity was not found."}}
+    if endpoint == "next":
+        return 200, synthetic.watch_page(body.get("videoId", ""))
+    if endpoint == "player":
+        return 200, synthetic.player(body.get("videoId", ""))
+    if endpoint == "navigation/resolve_url":
+        data = synthetic.resolve_url(body.get("url", ""))
+        return (200, data) if data else (404, {"error": {"code": 404, "message": "Requested entity was not found."}})
+    return 404, {"error": {"code": 404, "message": f"Unknown endpoint {endpoint}"}}
+
+def create_mock_app(config: Optional[MockConfig] = None) -> FastAPI:
+    config = config or MockConfig()
+    rng = random.Random(config.seed)
+    stats = MockStats()
+    app = FastAPI(title="Mock InnerTube")
+    app.state.config = config
+    app.state.stats = stats
+
+    async def delay():
+        wait = config.latency + rng.uniform(0, config.jitter) if config.jitter else config.latency
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def injected_error() -> Optional[Response]:
+        if config.error_rate and rng.random() < config.error_rate:
+            status = rng.choice(config.error_statuses)
+            stats.errors[status] += 1
+            headers = {"Retry-After": str(config.retry_after)} if config.retry_after is not None and status == 429 else {}
+            return Response(dumps({"error": {"code": status, "message": "Injected by the mock server"}}),
+                            status_code=status, headers=headers, media_type="application/json")
+        return None
+
+    def replay(request: Request, body: bytes) -> Optional[Response]:
+        if config.fixtures_dir is None:
+            return None
+        fixture = load_fixture(config.fixtures_dir, request_key(request.method, request.url.path, body))
+        if fixture is None:
+            return None
+        stats.replayed += 1
+        recorded = fixture_response(fixture)
+        return Response(recorded.content, status_code=recorded.status_code, media_type=recorded.headers["Content-Type"])
+
+    @app.get("/stats")
+    async def mock_stats():
+        return stats.as_dict()
+
+    @app.post("/youtubei/v1/{endpoint:path}")
+    async def innertube(endpoint: str, request: Request):
+        stats.requests[endpoint] += 1
+        body = await request.body()
+        await delay()
+        error = injected_error()
+        if error is not None:
+            return error
+        recorded = replay(request, body)
+        if recorded is not None:
+            return recorded
+        status, data = synthetic_response(config, endpoint, loads(body or b"{}"))
+        return Response(dumps(data), status_code=status, media_type="application/json")
+
+    @app.get("/")
+    async def homepage(request: Request):
+        stats.requests["homepage"] += 1
+        return replay(request, b"") or HTMLResponse(synthetic.homepage())
+
+    @app.get("/@{handle}")
+    async def handle_page(handle: str, request: Request):
+        stats.requests["handle"] += 1
+        await delay()
+        recorded = replay(request, b"")
+        if recorded is not None:
+            return recorded
+        if handle.startswith("missing"):
+            return HTMLResponse("<html></html>", status_code=404)
+        return HTMLResponse(synthetic.handle_page(handle))
+
+    return app
+
+def add_mock_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", type=float, default=MockConfig.latency, help="seconds added to every upstream response")
+    parser.add_argument("--jitter", type=float, default=MockConfig.jitter, help="extra uniform random latency, seconds")
+    parser.add_argument("--pages", type=int, default=MockConfig.pages, help="pages in each continuation chain")
+    parser.add_argument("--items", type=int, default=MockConfig.items, help="items per page")
+    parser.add_argument("--replies", type=int, default=MockConfig.replies, help="replies per reply page")
+    parser.add_argument("--chat-timeout-ms", type=int, default=MockConfig.chat_timeout_ms, help="live chat polling interval asked for")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of InnerTube calls answered with an error")
+    parser.add_argument("--error-status", type=int, action="append", help="status codes to inject (default 429 and 503)")
+    parser.add_argument("--retry-after", type=float, help="Retry-After seconds sent with injected 429s")
+    parser.add_argument("--fixtures", type=Path, help=f"serve recorded fixtures from this directory first (e.g. {FIXTURES_DIR})")
+    parser.add_argument("--seed", type=int, help="seed for latency jitter and error injection")
+
+def mock_config(args: argparse.Namespace) -> MockConfig:
+    return MockConfig(
+        latency=args.latency, jitter=args.jitter, pages=args.pages, items=args.items, replies=args.replies,
+        chat_timeout_ms=args.chat_timeout_ms,
+        error_rate=args.error_rate, error_statuses=tuple(args.error_status or MockConfig.error_statuses),
+        retry_after=args.retry_after, fixtures_dir=args.fixtures, seed=args.seed,
+    )
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve a mock InnerTube API for offline benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_mock_app(mock_config(args)), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Record real InnerTube responses once, replay them offline.
+
+    python -m benchmarks.recording --query "lofi hip hop" --channel UCxxxx --video dQw4w9WgXcQ --playlist PLxxxx
+
+writes one fixture per upstream request under benchmarks/fixtures/recorded/. RecordReplayTransport in
+replay mode (or the mock server) then answers the same requests from disk without touching the network.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import re
+from pathlib import Path
+from typing import Dict, Optional
+import httpx
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures" / "recorded"
+
+# Request fields that vary between runs without changing the answer
+VOLATILE_FIELDS = ("context",)
+
+def request_key(method: str, path: str, body: bytes) -> str:
+    """Stable fixture name for an upstream request: endpoint plus a digest of the payload"""
+    payload = b""
+    if body:
+        try:
+            data = json.loads(body)
+        except ValueError:
+            payload = body
+        else:
+            if isinstance(data, dict):
+                data = {key: value for key, value in data.items() if key not in VOLATILE_FIELDS}
+            payload = json.dumps(data, sort_keys=True, separators=(",", ":")).encode()
+    digest = hashlib.sha1(method.encode() + b" " + path.encode() + b"\n" + payload).hexdigest()[:16]
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", path.replace("/youtubei/v1/", "")).strip("-") or "root"
+    return f"{slug[:40]}-{digest}"
+
+def load_fixture(fixtures_dir: Path, key: str) -> Optional[Dict]:
+    path = fixtures_dir / f"{key}.json"
+    if not path.exists():
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_fixture(fixtures_dir: Path, key: str, fixture: Dict):
+    fixtures_dir.mkdir(parents=True, exist_ok=True)
+    with open(fixtures_dir / f"{key}.json", "w", encoding="utf-8") as f:
+        json.dump(fixture, f, ensure_ascii=False)
+
+def fixture_response(fixture: Dict) -> httpx.Response:
+    response = fixture["response"]
+    if "json" in response:
+        content = json.dumps(response["json"], ensure_ascii=False).encode()
+    else:
+        content = response.get("text", "").encode()
+    return httpx.Response(response["status"], headers={"Content-Type": response["content_type"]}, content=content)
+
+class RecordReplayTransport(httpx.AsyncBaseTransport):
+    """httpx transport that saves every response in record mode and serves them back in replay mode"""
+
+    def __init__(self, fixtures_dir: Path = FIXTURES_DIR, mode: str = "replay", inner: Optional[httpx.AsyncBaseTransport] = None):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown mode {mode!r}")
+        self.fixtures_dir = Path(fixtures_dir)
+        self.mode = mode
+        self.inner = inner or (httpx.AsyncHTTPTransport() if mode == "record" else None)
+        self.recorded = 0
+        self.replayed = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = await request.aread()
+        key = request_key(request.method, request.url.path, body)
+
+        if self.mode == "replay":
+            fixture = load_fixture(self.fixtures_dir, key)
+            if fixture is None:
+                raise httpx.ConnectError(f"No recorded fixture {key} for {request.method} {request.url.path}", request=request)
+            self.replayed += 1
+            return fixture_response(fixture)
+
+        response = await self.inner.handle_async_request(request)
+        content = await response.aread()
+        content_type = response.headers.get("Content-Type", "")
+        recorded = {"status": response.status_code, "content_type": content_type}
+        if "json" in content_type:
+            recorded["json"] = json.loads(content)
+        else:
+            recorded["text"] = content.decode(response.encoding or "utf-8", errors="replace")
+
+        save_fixture(self.fixtures_dir, key, {
+            "request": {"method": request.method, "path": request.url.path, "body": body.decode("utf-8", errors="replace")},
+            "response": recorded,
+        })
+        self.recorded += 1
+        return httpx.Response(response.status_code, headers={"Content-Type": content_type}, content=content)
+
+    async def aclose(self):
+        if self.inner is not None:
+            await self.inner.aclose()
+
+async def record(args: argparse.Namespace):
+    from app.client import close_client_pool, init_client_pool
+    from app.services.channel import get_channel_videos
+    from app.services.channel_info import get_channel_info
+    from app.services.comment import get_video_comments
+    from app.services.detail import get_video_detail
+    from app.services.live import get_all_live_videos
+    from app.services.playlist import get_playlist_videos, get_videos_from_playlist
+    from app.services.search import search_youtube
+    from app.services.trending import get_trending_videos
+
+    transport = RecordReplayTransport(args.out, mode="record")
+    init_client_pool(transport=transport)
+
+    jobs = [("trending", get_trending_videos(max_results=args.limit))]
+    for query in args.query:
+        jobs.append((f"search {query}", search_youtube(query, max_results=args.limit)))
+        jobs.append((f"live {query}", get_all_live_videos(query, max_results=args.limit)))
+    for channel_id in args.channel:
+        jobs.append((f"channel {channel_id}", get_channel_videos(channel_id, max_results=args.limit)))
+        jobs.append((f"channel info {channel_id}", get_channel_info(channel_id)))
+        jobs.append((f"channel playlists {channel_id}", get_playlist_videos(channel_id)))
+    for video_id in args.video:
+        jobs.append((f"video {video_id}", get_video_detail(video_id)))
+        jobs.append((f"comments {video_id}", get_video_comments(video_id, max_comments=args.limit, reply_depth="first")))
+    for playlist_id in args.playlist:
+        jobs.append((f"playlist {playlist_id}", get_videos_from_playlist(playlist_id, max_results=args.limit)))
+
+    try:
+        # one at a time so continuation chains are recorded in order
+        for name, job in jobs:
+            try:
+                await job
+                print(f"recorded {name}")
+            except Exception as e:
+                print(f"failed {name}: {e}")
+    finally:
+        await close_client_pool()
+    print(f"{transport.recorded} fixtures written to {args.out}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Record InnerTube responses into benchmark fixtures")
+    parser.add_argument("--query", action="append", default=[], help="search and live query to record")
+    parser.add_argument("--channel", action="append", default=[], help="channel ID (UC...) to record")
+    parser.add_argument("--video", action="append", default=[], help="video ID to record detail and comments for")
+    parser.add_argument("--playlist", action="append", default=[], help="playlist ID to record")
+    parser.add_argument("--limit", type=int, default=60, help="items to crawl per target")
+    parser.add_argument("--out", type=Path, default=FIXTURES_DIR)
+    asyncio.run(record(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""InnerTube-shaped documents built in memory, matching what the services parse"""
+import hashlib
+from typing import Dict, List, Optional
+
+API_KEY = "bench-innertube-key"
+
+def token(kind: str, seed: str, page: int) -> str:
+    return f"mock:{kind}:{seed}:{page}"
+
+def parse_token(value: str) -> Optional[Dict]:
+    parts = value.split(":", 2)
+    if len(parts) != 3 or parts[0] != "mock" or ":" not in parts[2]:
+        return None
+    seed, page = parts[2].rsplit(":", 1)
+    return {"kind": parts[1], "seed": seed, "page": int(page)}
+
+def stable_id(prefix: str, *parts, length: int = 11) -> str:
+    digest = hashlib.sha1(":".join(str(part) for part in parts).encode()).hexdigest()
+    return prefix + digest[:length - len(prefix)]
+
+def channel_id(seed: str) -> str:
+    return stable_id("UC", "channel", seed, length=24)
+
+def continuation_item(value: str) -> Dict:
+    return {"continuationItemRenderer": {"continuationEndpoint": {"continuationCommand": {"token": value}}}}
+
+def reply_continuation_item(value: str) -> Dict:
+    return {"continuationItemRenderer": {"button": {"buttonRenderer": {"command": {"continuationCommand": {"token": value}}}}}}
+
+def runs(text: str, **extra) -> Dict:
+    return {"runs": [dict({"text": text}, **extra)]}
+
+def thumbnails(url: str) -> Dict:
+    return {"thumbnails": [{"url": f"{url}/default.jpg", "width": 120, "height": 90},
+                           {"url": f"{url}/hqdefault.jpg", "width": 480, "height": 360}]}
+
+def video_renderer(seed: str, index: int) -> Dict:
+    video_id = stable_id("", "video", seed, index)
+    owner = channel_id(f"{seed}-{index % 7}")
+    return {
+        "videoId": video_id,
+        "thumbnail": thumbnails(f"https://i.ytimg.com/vi/{video_id}"),
+        "title": runs(f"Synthetic video {index} for {seed}"),
+        "descriptionSnippet": runs("A synthetic description used by the offline benchmarks."),
+        "detailedMetadataSnippets": [{"snippetText": runs("A synthetic description snippet.")}],
+        "longBylineText": runs(f"Channel {index % 7}"),
+        "ownerText": runs(f"Channel {index % 7}", navigationEndpoint={"browseEndpoint": {"browseId": owner}}),
+        "shortBylineText": runs(f"Channel {index % 7}", navigationEndpoint={"browseEndpoint": {"browseId": owner}}),
+        "publishedTimeText": {"simpleText": f"{index % 30 + 1} days ago"},
+        "lengthText": {"simpleText": f"{index % 60}:{index % 60:02d}"},
+        "viewCountText": {"simpleText": f"{index * 1317:,} views"},
+        "shortViewCountText": {"simpleText": f"{index * 13}K views"},
+        "badges": [{"metadataBadgeRenderer": {"style": "BADGE_STYLE_TYPE_SIMPLE", "label": "New"}}],
+        "ownerBadges": [{"metadataBadgeRenderer": {"icon": {"iconType": "CHECK_CIRCLE_THICK"}}}],
+        "navigationEndpoint": {"watchEndpoint": {"videoId": video_id}},
+        "trackingParams": "CAEQ" + "A" * 40,
+    }
+
+def video_page_items(seed: str, page: int, items: int) -> List[Dict]:
+    return [video_renderer(seed, page * items + i) for i in range(items)]
+
+def search_page(seed: str, page: int, items: int, next_token: Optional[str]) -> Dict:
+    sections = [{"itemSectionRenderer": {"contents": [{"videoRenderer": video} for video in video_page_items(seed, page, items)]}}]
+    if next_token:
+        sections.append(continuation_item(next_token))
+    if page == 0:
+        return {"contents": {"twoColumnSearchResultsRenderer": {"primaryContents": {"sectionListRenderer": {"contents": sections}}}}}
+    return {"onResponseReceivedCommands": [{"appendContinuationItemsAction": {"continuationItems": sections}}]}
+
+def rich_grid_items(seed: str, page: int, items: int, next_token: Optional[str]) -> List[Dict]:
+    contents = [{"richItemRenderer": {"content": {"videoRenderer": video}}} for video in video_page_items(seed, page, items)]
+    if next_token:
+        contents.append(continuation_item(next_token))
+    return contents
+
+def browse_continuation(items: List[Dict]) -> Dict:
+    return {"onResponseReceivedActions": [{"appendContinuationItemsAction": {"continuationItems": items}}]}
+
+def lockup(seed: str, index: int) -> Dict:
+    playlist_id = stable_id("PL", "playlist", seed, index, length=34)
+    return {"lockupViewModel": {
+        "contentImage": {"collectionThumbnailViewModel": {"primaryThumbnail": {"thumbnailViewModel": {
+            "image": {"sources": [{"url": f"https://i.ytimg.com/vi/{playlist_id}/hqdefault.jpg", "width": 480, "height": 270}]},
+            "overlays": [{"thumbnailOverlayBadgeViewModel": {"thumbnailBadges": [{"thumbnailBadgeViewModel": {"text": f"{index + 3} videos"}}]}}],
+        }}}},
+        "metadata": {"lockupMetadataViewModel": {"title": {"content": f"Synthetic playlist {index}"}}},
+        "rendererContext": {"commandContext": {"onTap": {"innertubeCommand": {"watchEndpoint": {"playlistId": playlist_id}}}}},
+    }}
+
+def channel_page(seed: str, items: int, playlists: int, next_token: Optional[str], with_content: bool) -> Dict:
+    """Channel browse response: header and metadata, plus Videos and Playlists tabs"""
+    browse_id = channel_id(seed) if not seed.startswith("UC") else seed
+    videos_tab = {"tabRenderer": {
+        "title": "Videos",
+        "endpoint": {"browseEndpoint": {"browseId": browse_id, "params": "videos-tab"}},
+    }}
+    playlists_tab = {"tabRenderer": {
+        "title": "Playlists",
+        "endpoint": {"browseEndpoint": {"browseId": browse_id, "params": "videos-tab"}},
+    }}
+    if with_content:
+        videos_tab["tabRenderer"]["content"] = {"richGridRenderer": {"contents": rich_grid_items(seed, 0, items, next_token)}}
+        playlists_tab["tabRenderer"]["content"] = {"sectionListRenderer": {"contents": [{"itemSectionRenderer": {"contents": [
+            {"gridRenderer": {"items": [lockup(seed, i) for i in range(playlists)]}}
+        ]}}]}}
+    return {
+        "header": {"pageHeaderRenderer": {
+            "banner": {"imageBannerViewModel": {"image": {"sources": [{"url": f"https://yt3.ggpht.com/{browse_id}/banner"}]}}},
+            "content": {"pageHeaderViewModel": {"metadata": {"contentMetadataViewModel": {"metadataRows": [
+                {"metadataParts": [{"text": {"content": f"@{seed.lower()}"}}]},
+                {"metadataParts": [{"text": {"content": "1.2M subscribers"}}, {"text": {"content": "480 videos"}}]},
+            ]}}}},
+        }},
+        "metadata": {"channelMetadataRenderer": {
+            "externalId": browse_id,
+            "title": f"Synthetic channel {seed}",
+            "description": "A synthetic channel served by the offline benchmarks.",
+            "avatar": thumbnails(f"https://yt3.ggpht.com/{browse_id}"),
+        }},
+        "contents": {"twoColumnBrowseResultsRenderer": {"tabs": [
+            {"tabRenderer": {"title": "Home"}},
+            videos_tab,
+            playlists_tab,
+        ]}},
+    }
+
+def trending_page(seed: str, items: int, next_token: Optional[str]) -> Dict:
+    shelf = {"shelfRenderer": {"content": {"expandedShelfContentsRenderer": {
+        "items": [{"videoRenderer": video} for video in video_page_items(seed, 0, items)]
+    }}}}
+    contents = [{"itemSectionRenderer": {"contents": [shelf]}}]
+    if next_token:
+        contents.append(continuation_item(next_token))
+    return {"contents": {"twoColumnBrowseResultsRenderer": {"tabs": [{"tabRenderer": {
+        "content": {"sectionListRenderer": {"contents": contents}}
+    }}]}}}
+
+def playlist_video_renderer(seed: str, index: int) -> Dict:
+    video_id = stable_id("", "video", seed, index)
+    return {"playlistVideoRenderer": {
+        "videoId": video_id,
+        "thumbnail": thumbnails(f"https://i.ytimg.com/vi/{video_id}"),
+        "title": runs(f"Playlist entry {index}"),
+        "index": {"simpleText": str(index + 1)},
+        "shortBylineText": runs("Synthetic channel"),
+        "lengthText": {"simpleText": f"{index % 20}:{index % 60:02d}"},
+        "publishedTimeText": {"simpleText": f"{index % 12 + 1} months ago"},
+    }}
+
+def playlist_page(seed: str, page: int, items: int, next_token: Optional[str]) -> Dict:
+    contents = [playlist_video_renderer(seed, page * items + i) for i in range(items)]
+    if next_token:
+        contents.append(continuation_item(next_token))
+    if page:
+        return browse_continuation(contents)
+    return {"contents": {"twoColumnBrowseResultsRenderer": {"tabs": [{"tabRenderer": {"content": {"sectionListRenderer": {
+        "contents": [{"itemSectionRenderer": {"contents": [{"playlistVideoListRenderer": {"contents": contents}}]}}]
+    }}}}]}}}
+
+def watch_page(video_id: str) -> Dict:
+    results = {"results": {"results": {"contents": [
+        {"videoPrimaryInfoRenderer": {"title": runs(f"Synthetic video {video_id}")}},
+        {"itemSectionRenderer": {"contents": [continuation_item(token("comments", video_id, 0))]}},
+    ]}}}
+    # videos whose ID starts with "live" are streams with a chat
+    if video_id.startswith("live"):
+        results["conversationBar"] = live_chat_renderer(video_id)
+    return {"contents": {"twoColumnWatchNextResults": results}}
+
+def live_chat_renderer(video_id: str) -> Dict:
+    def reload(kind: str) -> Dict:
+        return {"reloadContinuationData": {"continuation": token(kind, video_id, 0)}}
+    return {"liveChatRenderer": {
+        "continuations": [reload("chat-top")],
+        "header": {"liveChatHeaderRenderer": {"viewSelector": {"sortFilterSubMenuRenderer": {"subMenuItems": [
+            {"title": "Top chat", "selected": True, "continuation": reload("chat-top")},
+            {"title": "Live chat", "selected": False, "continuation": reload("chat")},
+        ]}}}},
+    }}
+
+def live_chat_message(seed: str, index: int) -> Dict:
+    message = {
+        "id": stable_id("Cj", "chat", seed, index, length=26),
+        "authorName": {"simpleText": f"viewer{index % 50}"},
+        "authorExternalChannelId": channel_id(f"viewer{index % 50}"),
+        "authorPhoto": thumbnails(f"https://yt3.ggpht.com/viewer{index % 50}"),
+        "message": {"runs": [{"text": f"Chat message {index} "}, {"emoji": {"emojiId": "\U0001F525", "shortcuts": [":fire:"]}}]},
+        "timestampUsec": str(1_700_000_000_000_000 + index * 250_000),
+    }
+    if index % 10 == 9:
+        message["purchaseAmountText"] = {"simpleText": "$5.00"}
+        return {"liveChatPaidMessageRenderer": message}
+    return {"liveChatTextMessageRenderer": message}
+
+def live_chat_page(seed: str, page: int, items: int, next_token: Optional[str], timeout_ms: int) -> Dict:
+    actions = [{"addChatItemAction": {"item": live_chat_message(seed, page * items + i)}} for i in range(items)]
+    continuations = [{"timedContinuationData": {"continuation": next_token, "timeoutMs": timeout_ms}}] if next_token else []
+    return {"continuationContents": {"liveChatContinuation": {"continuations": continuations, "actions": actions}}}
+
+def comment_entity(comment_id: str, index: int, replies: int) -> Dict:
+    return {"payload": {"commentEntityPayload": {
+        "key": f"entity-{comment_id}",
+        "properties": {
+            "commentId": comment_id,
+            "content": {"content": f"Synthetic comment {index}, long enough to look like a real one."},
+            "publishedTime": f"{index % 11 + 1} days ago",
+        },
+        "author": {"displayName": f"@viewer{index}", "avatarThumbnailUrl": f"https://yt3.ggpht.com/viewer{index}"},
+        "toolbar": {"likeCountLiked": str(index % 500), "replyCount": str(replies)},
+    }}}
+
+def comments_header(sort_tokens: Dict[str, str]) -> Dict:
+    titles = {"top": "Top comments", "newest": "Newest first"}
+    return {"commentsHeaderRenderer": {
+        "countText": runs("1,234 Comments"),
+        "sortMenu": {"sortFilterSubMenuRenderer": {"subMenuItems": [
+            {"title": titles[sort], "selected": i == 0, "serviceEndpoint": {"continuationCommand": {"token": value}}}
+            for i, (sort, value) in enumerate(sort_tokens.items())
+        ]}},
+    }}
+
+def comments_page(seed: str, page: int, items: int, replies: int, next_token: Optional[str],
+                  sort_tokens: Optional[Dict[str, str]] = None) -> Dict:
+    threads, mutations = [], []
+    for i in range(items):
+        index = page * items + i
+        comment_id = stable_id("Ug", "comment", seed, index, length=26)
+        thread = {"commentViewModel": {"commentViewModel": {"commentId": comment_id}}}
+        if replies:
+            thread["replies"] = {"commentRepliesRenderer": {"contents": [reply_continuation_item(token("replies", comment_id, 0))]}}
+        threads.append({"commentThreadRenderer": thread})
+        mutations.append(comment_entity(comment_id, index, replies))
+    if next_token:
+        threads.append(continuation_item(next_token))
+    action = "reloadContinuationItemsCommand" if page == 0 else "appendContinuationItemsAction"
+    endpoints = [{action: {"continuationItems": threads}}]
+    if sort_tokens:
+        # the first page of a comment section reloads the header with the sort menu as well
+        endpoints.insert(0, {"reloadContinuationItemsCommand": {"continuationItems": [comments_header(sort_tokens)]}})
+    return {
+        "onResponseReceivedEndpoints": endpoints,
+        "frameworkUpdates": {"entityBatchUpdate": {"mutations": mutations}},
+    }
+
+def replies_page(comment_id: str, page: int, items: int, next_token: Optional[str]) -> Dict:
+    contents, mutations = [], []
+    for i in range(items):
+        index = page * items + i
+        reply_id = f"{comment_id}.{index:04d}"
+        contents.append({"commentViewModel": {"commentId": reply_id}})
+        mutations.append(comment_entity(reply_id, index, 0))
+    if next_token:
+        contents.append(reply_continuation_item(next_token))
+    return {
+        "onResponseReceivedEndpoints": [{"appendContinuationItemsAction": {"continuationItems": contents}}],
+        "frameworkUpdates": {"entityBatchUpdate": {"mutations": mutations}},
+    }
+
+def player(video_id: str) -> Dict:
+    if video_id.startswith("unavail"):
+        return {"playabilityStatus": {"status": "ERROR", "reason": "Video unavailable"}}
+    formats = [{"itag": itag, "mimeType": 'video/mp4; codecs="avc1.42001E"', "bitrate": itag * 1000,
+                "width": 640, "height": 360, "contentLength": str(itag * 100000)} for itag in (18, 22)]
+    adaptive = [{"itag": itag, "mimeType": 'video/webm; codecs="vp9"', "bitrate": itag * 2000} for itag in range(133, 140)]
+    return {
+        "playabilityStatus": {"status": "OK"},
+        "videoDetails": {
+            "videoId": video_id,
+            "title": f"Synthetic video {video_id}",
+            "author": "Synthetic channel",
+            "lengthSeconds": "213",
+            "viewCount": "123456",
+            "isLiveContent": False,
+            "shortDescription": "A synthetic description. " * 20,
+            "keywords": ["benchmark", "synthetic"],
+        },
+        "streamingData": {"formats": formats, "adaptiveFormats": adaptive},
+    }
+
+def resolve_url(url: str) -> Dict:
+    handle = url.rstrip("/").rsplit("@", 1)[-1]
+    if handle.startswith("missing"):
+        return {}
+    return {"endpoint": {"browseEndpoint": {"browseId": channel_id(handle)}}}
+
+def homepage() -> str:
+    return f'<html><script>ytcfg.set({{"INNERTUBE_API_KEY":"{API_KEY}"}});</script></html>'
+
+def handle_page(handle: str) -> str:
+    return f'<html><link rel="alternate" href="https://www.youtube.com/feeds/videos.xml?channel_id={channel_id(handle)}"></html>'
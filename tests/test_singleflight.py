@@ -0,0 +1,38 @@
+import asyncio
+from app.singleflight import SingleFlight
+
+def test_call_after_last_waiter_cancelled_starts_a_new_flight():
+    async def scenario():
+        flights = SingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(len(calls))
+            await asyncio.sleep(0.01)
+            return len(calls)
+
+        first = asyncio.ensure_future(flights.do("test", "key", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+
+        assert await flights.do("test", "key", fetch) == 2
+        assert len(flights) == 0
+
+    asyncio.run(scenario())
+
+def test_waiters_share_one_call_and_its_exception():
+    async def scenario():
+        flights = SingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(None)
+            await asyncio.sleep(0.01)
+            raise ValueError("upstream failed")
+
+        results = await asyncio.gather(*(flights.do("test", "key", fetch) for _ in range(5)), return_exceptions=True)
+        assert len(calls) == 1
+        assert all(isinstance(result, ValueError) for result in results)
+
+    asyncio.run(scenario())